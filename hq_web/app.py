@@ -25,10 +25,17 @@ current_config = {
     'resolution': (640, 480),
     'gain': 1.0,
     'shutter': 1000,  # microseconds
-    'brightness': 0,
+    'brightness': 0.0,
     'fps': 30
 }
 
+# Settings the camera was last configured or updated with
+applied_config = {}
+
+# Changing these alters the stream layout and needs a camera restart;
+# the rest are applied to the running camera with set_controls.
+RESTART_KEYS = ('resolution',)
+
 alert_state = {
     'bright_room': False,
     'laser_dot': False,
@@ -40,9 +47,12 @@ record_lock = threading.Lock()
 record_writer = None
 preroll_buffer = deque(maxlen=60)  # ~2s at 30 fps
 
-frame_lock = threading.Lock()
+frame_lock = threading.Condition()  # Notified whenever latest_frame changes
 latest_frame = b''
 
+capture_stop = threading.Event()  # Set to make capture_thread return
+capture_worker = None
+
 log_lock = threading.Lock()
 log_file = os.path.join(MEDIA_DIR, 'events.log')
 
@@ -55,20 +65,27 @@ def log_event(message: str):
             f.write(line)
 
 
+def camera_controls(config=None):
+    config = current_config if config is None else config
+    frame_duration = int(1_000_000 / config['fps'])
+    if config['shutter'] > frame_duration:
+        config['shutter'] = frame_duration
+    return {
+        'FrameDurationLimits': (frame_duration, frame_duration),
+        'AnalogueGain': config['gain'],
+        'ExposureTime': config['shutter'],
+        'Brightness': config['brightness']
+    }
+
+
 def apply_camera_settings():
-    frame_duration = int(1_000_000 / current_config['fps'])
-    if current_config['shutter'] > frame_duration:
-        current_config['shutter'] = frame_duration
+    global applied_config
     config = picam2.create_video_configuration(
         main={'size': current_config['resolution']},
-        controls={
-            'FrameDurationLimits': (frame_duration, frame_duration),
-            'AnalogueGain': current_config['gain'],
-            'ExposureTime': current_config['shutter'],
-            'Brightness': current_config['brightness']
-        }
+        controls=camera_controls()
     )
     picam2.configure(config)
+    applied_config = dict(current_config)
 
 
 def start_camera():
@@ -79,17 +96,38 @@ def start_camera():
         picam2.start()
 
 
+def start_capture():
+    """Start the camera, the MJPEG encoder and the capture thread."""
+    global capture_worker
+    start_camera()
+    picam2.start_recording(MJPEGEncoder(), FileOutput())
+    capture_stop.clear()
+    capture_worker = threading.Thread(target=capture_thread, daemon=True)
+    capture_worker.start()
+
+
+def stop_capture():
+    """Stop the capture thread, then the encoder and the camera."""
+    capture_stop.set()
+    if capture_worker is not None:
+        capture_worker.join()
+    picam2.stop_recording()
+
+
 def capture_thread():
     global latest_frame, recording, record_writer
-    start_camera()
-    encoder = MJPEGEncoder()
-    picam2.start_recording(encoder, FileOutput())
-    while True:
-        frame = picam2.capture_array()
+    while not capture_stop.is_set():
+        try:
+            frame = picam2.capture_array()
+        except Exception as exc:
+            log_event(f'Capture failed: {exc}')
+            time.sleep(0.5)
+            continue
         ret, jpeg = cv2.imencode('.jpg', frame)
         if ret:
             with frame_lock:
                 latest_frame = jpeg.tobytes()
+                frame_lock.notify_all()
             with record_lock:
                 if recording and record_writer is not None:
                     record_writer.write(frame)
@@ -186,39 +224,117 @@ def index():
 @login_required
 def stream():
     def gen():
+        frame = b''
         while True:
+            # Wait for a new frame instead of re-sending the same one.
+            last = frame
             with frame_lock:
+                frame_lock.wait_for(lambda: latest_frame and latest_frame is not last, timeout=5)
                 frame = latest_frame
-            if frame:
+            if frame and frame is not last:
                 yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            time.sleep(0.01)
     return Response(gen(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
+# Control updates are coalesced and applied by one worker thread at most
+# once per CONTROL_INTERVAL seconds, so slider drags don't queue up
+# reconfigurations; clients poll /control_status for the applied version.
+CONTROL_INTERVAL = float(os.environ.get('CONTROL_INTERVAL', '0.25'))
+control_cond = threading.Condition()
+pending_control = {}
+control_version = 0
+applied_version = 0
+last_control_result = None
+
+
 @app.route('/control', methods=['POST'])
 @login_required
 def control():
-    global current_config
-    data = request.json or {}
+    global control_version
+    with control_cond:
+        pending_control.update(request.json or {})
+        control_version += 1
+        control_cond.notify()
+        return {'status': 'queued', 'version': control_version}
+
+
+@app.route('/control_status')
+@login_required
+def control_status():
+    with control_cond:
+        return {'version': control_version, 'applied': applied_version,
+                'config': current_config, 'camera': last_control_result}
+
+
+def control_worker():
+    global pending_control, applied_version, last_control_result
+    last_apply = 0.0
+    while True:
+        with control_cond:
+            control_cond.wait_for(lambda: pending_control)
+            # Keep collecting changes until the interval has passed.
+            while time.monotonic() < last_apply + CONTROL_INTERVAL:
+                control_cond.wait(last_apply + CONTROL_INTERVAL - time.monotonic())
+            data, pending_control = pending_control, {}
+            version = control_version
+        try:
+            result = apply_control(data)
+        except Exception as exc:
+            result = {'error': str(exc)}
+            log_event(f'Camera control failed: {exc}')
+        last_apply = time.monotonic()
+        with control_cond:
+            applied_version = version
+            last_control_result = result
+
+
+def apply_control(data):
     update_fps = False
     if 'gain' in data:
         current_config['gain'] = float(data['gain'])
     if 'shutter' in data:
         current_config['shutter'] = int(data['shutter'])
     if 'brightness' in data:
-        current_config['brightness'] = int(data['brightness'])
-    if 'fps' in data:
+        current_config['brightness'] = float(data['brightness'])
+    if 'fps' in data and int(data['fps']) != current_config['fps']:
+        # Only a new frame rate resets the shutter to the frame duration.
         current_config['fps'] = int(data['fps'])
         update_fps = True
     if 'resolution' in data:
         w, h = map(int, data['resolution'].split('x'))
         current_config['resolution'] = (w, h)
-    picam2.pause()
-    apply_camera_settings()
-    picam2.resume()
     if update_fps:
         current_config['shutter'] = int(1_000_000 / current_config['fps'])
-    return {'status': 'ok', 'config': current_config}
+    return reconfigure()
+
+
+def reconfigure():
+    """Apply ``current_config``, restarting the camera only when needed."""
+    global applied_config
+    start = time.perf_counter()
+    changed = sorted(k for k in current_config if current_config[k] != applied_config.get(k))
+    outage = 0.0
+    if not changed:
+        path = 'none'
+    elif any(k in RESTART_KEYS for k in changed):
+        path = 'restart'
+        # Stop capture_thread first so it is never inside capture_array
+        # while the camera is being reconfigured.
+        stop_capture()
+        apply_camera_settings()
+        start_capture()
+        outage = time.perf_counter() - start
+    else:
+        path = 'controls'
+        old = camera_controls(dict(applied_config))
+        picam2.set_controls({key: value for key, value in camera_controls().items()
+                             if old.get(key) != value})
+        applied_config = dict(current_config)
+    elapsed = (time.perf_counter() - start) * 1000
+    log_event(f'Camera reconfigured via {path} ({", ".join(changed) or "no changes"}): '
+              f'{elapsed:.1f} ms, outage {outage * 1000:.1f} ms')
+    return {'path': path, 'changed': changed,
+            'elapsed_ms': round(elapsed, 1), 'outage_ms': round(outage * 1000, 1)}
 
 
 @app.route('/snapshot')
@@ -285,9 +401,9 @@ button { width:100%; margin-top:5px; }
 <body>
 <img id='stream' src='/stream' onclick="toggleFull()">
 <div class='controls'>
-<label>Gain <input type='range' min='1' max='32' step='0.1' value='{{ gain }}' id='gain'></label>
+<label>Gain <input type='range' min='1' max='32' step='0.1' value='{{ gain }}' id='gain' oninput='update("gain")'></label>
 <label>Shutter µs <input type='number' min='10' max='1000000' value='{{ shutter }}' id='shutter'></label>
-<label>Brightness <input type='range' min='-1' max='1' step='0.1' value='{{ brightness }}' id='brightness'></label>
+<label>Brightness <input type='range' min='-1' max='1' step='0.1' value='{{ brightness }}' id='brightness' oninput='update("brightness")'></label>
 <label>FPS <input type='number' min='1' max='60' value='{{ fps }}' id='fps'></label>
 <select id='res'>
 <option value='640x480' {% if res=='640x480' %}selected{% endif %}>640x480</option>
@@ -304,9 +420,18 @@ button { width:100%; margin-top:5px; }
 <button onclick='toggleScreen()'>Toggle Screen</button>
 </div>
 <script>
-function update(){
+function controls(){
+return {gain:gain.value, shutter:shutter.value, brightness:brightness.value, fps:fps.value, resolution:res.value}}
+let sent = controls();
+// Send only the controls that changed; a slider passes its own name.
+function update(only){
+let values = controls(), changed = {};
+for (const key in values){
+if ((!only || key === only) && values[key] !== sent[key]) changed[key] = values[key];}
+if (!Object.keys(changed).length) return;
+Object.assign(sent, changed);
 fetch('/control', {method:'POST', headers:{'Content-Type':'application/json'},
-body:JSON.stringify({gain:gain.value, shutter:shutter.value, brightness:brightness.value, fps:fps.value, resolution:res.value})})}
+body:JSON.stringify(changed)})}
 function snap(){window.location='/snapshot'}
 function record(){
 let action = this.innerText=='Record'?'start':'stop';
@@ -325,7 +450,7 @@ fetch('/alerts',{method:'POST', headers:{'Content-Type':'application/json'}, bod
 
 if __name__ == '__main__':
     apply_camera_settings()
-    t = threading.Thread(target=capture_thread, daemon=True)
-    t.start()
+    start_capture()
+    threading.Thread(target=control_worker, daemon=True).start()
     log_event('Server started')
     app.run(host='0.0.0.0', port=5000)
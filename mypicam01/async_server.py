@@ -0,0 +1,387 @@
+"""asyncio serving mode for the web UI.
+
+An alternative to Flask's threaded development server: every connection,
+including each ``/stream`` viewer, is a coroutine on one event loop
+instead of an OS thread, so dozens of viewers cost little more than one.
+Routes and state are shared with ``web_server``; run it with
+``python async_server.py [--host HOST] [--port PORT]``.
+
+Only what the UI needs is implemented: one request per connection
+(``Connection: close``), ``Content-Length`` bodies and JSON responses.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from mjpeg_broadcaster import BOUNDARY, AdaptiveWidth, mjpeg_part, variant_key
+from status_events import KEEPALIVE, sse_message
+
+MAX_BODY = 64 * 1024
+HEADER_TIMEOUT = 10
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+class Request:
+    """A parsed HTTP request."""
+
+    def __init__(self, method, target, headers, body):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        """Return the body decoded as JSON, or ``{}`` when empty."""
+        return json.loads(self.body) if self.body else {}
+
+
+class StreamResponse:
+    """A response whose body is produced by an async iterator of bytes."""
+
+    def __init__(self, content_type, chunks):
+        self.content_type = content_type
+        self.chunks = chunks
+
+
+def json_response(data, status=200):
+    """Return a ``(status, content_type, body)`` JSON response."""
+    return status, 'application/json', json.dumps(data, default=str).encode()
+
+
+class StreamHub:
+    """Fan encoded frames from an ``MjpegBroadcaster`` out to coroutines.
+
+    One thread of ``executor`` waits on the broadcaster (as a single client)
+    while any viewer is connected; viewers wait on an ``asyncio.Condition`` and,
+    like broadcaster clients, always take the newest frame, so a slow
+    connection skips frames instead of queueing them.
+    """
+
+    def __init__(self, broadcaster, width=None, quality=None, executor=None):
+        """Create the hub for one variant of ``broadcaster``."""
+        self.broadcaster = broadcaster
+        self.executor = executor
+        self.width = width
+        self.quality = quality
+        self.cond = None
+        self.part = None
+        self.seq = 0
+        self.clients = 0
+        self.pump = None
+        self.stopped = False
+
+    def _ensure_pump(self):
+        if self.pump is None or self.pump.done():
+            self.pump = asyncio.ensure_future(self._pump())
+
+    async def frames(self):
+        """Yield multipart parts for one viewer."""
+        if self.cond is None:
+            self.cond = asyncio.Condition()
+        self.clients += 1
+        self._ensure_pump()
+        try:
+            last = self.seq
+            while True:
+                async with self.cond:
+                    await self.cond.wait_for(lambda: self.seq != last or self.pump.done())
+                    if self.seq == last:
+                        if self.stopped:
+                            return
+                        self._ensure_pump()  # It exited just as we connected
+                        continue
+                    part, last = self.part, self.seq
+                yield part
+        finally:
+            self.clients -= 1
+
+    async def _pump(self):
+        loop = asyncio.get_running_loop()
+        frames = self.broadcaster.frames(self.width, self.quality, timeout=1.0)
+        try:
+            while self.clients:
+                item = await loop.run_in_executor(self.executor, next, frames, None)
+                if item is None:
+                    self.stopped = True  # Broadcaster stopped
+                    break
+                async with self.cond:
+                    self.part = mjpeg_part(*item)
+                    self.seq += 1
+                    self.cond.notify_all()
+        finally:
+            frames.close()
+            async with self.cond:
+                self.cond.notify_all()
+
+
+class AsyncServer:
+    """Minimal HTTP/1.1 server dispatching to async route handlers.
+
+    Handlers take a ``Request`` and return ``(status, content_type, body)``
+    or a ``StreamResponse``.
+    """
+
+    def __init__(self):
+        """Create a server without routes."""
+        self.routes = {}
+
+    def route(self, method, path, handler):
+        """Register ``handler`` for ``method`` requests to ``path``."""
+        self.routes[(method, path)] = handler
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, _ = line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY:
+            raise ValueError('body too large')
+        body = await reader.readexactly(length) if length else b''
+        return Request(method, target, headers, body)
+
+    async def handle(self, reader, writer):
+        """Serve one connection."""
+        try:
+            try:
+                request = await asyncio.wait_for(self._read_request(reader), HEADER_TIMEOUT)
+            except (ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                response = json_response({'error': 'bad request'}, 400)
+            else:
+                if request is None:
+                    return
+                response = await self._dispatch(request)
+            if isinstance(response, StreamResponse):
+                writer.write(self._head(200, response.content_type))
+                try:
+                    async for chunk in response.chunks:
+                        writer.write(chunk)
+                        await writer.drain()
+                finally:
+                    await response.chunks.aclose()  # Unregister the viewer now
+            else:
+                status, content_type, body = response
+                writer.write(self._head(status, content_type, len(body)) + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request):
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            known = any(path == request.path for _, path in self.routes)
+            return json_response({'error': 'not found'}, 405 if known else 404)
+        try:
+            return await handler(request)
+        except Exception as exc:
+            print(f"[HTTP] {request.method} {request.path} failed: {exc}")
+            return json_response({'error': str(exc)}, 500)
+
+    @staticmethod
+    def _head(status, content_type, length=None):
+        lines = [f'HTTP/1.1 {status} {REASONS.get(status, "")}',
+                 f'Content-Type: {content_type}', 'Connection: close',
+                 'Cache-Control: no-cache']
+        if length is not None:
+            lines.append(f'Content-Length: {length}')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def serve(self, host='0.0.0.0', port=8080, ready=None):
+        """Serve forever; ``ready()`` is called once the socket listens."""
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready()
+        async with server:
+            await server.serve_forever()
+
+
+def add_stream_route(server, broadcaster):
+    """Serve ``broadcaster`` as MJPEG on ``/stream``.
+
+    ``width`` and ``quality`` query parameters work as with Flask; there is
+    one ``StreamHub`` per variant. With ``width=auto`` the viewer moves
+    between hubs as ``AdaptiveWidth`` decides, timing each part from
+    ``yield`` to resumption, i.e. the write and drain of the connection.
+    """
+    hubs = {}
+    # Pumps block for up to a frame interval each, so they get their own
+    # threads and cannot starve handlers using the default executor.
+    pumps = ThreadPoolExecutor(max_workers=broadcaster.max_variants + 2,
+                               thread_name_prefix='stream-pump')
+
+    def hub_for(width, quality):
+        key = variant_key(width, quality, broadcaster.quality)
+        if key not in hubs:
+            hubs[key] = StreamHub(broadcaster, *key, executor=pumps)
+        return hubs[key]
+
+    async def adaptive(quality):
+        chooser = AdaptiveWidth(broadcaster.max_fps)
+        while True:
+            parts = hub_for(chooser.width, quality).frames()
+            try:
+                async for part in parts:
+                    start = time.perf_counter()
+                    yield part
+                    if chooser.record(len(part), time.perf_counter() - start) is not None:
+                        break
+                else:
+                    return
+            finally:
+                await parts.aclose()
+
+    async def stream(request):
+        width, quality = request.query.get('width'), request.query.get('quality')
+        try:
+            quality = int(quality) if quality else None
+            if width != 'auto':
+                width = int(width) if width else None
+        except ValueError:
+            return json_response({'error': 'width and quality must be integers'}, 400)
+        if width == 'auto':
+            parts = adaptive(quality)
+        else:
+            parts = hub_for(width, quality).frames()
+        return StreamResponse(f'multipart/x-mixed-replace; boundary={BOUNDARY}', parts)
+
+    server.route('GET', '/stream', stream)
+    return hubs
+
+
+def add_events_route(server, publisher):
+    """Serve ``publisher`` (a ``StatusPublisher``) as SSE on ``/events``.
+
+    One hub listener per server wakes every subscriber coroutine through a
+    shared ``asyncio.Event`` that is replaced after each wakeup; each
+    subscriber then reads what it missed with ``EventHub.since``.
+    """
+    hub = publisher.hub
+    state = {'wake': None}
+
+    def wake():
+        event, state['wake'] = state['wake'], asyncio.Event()
+        event.set()
+
+    async def events(request):
+        if state['wake'] is None:
+            loop = asyncio.get_running_loop()
+            state['wake'] = asyncio.Event()
+            hub.add_listener(lambda: loop.call_soon_threadsafe(wake))
+        header = request.headers.get('last-event-id')
+        last_id = int(header) if header and header.isdigit() else None
+        return StreamResponse('text/event-stream', subscribe(last_id))
+
+    async def subscribe(last_id):
+        if last_id is None or hub.since(last_id) is None:
+            last_id = hub.last_id
+            yield sse_message('snapshot', publisher.snapshot(), last_id)
+        while True:
+            wakeup = state['wake']
+            pending = hub.since(last_id)
+            if pending is None:
+                last_id = hub.last_id
+                yield sse_message('snapshot', publisher.snapshot(), last_id)
+                continue
+            if not pending:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b': keepalive\n\n'
+                continue
+            for last_id, kind, data in pending:
+                yield sse_message(kind, data, last_id)
+
+    server.route('GET', '/events', events)
+
+
+def build_server(web):
+    """Create an ``AsyncServer`` with the routes of the ``web_server`` module."""
+    server = AsyncServer()
+
+    def blocking(func, *args):
+        # Handlers that may shell out or copy frames run off the event loop.
+        return asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def index(request):
+        with open('web_template.html', 'rb') as f:
+            return 200, 'text/html; charset=utf-8', f.read()
+
+    async def get_config(request):
+        return json_response(web.status_publisher.snapshot())
+
+    async def update_config(request):
+        version = web.config_scheduler.submit(request.json())
+        return json_response({'status': 'queued', 'version': version})
+
+    async def metrics_text(request):
+        return 200, 'text/plain; version=0.0.4', web.metrics.prometheus().encode()
+
+    async def metrics_json(request):
+        return json_response(web.metrics.summary())
+
+    async def admin_profile(request):
+        token = request.query.get('token') or request.headers.get('x-admin-token')
+        # Blocks for the whole profile, so it runs on an executor thread.
+        return await blocking(web.run_profile, request.query, token)
+
+    async def config_status(request):
+        return json_response(web.config_scheduler.status())
+
+    async def save_buffer(request):
+        return json_response(await blocking(web.save_buffer_now))
+
+    async def toggle_screen(request):
+        return json_response(await blocking(web.set_screen, request.json().get('state')))
+
+    server.route('GET', '/', index)
+    server.route('GET', '/get_config', get_config)
+    server.route('POST', '/update_config', update_config)
+    server.route('GET', '/config_status', config_status)
+    server.route('GET', '/metrics', metrics_text)
+    server.route('GET', '/metrics.json', metrics_json)
+    server.route('GET', '/admin/profile', admin_profile)
+    server.route('POST', '/save_buffer', save_buffer)
+    server.route('POST', '/toggle_screen', toggle_screen)
+    add_stream_route(server, web.broadcaster)
+    add_events_route(server, web.status_publisher)
+    return server
+
+
+def main():
+    """Start the controller (via ``web_server``) and serve it with asyncio."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    import web_server
+
+    server = build_server(web_server)
+    print(f"[HTTP] Serving on {args.host}:{args.port} (asyncio)")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        web_server.controller.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Vectorized helpers for Bayer raw frames (demosaic-off mode)."""
+
+import re
+
+import cv2
+import numpy as np
+
+_FORMAT = re.compile(r'^S?([RGB]{4})(8|10|12|16)(_CSI2P)?$')
+
+
+def parse_format(fmt):
+    """Return ``(order, bits, packed)`` for a raw format like ``SBGGR10_CSI2P``."""
+    match = _FORMAT.match(fmt or '')
+    if not match or sorted(match.group(1)) != ['B', 'G', 'G', 'R']:
+        raise ValueError(f"Unsupported raw format: {fmt}")
+    order, bits, packed = match.group(1), int(match.group(2)), bool(match.group(3))
+    if packed and bits not in (10, 12):
+        raise ValueError(f"Unsupported raw format: {fmt}")
+    return order, bits, packed
+
+
+def bayer_plane(raw, fmt, size, row, col, out=None):
+    """Extract the 8-bit half-resolution plane at 2x2 position ``(row, col)``.
+
+    ``raw`` is the mapped raw buffer as bytes per row (``uint8``, possibly
+    with row padding) or, for unpacked formats, already ``uint16``. Only the
+    most significant 8 bits of each sample are kept. For CSI-2 packed data
+    those are whole bytes, so the plane is gathered from strided views with
+    ``cv2.mixChannels`` (treating each byte group as a multi-channel pixel)
+    without unpacking the frame.
+    """
+    _, bits, packed = parse_format(fmt)
+    width, height = size
+    if out is None:
+        out = np.empty((height // 2, width // 2), dtype=np.uint8)
+    rows = raw[row:height:2]
+    count = len(rows)
+    if packed and bits == 10:
+        # 4 pixels in 5 bytes: bytes 0-3 hold the high bits of each pixel.
+        groups = rows[:, :width * 5 // 4].reshape(count, width // 4, 5)
+        cv2.mixChannels([groups], [out.reshape(count, width // 4, 2)], [col, 0, col + 2, 1])
+    elif packed:
+        # 2 pixels in 3 bytes: bytes 0-1 hold the high bits of each pixel.
+        groups = rows[:, :width * 3 // 2].reshape(count, width // 2, 3)
+        cv2.mixChannels([groups], [out], [col, 0])
+    elif bits == 8:
+        pairs = rows[:, :width].reshape(count, width // 2, 2)
+        cv2.mixChannels([pairs], [out], [col, 0])
+    else:
+        if rows.dtype == np.uint8:
+            rows = rows[:, :width * 2].view('<u2')
+        np.copyto(out, rows[:, col:width:2] >> (bits - 8), casting='unsafe')
+    return out
+
+
+class BayerConverter:
+    """Turn raw Bayer frames of one format and size into 8-bit images.
+
+    ``green_luma`` averages the two green samples of each 2x2 cell into a
+    half-resolution luma image for detection, and ``debayer_half`` builds a
+    half-resolution BGR image (one pixel per cell, the same channel order
+    as the ``RGB888`` main stream) for buffering and preview. Both read a
+    quarter or less of the bytes a full-resolution RGB frame would need and
+    skip the ISP's demosaic altogether. Sensor black level is not removed.
+    """
+
+    def __init__(self, fmt, size):
+        """Prepare for raw frames of format ``fmt`` and ``(width, height)``."""
+        self.format = fmt
+        self.size = (int(size[0]), int(size[1]))
+        self.order, self.bits, self.packed = parse_format(fmt)
+        width, height = self.size
+        self.shape = (height // 2, width // 2)
+        self.positions = {}
+        for index, channel in enumerate(self.order):
+            self.positions.setdefault(channel, []).append(divmod(index, 2))
+        self.planes = {name: np.empty(self.shape, dtype=np.uint8)
+                       for name in ('R', 'G1', 'G2', 'B')}
+
+    def _plane(self, raw, channel, which=0, out=None):
+        row, col = self.positions[channel][which]
+        return bayer_plane(raw, self.format, self.size, row, col, out)
+
+    def green_luma(self, raw, out=None):
+        """Return the half-resolution mean of both green samples."""
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+        g1 = self._plane(raw, 'G', 0, self.planes['G1'])
+        g2 = self._plane(raw, 'G', 1, self.planes['G2'])
+        cv2.addWeighted(g1, 0.5, g2, 0.5, 0, dst=out)
+        return out
+
+    def debayer_half(self, raw, out=None, green=None):
+        """Return a half-resolution BGR image, one pixel per 2x2 cell.
+
+        Pass the result of ``green_luma`` as ``green`` to avoid computing it
+        twice.
+        """
+        if out is None:
+            out = np.empty(self.shape + (3,), dtype=np.uint8)
+        if green is None:
+            green = self.green_luma(raw, self.planes['G1'])
+        blue = self._plane(raw, 'B', 0, self.planes['B'])
+        red = self._plane(raw, 'R', 0, self.planes['R'])
+        cv2.merge([blue, green, red], dst=out)
+        return out
+
+
+def mosaic(image, order='BGGR', bits=10):
+    """Sample a BGR ``image`` into a Bayer frame of ``bits`` per pixel.
+
+    Used to build synthetic raw frames; the result is ``uint16``.
+    """
+    height, width = image.shape[:2]
+    out = np.empty((height, width), dtype=np.uint16)
+    channel = {'B': 0, 'G': 1, 'R': 2}
+    for index, name in enumerate(order):
+        row, col = divmod(index, 2)
+        out[row::2, col::2] = image[row::2, col::2, channel[name]]
+    out <<= bits - 8
+    return out
+
+
+def pack_csi2p10(bayer):
+    """Pack 10-bit ``uint16`` samples into CSI-2 ``_CSI2P`` byte layout."""
+    height, width = bayer.shape
+    groups = bayer.reshape(height, width // 4, 4)
+    packed = np.empty((height, width // 4, 5), dtype=np.uint8)
+    packed[:, :, :4] = groups >> 2
+    low = groups & 3
+    packed[:, :, 4] = low[:, :, 0] | (low[:, :, 1] << 2) | (low[:, :, 2] << 4) | (low[:, :, 3] << 6)
+    return packed.reshape(height, width * 5 // 4)
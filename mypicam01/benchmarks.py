@@ -0,0 +1,711 @@
+"""Offline micro-benchmarks for the capture pipeline components.
+
+Run ``python benchmarks.py <name> --help`` for the options of each benchmark.
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def parse_resolution(value):
+    """Parse a ``WIDTHxHEIGHT`` string into a ``(width, height)`` tuple."""
+    width, height = (int(x) for x in value.split('x'))
+    return width, height
+
+
+def current_rss_mb():
+    """Return the resident set size of this process in megabytes."""
+    with open('/proc/self/statm', encoding='utf-8') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def _run_isolated(target, *args):
+    """Run ``target(*args)`` in a fresh process and return its result.
+
+    Running each case in its own process keeps RSS measurements independent.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_isolated_entry, args=(queue, target, args))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def _isolated_entry(queue, target, args):
+    queue.put(target(*args))
+
+
+def _print_table(rows, columns):
+    print("  ".join(f"{name:>14}" for name in columns))
+    for row in rows:
+        print("  ".join(f"{row[name]:>14}" for name in columns))
+
+
+# ---- FrameBuffer ----
+def _frame_buffer_case(storage, resolution, length, fps, frames):
+    from frame_buffer import FrameBuffer
+
+    width, height = resolution
+    source = [np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+              for _ in range(2)]
+    with tempfile.TemporaryDirectory() as tmp:
+        buf = FrameBuffer({'length': length, 'fps': fps,
+                           'storage': storage, 'output_dir': tmp})
+        rss_before = current_rss_mb()
+        latencies = np.empty(frames, dtype=np.float64)
+        for i in range(frames):
+            start = time.perf_counter()
+            buf.add_frame(source[i % 2], time.time())
+            latencies[i] = time.perf_counter() - start
+        rss_after = current_rss_mb()
+    return {
+        'storage': storage,
+        'mean_ms': f"{latencies.mean() * 1e3:.3f}",
+        'p99_ms': f"{np.percentile(latencies, 99) * 1e3:.3f}",
+        'max_ms': f"{latencies.max() * 1e3:.3f}",
+        'rss_delta_mb': f"{rss_after - rss_before:.1f}",
+    }
+
+
+def bench_buffer(args):
+    """Compare per-frame ``add_frame`` latency and RSS across storage modes."""
+    rows = [_run_isolated(_frame_buffer_case, storage, args.resolution,
+                          args.length, args.fps, args.frames)
+            for storage in args.storage]
+    _print_table(rows, ['storage', 'mean_ms', 'p99_ms', 'max_ms', 'rss_delta_mb'])
+
+
+# ---- FlashDetector ----
+def _time_per_call(func, arg, repeats):
+    func(arg)  # Warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func(arg)
+    return (time.perf_counter() - start) / repeats
+
+
+def bench_flash(args):
+    """Measure per-frame ``FlashDetector.check`` cost across resolutions."""
+    from flash_detector import FlashDetector
+
+    rows = []
+    for width, height in args.resolutions:
+        frame = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+        row = {'resolution': f"{width}x{height}",
+               'np.mean_ms': f"{_time_per_call(np.mean, frame, args.repeats) * 1e3:.3f}"}
+        for stride in args.strides:
+            detector = FlashDetector({'flash_stride': stride})
+            cost = _time_per_call(detector.check, frame, args.repeats)
+            row[f"stride{stride}_ms"] = f"{cost * 1e3:.3f}"
+        rows.append(row)
+    _print_table(rows, ['resolution', 'np.mean_ms'] + [f"stride{s}_ms" for s in args.strides])
+
+
+# ---- LaserDetector ----
+class _LegacyLaserDetector:
+    """The original full-resolution, allocating ``findContours`` pipeline."""
+
+    def __init__(self, config):
+        import cv2
+        self.cv2 = cv2
+        self.threshold = config.get('laser_threshold', 50)
+        self.min_blob = config.get('min_blob', 5)
+        self.max_blob = config.get('max_blob', 100)
+        self.background = None
+        self.alpha = 0.95
+
+    def check(self, frame):
+        cv2 = self.cv2
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        if self.background is None:
+            self.background = gray.astype(np.float32)
+            return False
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+        bg = cv2.convertScaleAbs(self.background)
+        diff = cv2.subtract(gray, bg)
+        _, thresh = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for cnt in contours:
+            if self.min_blob < cv2.contourArea(cnt) < self.max_blob:
+                return True
+        return False
+
+
+def synthetic_laser_frames(resolution, count, spot_radius=3, seed=0):
+    """Return dark noisy RGB frames, every other one with a laser spot."""
+    import cv2
+
+    width, height = resolution
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        frame = rng.integers(0, 20, (height, width, 3), dtype=np.uint8)
+        if i % 2:
+            center = (int(rng.integers(10, width - 10)), int(rng.integers(10, height - 10)))
+            cv2.circle(frame, center, spot_radius, (255, 255, 255), -1)
+        frames.append(frame)
+    return frames
+
+
+def bench_laser(args):
+    """Compare legacy and optimized ``LaserDetector`` throughput."""
+    from laser_detector import LaserDetector
+
+    config = {'laser_threshold': 8, 'min_blob': 5, 'max_blob': 200}
+    rows = []
+    for resolution in args.resolutions:
+        frames = synthetic_laser_frames(resolution, args.frames)
+        cases = [('legacy', _LegacyLaserDetector(config))]
+        cases += [(f"scale{s}", LaserDetector({**config, 'laser_scale': s}))
+                  for s in args.scales]
+        for name, detector in cases:
+            hits = 0
+            start = time.perf_counter()
+            for frame in frames:
+                hits += bool(detector.check(frame))
+            elapsed = time.perf_counter() - start
+            rows.append({'resolution': f"{resolution[0]}x{resolution[1]}",
+                         'detector': name,
+                         'fps': f"{len(frames) / elapsed:.1f}",
+                         'ms_per_frame': f"{elapsed / len(frames) * 1e3:.3f}",
+                         'hits': f"{hits}/{len(frames) // 2}"})
+    _print_table(rows, ['resolution', 'detector', 'fps', 'ms_per_frame', 'hits'])
+
+
+# ---- DetectorManager ----
+def bench_detectors(args):
+    """Compare in-thread and process-pool detection throughput."""
+    from detector_manager import DetectorManager
+    from frame_context import FrameContext
+
+    rows = []
+    for resolution in args.resolutions:
+        frames = synthetic_laser_frames(resolution, args.frames)
+        for mode in args.modes:
+            config = {'laser_threshold': 8, 'min_blob': 5, 'max_blob': 200,
+                      'flash_stride': 1, 'detector_mode': mode}
+            manager = DetectorManager(config)
+            start = time.perf_counter()
+            for i, frame in enumerate(frames):
+                manager.run(FrameContext(frame, float(i)))
+            while min(t.calls + t.errors for t in manager.timings.values()) < len(frames):
+                time.sleep(0.001)
+            elapsed = time.perf_counter() - start
+            manager.close()
+            rows.append({'resolution': f"{resolution[0]}x{resolution[1]}",
+                         'mode': mode,
+                         'fps': f"{len(frames) / elapsed:.1f}",
+                         'ms_per_frame': f"{elapsed / len(frames) * 1e3:.3f}"})
+    _print_table(rows, ['resolution', 'mode', 'fps', 'ms_per_frame'])
+
+
+# ---- Bayer raw path ----
+def bench_bayer(args):
+    """Compare raw-domain luma/debayer cost with the RGB detection path."""
+    import cv2
+    from bayer import BayerConverter, mosaic, pack_csi2p10
+
+    rows = []
+    for width, height in args.resolutions:
+        image = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+        raw = pack_csi2p10(mosaic(image, 'BGGR', 10))
+        bayer8 = (mosaic(image, 'BGGR', 8)).astype(np.uint8)
+        converter = BayerConverter('SBGGR10_CSI2P', (width, height))
+        luma = converter.green_luma(raw)
+        expected = (image[0::2, 1::2, 1].astype(np.int16) + image[1::2, 0::2, 1]) / 2
+        error = np.abs(luma - expected).max()
+        assert error <= 1, f"green_luma is off by {error} at {width}x{height}"
+        rows.append({
+            'resolution': f"{width}x{height}",
+            'rgb_MB': f"{image.nbytes / 2**20:.1f}",
+            'raw_MB': f"{raw.nbytes / 2**20:.1f}",
+            'rgb2gray_ms': f"{_time_per_call(lambda f: cv2.cvtColor(f, cv2.COLOR_RGB2GRAY), image, args.repeats) * 1e3:.3f}",
+            'green_luma_ms': f"{_time_per_call(converter.green_luma, raw, args.repeats) * 1e3:.3f}",
+            'cv_debayer_ms': f"{_time_per_call(lambda f: cv2.cvtColor(f, cv2.COLOR_BayerBG2BGR), bayer8, args.repeats) * 1e3:.3f}",
+            'debayer_half_ms': f"{_time_per_call(lambda f: converter.debayer_half(f, green=luma), raw, args.repeats) * 1e3:.3f}",
+            'luma_max_err': f"{error:.1f}",
+        })
+    _print_table(rows, ['resolution', 'rgb_MB', 'raw_MB', 'rgb2gray_ms', 'green_luma_ms',
+                        'cv_debayer_ms', 'debayer_half_ms', 'luma_max_err'])
+
+
+# ---- MJPEG streaming ----
+class _SyntheticFrameSource:
+    """Publish pooled-like frames at ``fps`` with the controller's frame API."""
+
+    def __init__(self, resolution, fps):
+        import threading
+        from frame_pool import Frame
+
+        width, height = resolution
+        self.frames = [Frame(i, np.random.randint(0, 256, (height, width, 3), dtype=np.uint8), 0.0)
+                       for i in range(2)]
+        self.fps = fps
+        self.last = None
+        self.cond = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        from frame_pool import Frame
+
+        frame_id = 0
+        while self.running:
+            image = self.frames[frame_id % 2].array
+            with self.cond:
+                self.last = Frame(frame_id, image, time.time())
+                self.cond.notify_all()
+            frame_id += 1
+            time.sleep(1 / self.fps)
+
+    def get_last_frame(self):
+        with self.cond:
+            return self.last
+
+    def wait_frame(self, after_id=None, timeout=None):
+        with self.cond:
+            self.cond.wait_for(lambda: self.last is not None and self.last.frame_id != after_id,
+                               timeout)
+            return self.last if self.last is not None and self.last.frame_id != after_id else None
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+
+
+def _legacy_stream_client(source, stop, counts):
+    """The original per-client loop: encode the last frame every 0.1 s."""
+    import cv2
+
+    last_id = None
+    while not stop.is_set():
+        frame = source.get_last_frame()
+        if frame is not None:
+            cv2.imencode('.jpg', frame.array)
+            counts['frames'] += 1
+            counts['duplicates'] += frame.frame_id == last_id
+            last_id = frame.frame_id
+        time.sleep(0.1)
+
+
+def _broadcast_stream_client(broadcaster, stop, counts, width=None, quality=None):
+    last = None
+    frames = broadcaster.frames(width, quality, timeout=0.5)
+    for jpeg, timestamp in frames:
+        counts['frames'] += 1
+        counts['bytes'] = counts.get('bytes', 0) + len(jpeg)
+        counts['duplicates'] += timestamp == last
+        last = timestamp
+        if stop.is_set():
+            break
+    frames.close()
+
+
+def bench_stream(args):
+    """Load-test /stream encoding with N simulated clients."""
+    import threading
+    from mjpeg_broadcaster import MjpegBroadcaster
+
+    rows = []
+    for clients in args.clients:
+        for mode in args.modes:
+            source = _SyntheticFrameSource(args.resolution, args.fps)
+            broadcaster = None
+            if mode == 'broadcast':
+                broadcaster = MjpegBroadcaster(source, max_fps=args.fps)
+                broadcaster.start()
+            stop = threading.Event()
+            counts = [{'frames': 0, 'duplicates': 0} for _ in range(clients)]
+            threads = []
+            for count in counts:
+                if broadcaster:
+                    target, first = _broadcast_stream_client, broadcaster
+                else:
+                    target, first = _legacy_stream_client, source
+                threads.append(threading.Thread(target=target, args=(first, stop, count), daemon=True))
+            cpu = time.process_time()
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            time.sleep(args.seconds)
+            stop.set()
+            elapsed = time.perf_counter() - start
+            cpu = time.process_time() - cpu
+            for thread in threads:
+                thread.join()
+            if broadcaster:
+                broadcaster.stop()
+            source.close()
+            frames = sum(c['frames'] for c in counts)
+            rows.append({'clients': clients, 'mode': mode,
+                         'cpu_pct': f"{cpu / elapsed * 100:.1f}",
+                         'fps_per_client': f"{frames / clients / elapsed:.1f}",
+                         'duplicates': sum(c['duplicates'] for c in counts)})
+    _print_table(rows, ['clients', 'mode', 'cpu_pct', 'fps_per_client', 'duplicates'])
+
+
+def bench_variants(args):
+    """Measure encode CPU for clients asking for different preview variants."""
+    import itertools
+    import threading
+    from mjpeg_broadcaster import MjpegBroadcaster
+
+    requests = list(itertools.product(args.widths, args.qualities))
+    rows = []
+    for max_variants in args.max_variants:
+        source = _SyntheticFrameSource(args.resolution, args.fps)
+        broadcaster = MjpegBroadcaster(source, max_fps=args.fps, max_variants=max_variants)
+        broadcaster.start()
+        stop = threading.Event()
+        counts = [{'frames': 0, 'duplicates': 0} for _ in range(args.clients)]
+        threads = [threading.Thread(target=_broadcast_stream_client, daemon=True,
+                                    args=(broadcaster, stop, count, *requests[i % len(requests)]))
+                   for i, count in enumerate(counts)]
+        cpu = time.process_time()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        variants = len(broadcaster.stats()['variants'])
+        stop.set()
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        for thread in threads:
+            thread.join()
+        broadcaster.stop()
+        source.close()
+        frames = sum(c['frames'] for c in counts)
+        rows.append({'max_variants': max_variants, 'variants': variants,
+                     'cpu_pct': f"{cpu / elapsed * 100:.1f}",
+                     'fps_per_client': f"{frames / args.clients / elapsed:.1f}",
+                     'KB_per_frame': f"{sum(c.get('bytes', 0) for c in counts) / max(frames, 1) / 1024:.1f}"})
+    _print_table(rows, ['max_variants', 'variants', 'cpu_pct', 'fps_per_client', 'KB_per_frame'])
+
+
+def _metrics_calls(registry, calls):
+    for _ in range(calls):
+        with registry.timer('capture'):
+            pass
+        registry.observe('detector_check', 0.001, detector='flash')
+        registry.count('frames_captured')
+
+
+def bench_metrics(args):
+    """Measure the per-call cost of metrics instrumentation."""
+    import threading
+    from metrics import Metrics
+
+    rows = []
+    for enabled in (False, True):
+        for threads in args.threads:
+            registry = Metrics(enabled=enabled)
+            workers = [threading.Thread(target=_metrics_calls, args=(registry, args.calls))
+                       for _ in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            # One iteration is a timer, an observe and a count.
+            per_call = elapsed / (args.calls * threads * 3) * 1e9
+            rows.append({'enabled': 'on' if enabled else 'off', 'threads': threads,
+                         'ns_per_call': f"{per_call:.0f}",
+                         'us_per_frame': f"{per_call * args.per_frame / 1e3:.2f}",
+                         'pct_of_frame': f"{per_call * args.per_frame / (1e9 / args.fps) * 100:.3f}"})
+    _print_table(rows, ['enabled', 'threads', 'ns_per_call', 'us_per_frame', 'pct_of_frame'])
+
+
+# ---- Whole pipeline ----
+def bench_pipeline(args):
+    """Run capture, detect, buffer and stream on a synthetic or replayed source."""
+    import threading
+    import metrics
+    from camera_sources import SyntheticScene
+    from main_controller import MainController
+    from mjpeg_broadcaster import MjpegBroadcaster
+
+    if args.replay:
+        source = {'type': 'replay', 'path': args.replay, 'pace': args.pace}
+        scene = None
+    else:
+        scene_options = {'seed': args.seed, 'flash_every': args.flash_every,
+                         'laser_every': args.laser_every, 'laser_offset': args.laser_every // 2}
+        source = {'type': 'synthetic', 'pace': args.pace, **scene_options}
+        scene = SyntheticScene(**scene_options)
+    policy = 'block' if args.lossless else None
+    with tempfile.TemporaryDirectory() as output_dir:
+        config = {
+            # The scene's spots cover about (width / 160)^2 * pi main-stream pixels.
+            'detection': {'flash_threshold': 5.0, 'laser_threshold': 50, 'min_blob': 5,
+                          'max_blob': 2000, 'detectors': ['flash', 'laser'],
+                          'detector_mode': 'thread', 'detector_workers': 2,
+                          'detector_queue': 2},
+            'camera': {'resolution': args.resolution, 'lores': args.lores, 'fps': args.fps,
+                       'exposure': 10000, 'gain': 1.0, 'demosaic': 'on'},
+            'buffer': {'length': 5, 'memory': 256, 'output_dir': output_dir},
+            'pipeline': {name: {'policy': policy} for name in ('detect', 'alert')} if policy else {},
+            'source': source,
+        }
+        metrics.enable()
+        metrics.METRICS.reset()
+        controller = MainController(config)
+        broadcaster = MjpegBroadcaster(controller, max_fps=args.stream_fps)
+        stop = threading.Event()
+        counts = [{'frames': 0, 'duplicates': 0} for _ in range(args.clients)]
+        clients = [threading.Thread(target=_broadcast_stream_client, daemon=True,
+                                    args=(broadcaster, stop, count, 640))
+                   for count in counts]
+        cpu = time.process_time()
+        start = time.perf_counter()
+        controller.start()
+        broadcaster.start()
+        for client in clients:
+            client.start()
+        time.sleep(args.seconds)
+        stop.set()
+        controller.stop()
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        broadcaster.stop()
+        for client in clients:
+            client.join()
+        summary = metrics.summary()
+        stages = controller.pipeline.stats()
+
+    counters = summary['counters']
+    captured = counters.get('frames_captured', 0)
+    print(f"source={source['type']} pace={args.pace} resolution={args.resolution[0]}x"
+          f"{args.resolution[1]} lossless={args.lossless}")
+    print(f"captured {captured} frames in {elapsed:.2f} s: {captured / elapsed:.1f} fps, "
+          f"CPU {cpu / elapsed * 100:.0f}%, stream {sum(c['frames'] for c in counts)} parts "
+          f"to {args.clients} clients")
+    print("stage drops: " + ', '.join(f"{name}={stats['dropped']}" for name, stats in stages.items()))
+    injected = {'flash': 0, 'laser': 0}
+    for _, kind in scene.events(captured) if scene is not None else ():
+        injected[kind] += 1
+    for kind, count in injected.items():
+        known = f"injected {count}, " if scene is not None else ''
+        print(f"{kind}: {known}detected {counters.get('detections:' + kind, 0)}")
+    rows = [{'op': op, 'count': values['count'], 'avg_ms': values['avg_ms'],
+             'p95_ms': values['p95_ms'], 'max_ms': values['max_ms']}
+            for op, values in summary['latency'].items()]
+    _print_table(rows, ['op', 'count', 'avg_ms', 'p95_ms', 'max_ms'])
+
+
+# ---- Serving modes ----
+def _serve_stream(mode, port, resolution, fps, ready):
+    """Serve a synthetic ``/stream`` with Flask threads or asyncio."""
+    from mjpeg_broadcaster import BOUNDARY, MjpegBroadcaster, mjpeg_part
+
+    source = _SyntheticFrameSource(resolution, fps)
+    broadcaster = MjpegBroadcaster(source, max_fps=fps)
+    broadcaster.start()
+    if mode == 'flask':
+        import logging
+        from flask import Flask, Response
+        from werkzeug.serving import make_server
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        app = Flask(__name__)
+
+        @app.route('/stream')
+        def stream():
+            parts = (mjpeg_part(*item) for item in broadcaster.frames())
+            return Response(parts, mimetype=f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+
+        server = make_server('127.0.0.1', port, app, threaded=True)
+        ready.put(True)
+        server.serve_forever()
+    else:
+        import asyncio
+        from async_server import AsyncServer, add_stream_route
+
+        server = AsyncServer()
+        add_stream_route(server, broadcaster)
+        asyncio.run(server.serve('127.0.0.1', port, ready=lambda: ready.put(True)))
+
+
+def _process_usage(pid):
+    """Return ``(rss_mb, threads)`` of process ``pid``."""
+    with open(f'/proc/{pid}/statm', encoding='utf-8') as f:
+        rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    with open(f'/proc/{pid}/status', encoding='utf-8') as f:
+        threads = next(int(line.split()[1]) for line in f if line.startswith('Threads:'))
+    return rss, threads
+
+
+async def _stream_clients(port, clients, seconds):
+    """Connect ``clients`` viewers and return per-frame latencies and counts."""
+    import asyncio
+
+    latencies = []
+    counts = [0] * clients
+
+    async def viewer(index):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /stream HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        await reader.readuntil(b'\r\n\r\n')
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                fields = dict(line.split(': ', 1) for line in head.decode().split('\r\n')
+                              if ': ' in line)
+                await reader.readexactly(int(fields['Content-Length']) + 2)
+                latencies.append(time.time() - float(fields['X-Timestamp']))
+                counts[index] += 1
+        finally:
+            writer.close()
+
+    tasks = [asyncio.ensure_future(viewer(i)) for i in range(clients)]
+    await asyncio.sleep(seconds)
+    return latencies, counts, tasks
+
+
+def bench_serve(args):
+    """Compare per-client memory, threads and latency of the serving modes."""
+    import asyncio
+    import socket
+
+    rows = []
+    for mode in args.modes:
+        for clients in args.clients:
+            with socket.socket() as sock:
+                sock.bind(('127.0.0.1', 0))
+                port = sock.getsockname()[1]
+            ctx = multiprocessing.get_context('spawn')
+            ready = ctx.Queue()
+            proc = ctx.Process(target=_serve_stream, daemon=True,
+                               args=(mode, port, args.resolution, args.fps, ready))
+            proc.start()
+            ready.get()
+            time.sleep(0.5)
+            base_rss, _ = _process_usage(proc.pid)
+
+            async def run():
+                latencies, counts, tasks = await _stream_clients(port, clients, args.seconds)
+                usage = _process_usage(proc.pid)
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                return latencies, counts, usage
+
+            latencies, counts, (rss, threads) = asyncio.run(run())
+            proc.terminate()
+            proc.join()
+            latencies.sort()
+            pick = lambda q: latencies[int(q * (len(latencies) - 1))] * 1e3 if latencies else 0.0
+            rows.append({'mode': mode, 'clients': clients, 'threads': threads,
+                         'rss_MB': f"{rss:.1f}",
+                         'KB_per_client': f"{(rss - base_rss) * 1024 / clients:.0f}",
+                         'fps_per_client': f"{sum(counts) / clients / args.seconds:.1f}",
+                         'p50_ms': f"{pick(0.5):.1f}", 'p95_ms': f"{pick(0.95):.1f}"})
+    _print_table(rows, ['mode', 'clients', 'threads', 'rss_MB', 'KB_per_client',
+                        'fps_per_client', 'p50_ms', 'p95_ms'])
+
+
+def main():
+    """Parse the command line and run the selected benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    p = sub.add_parser('buffer', help=bench_buffer.__doc__)
+    p.add_argument('--resolution', type=parse_resolution, default=(1920, 1080))
+    p.add_argument('--length', type=float, default=2)
+    p.add_argument('--fps', type=int, default=30)
+    p.add_argument('--frames', type=int, default=300)
+    p.add_argument('--storage', nargs='+', default=['deque', 'ring', 'encoded'])
+    p.set_defaults(func=bench_buffer)
+
+    p = sub.add_parser('flash', help=bench_flash.__doc__)
+    p.add_argument('--resolutions', type=parse_resolution, nargs='+',
+                   default=[(640, 480), (1280, 720), (1920, 1080), (4056, 3040)])
+    p.add_argument('--strides', type=int, nargs='+', default=[1, 4, 8])
+    p.add_argument('--repeats', type=int, default=50)
+    p.set_defaults(func=bench_flash)
+
+    p = sub.add_parser('laser', help=bench_laser.__doc__)
+    p.add_argument('--resolutions', type=parse_resolution, nargs='+',
+                   default=[(640, 480), (1920, 1080), (4056, 3040)])
+    p.add_argument('--scales', type=int, nargs='+', default=[1, 2, 4])
+    p.add_argument('--frames', type=int, default=40)
+    p.set_defaults(func=bench_laser)
+
+    p = sub.add_parser('detectors', help=bench_detectors.__doc__)
+    p.add_argument('--resolutions', type=parse_resolution, nargs='+',
+                   default=[(640, 480), (1920, 1080), (4056, 3040)])
+    p.add_argument('--modes', nargs='+', default=['thread', 'process'])
+    p.add_argument('--frames', type=int, default=60)
+    p.set_defaults(func=bench_detectors)
+
+    p = sub.add_parser('bayer', help=bench_bayer.__doc__)
+    p.add_argument('--resolutions', type=parse_resolution, nargs='+',
+                   default=[(1332, 990), (2028, 1520), (4056, 3040)])
+    p.add_argument('--repeats', type=int, default=20)
+    p.set_defaults(func=bench_bayer)
+
+    p = sub.add_parser('stream', help=bench_stream.__doc__)
+    p.add_argument('--resolution', type=parse_resolution, default=(1280, 720))
+    p.add_argument('--fps', type=int, default=10)
+    p.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    p.add_argument('--modes', nargs='+', default=['legacy', 'broadcast'])
+    p.add_argument('--seconds', type=float, default=3)
+    p.set_defaults(func=bench_stream)
+
+    p = sub.add_parser('variants', help=bench_variants.__doc__)
+    p.add_argument('--resolution', type=parse_resolution, default=(1920, 1080))
+    p.add_argument('--fps', type=int, default=10)
+    p.add_argument('--clients', type=int, default=16)
+    p.add_argument('--widths', type=int, nargs='+', default=[320, 640, 1280, 0])
+    p.add_argument('--qualities', type=int, nargs='+', default=[50, 80])
+    p.add_argument('--max-variants', type=int, nargs='+', default=[1, 2, 4, 8])
+    p.add_argument('--seconds', type=float, default=3)
+    p.set_defaults(func=bench_variants)
+
+    p = sub.add_parser('metrics', help=bench_metrics.__doc__)
+    p.add_argument('--calls', type=int, default=100000)
+    p.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+    p.add_argument('--per-frame', type=int, default=10,
+                   help='instrumentation calls per captured frame')
+    p.add_argument('--fps', type=int, default=30)
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser('pipeline', help=bench_pipeline.__doc__)
+    p.add_argument('--resolution', type=parse_resolution, default=(1280, 720))
+    p.add_argument('--lores', type=parse_resolution, default=(320, 180))
+    p.add_argument('--fps', type=int, default=30)
+    p.add_argument('--pace', choices=['fast', 'realtime'], default='fast')
+    p.add_argument('--lossless', action='store_true',
+                   help='block instead of dropping in detect/alert (deterministic counts)')
+    p.add_argument('--replay', help='replay this video instead of the synthetic scene')
+    p.add_argument('--flash-every', type=int, default=30)
+    p.add_argument('--laser-every', type=int, default=30)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--clients', type=int, default=2)
+    p.add_argument('--stream-fps', type=int, default=10)
+    p.add_argument('--seconds', type=float, default=5)
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser('serve', help=bench_serve.__doc__)
+    p.add_argument('--resolution', type=parse_resolution, default=(640, 480))
+    p.add_argument('--fps', type=int, default=10)
+    p.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    p.add_argument('--modes', nargs='+', default=['flask', 'async'])
+    p.add_argument('--seconds', type=float, default=3)
+    p.set_defaults(func=bench_serve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
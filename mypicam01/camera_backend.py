@@ -0,0 +1,20 @@
+"""Select the real ``picamera2`` module or the fake stand-in.
+
+Set ``MYPICAM_FAKE_CAMERA=1`` to force the fake camera, e.g. on a Pi with
+the camera stack installed but no sensor attached. Without ``picamera2``
+the fake camera is used automatically.
+"""
+
+import os
+
+FAKE_CAMERA = bool(os.environ.get('MYPICAM_FAKE_CAMERA'))
+
+if not FAKE_CAMERA:
+    try:
+        from picamera2 import MappedArray, Picamera2
+    except ImportError:
+        print("[CAMERA] picamera2 not available, using fake camera")
+        FAKE_CAMERA = True
+
+if FAKE_CAMERA:
+    from fake_picamera2 import MappedArray, Picamera2
@@ -1,53 +1,89 @@
 """Camera initialization utilities."""
 
-from picamera2 import Picamera2
+from camera_sources import open_camera
+
+
+def lores_stream(config):
+    """Return the ``lores`` stream configuration for ``config`` or ``None``.
+
+    ``config['lores']`` is the (width, height) of a small YUV420 stream for
+    detection; it is ignored unless smaller than the main resolution.
+    Dimensions are rounded down to even values as YUV420 requires.
+    """
+    size = config.get('lores')
+    if not size:
+        return None
+    width, height = (int(v) & ~1 for v in size)
+    main_width, main_height = config['resolution']
+    if width <= 0 or height <= 0 or width > main_width or height > main_height:
+        return None
+    if (width, height) == tuple(config['resolution']):
+        return None
+    return {"size": (width, height), "format": "YUV420"}
+
+
+def camera_controls(config):
+    """Return the libcamera controls for camera config ``config``."""
+    controls = {
+        "FrameDurationLimits": (
+            int(1e6 / config['fps']),
+            int(1e6 / config['fps'])
+        ),
+        "AnalogueGain": config['gain'],
+        "ExposureTime": config['exposure'],
+        "AwbEnable": config.get('awb', False),
+        "AeEnable": config.get('ae', False),
+        "NoiseReductionMode": 0,  # Off
+        "Sharpness": config.get('sharpness', 0),
+        "Contrast": config.get('contrast', 0),
+        "Saturation": config.get('saturation', 0),
+        "Brightness": config.get('brightness', 0),
+    }
+    if 'colour_gains' in config:
+        controls['ColourGains'] = config['colour_gains']
+    if 'denoise' in config:
+        controls['NoiseReductionStrength'] = config['denoise']
+    return controls
+
+
+def configure_camera(picam2, config):
+    """Configure the streams of a stopped ``picam2`` and set its controls.
+
+    The main stream is RGB888 at ``config['resolution']``, with the lores
+    stream from ``lores_stream`` and, when ``demosaic`` is off, the raw
+    stream as well. Returns the controls that were set.
+    """
+    controls = camera_controls(config)
+    lores = lores_stream(config)
+    if config.get('demosaic') == 'off':
+        picam2.configure(picam2.create_video_configuration(
+            main={"size": config['resolution'], "format": "RGB888"},
+            lores=lores,
+            transform=None,
+            raw={}
+        ))
+    else:
+        picam2.configure(picam2.create_video_configuration(
+            main={"size": config['resolution'], "format": "RGB888"},
+            lores=lores,
+            transform=None,
+            controls=controls
+        ))
+    picam2.set_controls(controls)
+    return controls
+
 
 class CameraInitializer:
     """Helper to apply configuration options to the camera."""
 
-    def __init__(self, config):
-        """Create the initializer with a configuration dict."""
+    def __init__(self, config, source=None):
+        """Create the initializer for ``config`` and a camera ``source``."""
         self.config = config
-        self.picam2 = Picamera2()
+        self.picam2 = open_camera(source)
 
     def apply_config(self):
         """Apply the stored configuration to the underlying camera."""
-        controls = {
-            "FrameDurationLimits": (
-                int(1e6 / self.config['fps']),
-                int(1e6 / self.config['fps'])
-            ),
-            "AnalogueGain": self.config['gain'],
-            "ExposureTime": self.config['exposure'],
-            "AwbEnable": False,
-            "AeEnable": False,
-            "NoiseReductionMode": 0,  # Off
-            "Sharpness": self.config.get("sharpness", 0),
-            "Contrast": self.config.get("contrast", 0),
-            "Saturation": self.config.get("saturation", 0),
-            "Brightness": self.config.get("brightness", 0),
-        }
-
-        if "colour_gains" in self.config:
-            controls["ColourGains"] = self.config["colour_gains"]
-
-        if "denoise" in self.config:
-            controls["NoiseReductionStrength"] = self.config["denoise"]
-
-        if self.config.get("demosaic") == "off":
-            self.picam2.configure(self.picam2.create_video_configuration(
-                main={"size": self.config["resolution"], "format": "RGB888"},
-                transform=None,
-                raw=True
-            ))
-        else:
-            self.picam2.configure(self.picam2.create_video_configuration(
-                main={"size": self.config["resolution"], "format": "RGB888"},
-                transform=None,
-                controls=controls
-            ))
-
-        self.picam2.set_controls(controls)
+        configure_camera(self.picam2, self.config)
 
     def get_camera(self):
         """Return the configured ``Picamera2`` instance."""
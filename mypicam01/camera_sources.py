@@ -0,0 +1,201 @@
+"""Camera sources: the live camera, video replay or a synthetic scene.
+
+``open_camera(source)`` returns a ``Picamera2``-compatible object for a
+source description such as::
+
+    {'type': 'live'}
+    {'type': 'replay', 'path': 'captures/buffer_20240101_120000.mp4',
+     'pace': 'fast', 'loop': True}
+    {'type': 'synthetic', 'pace': 'realtime', 'flash_every': 30,
+     'laser_every': 30, 'laser_offset': 15, 'seed': 0}
+
+Replay and synthetic sources run on the fake camera, so the whole
+capture, detect, buffer and stream pipeline works on any Linux box;
+``pace='fast'`` produces frames as quickly as they are consumed instead
+of at the configured frame rate. Without an explicit source the
+``MYPICAM_SOURCE`` environment variable is used (``live``, ``synthetic``
+or ``replay:<path>``).
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+import camera_backend
+import fake_picamera2
+
+
+class SyntheticScene:
+    """A dark, noisy scene with flashes and laser spots at known frames.
+
+    Called as a fake-camera pattern, ``scene(index, shape)`` returns frame
+    ``index``. Frame ``i`` holds a flash (the whole frame brightened by
+    ``flash_gain``) when ``i`` is in ``flashes`` or a positive multiple of
+    ``flash_every``, and a laser spot (a saturated disc of ``spot_radius``,
+    by default 1/160 of the frame width so it survives the lores stream's
+    downscaling, at a position derived from ``seed`` and ``i``) when ``i``
+    is in ``lasers`` or equals ``laser_offset`` plus a multiple of
+    ``laser_every``. ``events(count)`` lists the injected events of the
+    first ``count`` frames, as ground truth for detection tests.
+    """
+
+    NOISE_FRAMES = 8  # Precomputed noise frames, cycled to keep frames cheap
+
+    def __init__(self, seed=0, noise=20, flashes=(), flash_every=0, flash_gain=80,
+                 lasers=(), laser_every=0, laser_offset=0, spot_radius=None):
+        """Describe the scene; see the class docstring."""
+        self.seed = seed
+        self.noise = noise
+        self.flashes = set(flashes)
+        self.flash_every = flash_every
+        self.flash_gain = flash_gain
+        self.lasers = set(lasers)
+        self.laser_every = laser_every
+        self.laser_offset = laser_offset
+        self.spot_radius = spot_radius
+        self.shape = None
+        self.backgrounds = None
+
+    def is_flash(self, index):
+        """Return whether frame ``index`` holds a flash."""
+        every = self.flash_every
+        return index in self.flashes or bool(every and index and index % every == 0)
+
+    def is_laser(self, index):
+        """Return whether frame ``index`` holds a laser spot."""
+        every, offset = self.laser_every, self.laser_offset
+        return index in self.lasers or bool(
+            every and index >= offset and (index - offset) % every == 0)
+
+    def laser_position(self, index, shape):
+        """Return the ``(x, y)`` of the laser spot in frame ``index``."""
+        height, width = shape[:2]
+        margin = self._radius(shape) + 2
+        rng = np.random.default_rng((self.seed, index))
+        return (int(rng.integers(margin, width - margin)),
+                int(rng.integers(margin, height - margin)))
+
+    def _radius(self, shape):
+        return self.spot_radius or max(3, shape[1] // 160)
+
+    def events(self, count):
+        """Return ``(index, kind)`` for every injected event before ``count``."""
+        events = []
+        for index in range(count):
+            if self.is_flash(index):
+                events.append((index, 'flash'))
+            if self.is_laser(index):
+                events.append((index, 'laser'))
+        return events
+
+    def __call__(self, index, shape):
+        if shape != self.shape:
+            rng = np.random.default_rng(self.seed)
+            self.shape = shape
+            self.backgrounds = [rng.integers(0, self.noise + 1, shape, dtype=np.uint8)
+                                for _ in range(self.NOISE_FRAMES)]
+        frame = self.backgrounds[index % self.NOISE_FRAMES].copy()
+        if self.is_flash(index):
+            cv2.add(frame, (self.flash_gain,) * 3, dst=frame)
+        if self.is_laser(index):
+            center = self.laser_position(index, shape)
+            cv2.circle(frame, center, self._radius(shape), (255, 255, 255), -1)
+        return frame
+
+
+class VideoReplay:
+    """Frames of a video file (e.g. a clip from ``FrameBuffer.save_to_file``).
+
+    Called as a fake-camera pattern, it returns the file's frames in order,
+    resized to the configured stream size. Frame indices the camera skipped
+    (real-time pace with a slow consumer) are skipped in the file too. At
+    the end the file starts over, or with ``loop=False`` ``EOFError`` is
+    raised, which the capture loop reports as a capture error.
+    """
+
+    def __init__(self, path, loop=True):
+        """Open ``path`` for replay."""
+        self.path = path
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or None
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.last_index = None
+        self.frames_read = 0
+        self.rewinds = 0
+
+    def _read(self):
+        ok, frame = self.capture.read()
+        if not ok:
+            if not self.loop:
+                raise EOFError(f"End of replay: {self.path}")
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self.rewinds += 1
+            ok, frame = self.capture.read()
+            if not ok:
+                raise EOFError(f"No frames in {self.path}")
+        self.frames_read += 1
+        return frame
+
+    def __call__(self, index, shape):
+        skip = index - self.last_index - 1 if self.last_index is not None else 0
+        self.last_index = index
+        for _ in range(max(0, skip)):
+            self._read()
+        frame = self._read()
+        height, width = shape[:2]
+        if frame.shape[:2] != (height, width):
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        return frame
+
+    def close(self):
+        """Release the video file."""
+        self.capture.release()
+
+
+def mapped_array_type(camera):
+    """Return the ``MappedArray`` class that works with ``camera``."""
+    if isinstance(camera, fake_picamera2.Picamera2):
+        return fake_picamera2.MappedArray
+    return camera_backend.MappedArray
+
+
+def source_from_env():
+    """Return the source described by ``MYPICAM_SOURCE`` or ``None``."""
+    value = os.environ.get('MYPICAM_SOURCE')
+    if not value:
+        return None
+    kind, _, path = value.partition(':')
+    return {'type': kind, 'path': path} if path else {'type': kind}
+
+
+def open_camera(source=None):
+    """Return a ``Picamera2``-compatible camera for ``source``.
+
+    ``source`` is a dict as in the module docstring, ``None`` (live, or
+    ``MYPICAM_SOURCE``) or a ready-made pattern callable for the fake
+    camera.
+    """
+    if source is None:
+        source = source_from_env() or {'type': 'live'}
+    if callable(source):
+        return fake_picamera2.Picamera2(pattern=source)
+    kind = source.get('type', 'live')
+    pace = source.get('pace', 'realtime')
+    if kind == 'live':
+        return camera_backend.Picamera2()
+    if kind == 'replay':
+        pattern = VideoReplay(source['path'], source.get('loop', True))
+    elif kind == 'synthetic':
+        options = {key: value for key, value in source.items()
+                   if key not in ('type', 'pace')}
+        pattern = SyntheticScene(**options)
+    elif kind == 'fake':
+        pattern = None
+    else:
+        raise ValueError(f"Unknown camera source: {kind}")
+    print(f"[CAMERA] Using {kind} source ({pace})")
+    return fake_picamera2.Picamera2(pattern=pattern, pace=pace)
@@ -0,0 +1,90 @@
+"""Frame timing derived from sensor timestamps."""
+
+import threading
+import time
+from collections import deque
+
+import metrics
+
+
+class CaptureTiming:
+    """Track achieved frame rate and dropped frames from ``SensorTimestamp``.
+
+    Sensor timestamps mark when each frame was exposed, so unlike arrival
+    times they carry no scheduling jitter. A gap of ``n`` frame periods
+    between consecutive frames means ``n - 1`` frames were dropped. The
+    frame period comes from the ``FrameDuration`` metadata when available,
+    otherwise from the nominal frame rate.
+    """
+
+    def __init__(self, fps, window=60):
+        """Track against nominal ``fps``, averaging over ``window`` frames."""
+        self.lock = threading.Lock()
+        self.window = window
+        self.set_nominal_fps(fps)
+
+    def set_nominal_fps(self, fps):
+        """Reset the statistics for a new nominal frame rate."""
+        with self.lock:
+            self.nominal_fps = fps
+            self.stamps = deque(maxlen=self.window)
+            self.last = None
+            self.offset = None
+            self.frames = 0
+            self.dropped = 0
+            self.errors = 0
+
+    def record(self, sensor_ns, frame_duration_us=None):
+        """Account for one frame and return its wall-clock capture time.
+
+        The wall-clock time is the sensor time shifted by the smallest
+        offset seen between the two clocks, i.e. the least-delayed arrival.
+        Without a sensor timestamp the current time is returned.
+        """
+        now = time.time()
+        if sensor_ns is None:
+            with self.lock:
+                self.frames += 1
+            return now
+        sensor = sensor_ns / 1e9
+        with self.lock:
+            sample = now - sensor
+            if self.offset is None or sample < self.offset or sample - self.offset > 5.0:
+                self.offset = sample  # First frame, smaller delay or clock step
+            if self.last is not None:
+                period = frame_duration_us / 1e6 if frame_duration_us else 1 / self.nominal_fps
+                gap = sensor - self.last
+                if gap <= 0:
+                    return sensor + self.offset  # Repeated or reordered frame
+                missed = max(0, round(gap / period) - 1)
+                self.dropped += missed
+                metrics.count('frames_dropped', missed)
+            self.last = sensor
+            self.stamps.append(sensor)
+            self.frames += 1
+            return sensor + self.offset
+
+    def record_error(self):
+        """Account for a failed capture."""
+        with self.lock:
+            self.errors += 1
+
+    def fps(self):
+        """Return the frame rate achieved over the recent window."""
+        with self.lock:
+            if len(self.stamps) < 2:
+                return 0.0
+            span = self.stamps[-1] - self.stamps[0]
+            return (len(self.stamps) - 1) / span if span > 0 else 0.0
+
+    def stats(self):
+        """Return nominal and achieved fps with frame and drop counters."""
+        fps = self.fps()
+        with self.lock:
+            return {
+                'nominal_fps': self.nominal_fps,
+                'achieved_fps': round(fps, 2),
+                'frames': self.frames,
+                'dropped': self.dropped,
+                'errors': self.errors,
+            }
@@ -0,0 +1,135 @@
+"""Background clip saving with post-trigger recording."""
+
+from collections import deque
+import queue
+import threading
+
+from frame_buffer import write_video
+
+
+class ClipWriter:
+    """Collect pre- and post-event frames and encode clips off-thread.
+
+    ``trigger`` snapshots the pre-event frames from the ``FrameBuffer``,
+    queues the clip for a dedicated writer thread and starts collecting
+    ``post_seconds`` of frames passed to ``add_frame``. The writer encodes
+    the clip while it is recorded: the snapshot holds lazy references into
+    the buffer, which keeps those frames until they are read however slow
+    the writer is, and post-event frames are released as soon as they are
+    written.
+    The capture loop never waits on encoding or disk I/O. When the queue
+    is full the clip is dropped and counted instead of blocking.
+    """
+
+    def __init__(self, frame_buffer, config):
+        """Create the writer for ``frame_buffer`` using ``config`` options."""
+        self.buffer = frame_buffer
+        self.post_seconds = config.get('post_seconds', 0)
+        self.queue = queue.Queue(maxsize=config.get('max_queue', 2))
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.active = None  # Clip currently collecting post-event frames
+        self.saved = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._writer_loop, name='clip-writer', daemon=True)
+        self.thread.start()
+
+    def trigger(self, reason="event", timestamp=None):
+        """Start a clip, or extend the one still collecting post frames.
+
+        Returns ``False`` if the clip was dropped because the queue is full.
+        """
+        with self.lock:
+            if self.active is not None:
+                if timestamp is not None:
+                    self.active['deadline'] = timestamp + self.post_seconds
+                return True
+            frames = self.buffer.snapshot()
+            if timestamp is None:
+                timestamp = frames[-1][1] if frames else 0.0
+            clip = {
+                'reason': reason,
+                'frames': deque(frames),
+                'deadline': timestamp + self.post_seconds,
+                'fps': self.buffer.fps,
+                'done': self.post_seconds <= 0,
+            }
+            try:
+                self.queue.put_nowait(clip)
+            except queue.Full:
+                self.dropped += 1
+                print(f"[CLIP] Writer busy, dropped {reason} clip")
+                return False
+            if not clip['done']:
+                self.active = clip
+            return True
+
+    def add_frame(self, frame, timestamp):
+        """Feed a captured frame to the clip collecting post-event frames.
+
+        The frame is kept by reference, so callers must not modify it later.
+        """
+        with self.lock:
+            if self.active is None:
+                return
+            self.active['frames'].append((frame, timestamp))
+            if timestamp >= self.active['deadline']:
+                self._finish()
+            self.cond.notify_all()
+
+    def _finish(self):
+        """Mark the active clip complete; caller holds ``self.lock``."""
+        self.active['done'] = True
+        self.active = None
+        self.cond.notify_all()
+
+    def _clip_frames(self, clip):
+        """Yield the clip's frames, waiting for post-event frames to arrive."""
+        frames = clip['frames']
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: frames or clip['done'])
+                if not frames:
+                    return
+                item = frames.popleft()
+            yield item
+
+    def _writer_loop(self):
+        while True:
+            clip = self.queue.get()
+            if clip is None:
+                break
+            try:
+                filepath = write_video(self._clip_frames(clip), clip['fps'],
+                                       self.buffer.output_dir)
+            except Exception as exc:
+                print(f"[CLIP] Failed to save {clip['reason']} clip: {exc}")
+                with self.lock:
+                    self.dropped += 1
+                    if self.active is clip:
+                        self.active = None
+                continue
+            finally:
+                self.queue.task_done()
+            if filepath:
+                with self.lock:
+                    self.saved += 1
+                print(f"[CLIP] Saved {clip['reason']} clip to {filepath}")
+
+    def stats(self):
+        """Return queue depth and save counters."""
+        with self.lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'recording': self.active is not None,
+                'saved': self.saved,
+                'dropped': self.dropped,
+            }
+
+    def stop(self):
+        """Finish the clip being recorded, flush queued clips and stop the writer."""
+        with self.lock:
+            if self.active is not None:
+                self._finish()
+        self.queue.put(None)
+        self.thread.join()
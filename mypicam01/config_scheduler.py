@@ -0,0 +1,113 @@
+"""Coalesce configuration updates and apply them on a single worker."""
+
+import threading
+import time
+
+
+def merge_update(pending, update):
+    """Merge ``update`` into ``pending`` in place, later values winning.
+
+    Nested dicts (config sections) are merged key by key, so separate
+    updates to different keys of one section are all kept.
+    """
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(pending.get(key), dict):
+            merge_update(pending[key], value)
+        elif isinstance(value, dict):
+            pending[key] = dict(value)
+        else:
+            pending[key] = value
+
+
+class ConfigScheduler:
+    """Apply configuration changes at most once per ``interval`` seconds.
+
+    ``submit`` merges a change into the pending update and returns its
+    version number immediately. A worker thread applies the merged update
+    by calling ``apply(update)``; while it waits out the interval or an
+    apply is running, further changes are coalesced so only the last value
+    of each setting is applied. Reconfigurations are thus serialized, and
+    a slider drag costs a few applies instead of one per event. Clients
+    poll ``status`` until ``applied`` reaches their version, or
+    ``on_applied(version)`` is called after each apply.
+    """
+
+    def __init__(self, apply, interval=0.25, on_applied=None):
+        """Create the scheduler; ``apply`` receives the merged update."""
+        self.apply = apply
+        self.interval = interval
+        self.on_applied = on_applied
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.version = 0
+        self.applied = 0
+        self.last_apply = 0.0
+        self.last_result = None
+        self.last_error = None
+        self.applies = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._worker, name='config', daemon=True)
+        self.thread.start()
+
+    def submit(self, update):
+        """Queue ``update`` and return the version that will include it."""
+        with self.cond:
+            merge_update(self.pending, update)
+            self.version += 1
+            self.cond.notify_all()
+            return self.version
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                # Let changes keep coalescing until the interval has passed.
+                while self.running:
+                    delay = self.last_apply + self.interval - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self.cond.wait(delay)
+                update, self.pending = self.pending, {}
+                version = self.version
+            result = error = None
+            try:
+                result = self.apply(update)
+            except Exception as exc:
+                error = str(exc)
+                print(f"[CONFIG] Applying update {version} failed: {exc}")
+            with self.cond:
+                self.last_apply = time.monotonic()
+                self.applied = version
+                self.last_result = result
+                self.last_error = error
+                self.applies += 1
+                self.cond.notify_all()
+            if self.on_applied:
+                self.on_applied(version)
+
+    def wait(self, version, timeout=None):
+        """Block until ``version`` is applied; return ``False`` on timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.applied >= version, timeout)
+
+    def status(self):
+        """Return requested and applied versions with the last outcome."""
+        with self.cond:
+            return {
+                'version': self.version,
+                'applied': self.applied,
+                'pending': bool(self.pending) or self.applied < self.version,
+                'applies': self.applies,
+                'result': self.last_result,
+                'error': self.last_error,
+            }
+
+    def close(self):
+        """Stop the worker; pending changes are discarded."""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join()
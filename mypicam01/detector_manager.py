@@ -0,0 +1,171 @@
+"""Run registered detectors off the capture thread."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flash_detector import FlashDetector
+import metrics
+from laser_detector import LaserDetector
+from process_detectors import ProcessDetectorPool
+
+DETECTORS = {
+    'flash': FlashDetector,
+    'laser': LaserDetector,
+}
+
+
+def register_detector(name, factory):
+    """Make ``factory(config)`` available as detector ``name``.
+
+    The returned object must provide ``check(context)`` taking a
+    ``FrameContext`` and returning a truthy value on detection.
+    """
+    DETECTORS[name] = factory
+
+
+class DetectorStats:
+    """Timing counters for a single detector."""
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.errors = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed, hit):
+        """Account for one ``check`` call that took ``elapsed`` seconds."""
+        self.calls += 1
+        self.hits += bool(hit)
+        self.total += elapsed
+        self.last = elapsed
+        self.max = max(self.max, elapsed)
+
+    def as_dict(self):
+        """Return the counters with times in milliseconds."""
+        return {
+            'calls': self.calls,
+            'hits': self.hits,
+            'errors': self.errors,
+            'avg_ms': round(self.total / self.calls * 1e3, 3) if self.calls else 0.0,
+            'last_ms': round(self.last * 1e3, 3),
+            'max_ms': round(self.max * 1e3, 3),
+        }
+
+
+class DetectorManager:
+    """Run all configured detectors on a frame using a worker pool.
+
+    ``run`` is called off the capture thread, by the pipeline's ``detect``
+    stage, which owns the bounded frame queue and its drop counters. Every
+    detector runs on the frame in parallel (OpenCV releases the GIL) and
+    hits are reported through ``on_detection``. Each detector therefore
+    still sees frames one at a time and in order.
+
+    With ``detector_mode`` set to ``'process'`` the detectors run in worker
+    processes fed through shared memory instead (see
+    ``ProcessDetectorPool``), which sidesteps the GIL for pure-Python work.
+    """
+
+    def __init__(self, config, on_detection=None):
+        """Create detectors listed in ``config['detectors']``."""
+        self.config = config
+        self.on_detection = on_detection
+        names = config.get('detectors', ['flash', 'laser'])
+        unknown = [name for name in names if name not in DETECTORS]
+        if unknown:
+            raise ValueError(f"Unknown detectors: {', '.join(unknown)}")
+        self.timings = {name: DetectorStats() for name in names}
+        self.mode = config.get('detector_mode', 'thread')
+        self.detectors = {}
+        self.pool = None
+        self.process_pool = None
+        if self.mode == 'process':
+            self.process_pool = ProcessDetectorPool(
+                {name: DETECTORS[name] for name in names}, config,
+                self._on_process_result, config.get('detector_slots', 4))
+        elif self.mode == 'thread':
+            self.detectors = {name: DETECTORS[name](config) for name in names}
+            workers = config.get('detector_workers', len(self.detectors)) or 1
+            self.pool = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='detector')
+        else:
+            raise ValueError(f"Unknown detector mode: {self.mode}")
+        self.lock = threading.Lock()
+        self.processed = 0
+
+    def _run_one(self, name, context):
+        detector = self.detectors[name]
+        start = time.perf_counter()
+        try:
+            hit = detector.check(context)
+        except Exception as exc:
+            self.timings[name].errors += 1
+            print(f"[DETECT] {name} detector failed: {exc}")
+            return False
+        elapsed = time.perf_counter() - start
+        self.timings[name].record(elapsed, hit)
+        metrics.observe('detector_check', elapsed, detector=name)
+        return hit
+
+    def process(self, context):
+        """Run every detector on ``context`` and return the names that hit."""
+        futures = {name: self.pool.submit(self._run_one, name, context)
+                   for name in self.detectors}
+        return [name for name, future in futures.items() if future.result()]
+
+    def run(self, context):
+        """Detect on ``context`` synchronously and report hits.
+
+        Callers must already run off the capture thread, like the pipeline
+        stage does. In process mode this only hands the frame to the
+        workers; results arrive asynchronously.
+        """
+        if self.process_pool is not None:
+            self.process_pool.submit(context)
+        else:
+            for name in self.process(context):
+                self._notify(name, context)
+        with self.lock:
+            self.processed += 1
+
+    def _notify(self, name, context):
+        if self.on_detection is None:
+            return
+        try:
+            self.on_detection(name, context)
+        except Exception as exc:
+            print(f"[DETECT] Handling {name} detection failed: {exc}")
+
+    def _on_process_result(self, name, context, hit, elapsed, error):
+        """Account for and dispatch a result reported by a worker process."""
+        if error is not None:
+            self.timings[name].errors += 1
+            print(f"[DETECT] {name} detector failed: {error}")
+            return
+        self.timings[name].record(elapsed, hit)
+        metrics.observe('detector_check', elapsed, detector=name)
+        if hit:
+            self._notify(name, context)
+
+    def close(self):
+        """Shut down worker threads or processes."""
+        if self.process_pool is not None:
+            self.process_pool.close()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def stats(self):
+        """Return the processed frame count and per-detector timing.
+
+        Queue depth and drops are reported by the ``detect`` pipeline stage.
+        """
+        with self.lock:
+            processed = self.processed
+        return {
+            'mode': self.mode,
+            'processed': processed,
+            'detectors': {name: timing.as_dict() for name, timing in self.timings.items()},
+        }
@@ -0,0 +1,221 @@
+"""Minimal stand-in for ``picamera2`` to run the pipeline without hardware.
+
+Only the parts of the API this project uses are provided. Frames are
+produced on a sensor clock at the configured frame duration: when the
+consumer is late, the frames it missed are skipped and the next request
+carries a ``SensorTimestamp`` one or more frame periods later, just as a
+real camera drops frames when no buffer is free. With ``pace='fast'`` the
+clock is virtual instead: every request returns the next frame at once,
+none are dropped, and timestamps still advance by one frame duration.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from bayer import mosaic, pack_csi2p10, parse_format
+
+DEFAULT_SIZE = (640, 480)
+DEFAULT_FRAME_DURATION = 33333  # microseconds
+
+
+def _sensor_clock_ns():
+    """Return the clock ``SensorTimestamp`` values are taken from."""
+    try:
+        return time.clock_gettime_ns(time.CLOCK_BOOTTIME)
+    except AttributeError:  # Not Linux
+        return time.monotonic_ns()
+
+
+class FakeRequest:
+    """A completed request holding one frame and its metadata."""
+
+    def __init__(self, arrays, metadata):
+        self.arrays = arrays
+        self.metadata = metadata
+
+    def make_array(self, name):
+        """Return a copy of stream ``name``."""
+        return self.arrays[name].copy()
+
+    def get_metadata(self):
+        """Return the frame metadata."""
+        return dict(self.metadata)
+
+    def release(self):
+        """Return the request to the camera."""
+        self.arrays = None
+
+
+class MappedArray:
+    """Context manager exposing a request's stream as an array."""
+
+    def __init__(self, request, stream):
+        self.request = request
+        self.stream = stream
+        self.array = None
+
+    def __enter__(self):
+        self.array = self.request.arrays[self.stream]
+        return self
+
+    def __exit__(self, *exc):
+        self.array = None
+        return False
+
+
+class Picamera2:
+    """Fake camera producing a synthetic moving pattern.
+
+    ``pattern`` is called as ``pattern(frame_index, shape)`` and may return
+    an array to use instead of the built-in test pattern (see
+    ``camera_sources``). ``pace`` is ``'realtime'`` or ``'fast'``.
+    """
+
+    def __init__(self, camera_num=0, pattern=None, pace='realtime'):
+        if pace not in ('realtime', 'fast'):
+            raise ValueError(f"Unknown pace: {pace}")
+        self.camera_num = camera_num
+        self.pattern = pattern
+        self.pace = pace
+        self.camera_config = None
+        self.controls = {}
+        self.started = False
+        self.frame_duration = DEFAULT_FRAME_DURATION
+        self.sequence = -1
+        self.start_ns = 0
+        self.lock = threading.Lock()
+        self.base = None
+
+    def create_video_configuration(self, main=None, lores=None, raw=None,
+                                   transform=None, controls=None, **kwargs):
+        """Return a configuration dictionary like the real one."""
+        main = dict(main or {})
+        main.setdefault('size', DEFAULT_SIZE)
+        main.setdefault('format', 'XBGR8888')
+        config = {'use_case': 'video', 'main': main, 'lores': None, 'raw': None,
+                  'transform': transform, 'controls': dict(controls or {})}
+        if lores:
+            config['lores'] = dict(lores)
+            config['lores'].setdefault('format', 'YUV420')
+        if raw is not None and raw is not False:
+            config['raw'] = {'size': main['size'], 'format': 'SBGGR10_CSI2P'}
+            if isinstance(raw, dict):
+                config['raw'].update(raw)
+        config.update(kwargs)
+        return config
+
+    create_preview_configuration = create_video_configuration
+    create_still_configuration = create_video_configuration
+
+    def configure(self, config):
+        """Apply a configuration; the camera must be stopped."""
+        if self.started:
+            raise RuntimeError("Camera must be stopped before configuring")
+        self.camera_config = config
+        self.base = None
+        self.set_controls(config.get('controls', {}))
+
+    def set_controls(self, controls):
+        """Update controls; ``FrameDurationLimits`` sets the frame rate."""
+        with self.lock:
+            self.controls.update(controls)
+            limits = self.controls.get('FrameDurationLimits')
+            if limits:
+                duration = max(1, int(limits[0]))
+                if duration != self.frame_duration and self.started:
+                    # Restart the sensor clock at the next frame boundary.
+                    self.start_ns = self._frame_time_ns(self.sequence + 1)
+                    self.sequence = -1
+                self.frame_duration = duration
+
+    def start(self):
+        """Start producing frames."""
+        if self.camera_config is None:
+            self.configure(self.create_video_configuration())
+        with self.lock:
+            self.started = True
+            self.sequence = -1
+            self.start_ns = _sensor_clock_ns()
+
+    def stop(self):
+        """Stop producing frames."""
+        with self.lock:
+            self.started = False
+
+    def close(self):
+        """Release the camera."""
+        self.stop()
+
+    def _frame_time_ns(self, sequence):
+        return self.start_ns + sequence * self.frame_duration * 1000
+
+    def _stream_arrays(self, sequence):
+        width, height = self.camera_config['main']['size']
+        if self.pattern is not None:
+            main = self.pattern(sequence, (height, width, 3))
+        else:
+            if self.base is None:
+                ramp = np.linspace(0, 255, width, dtype=np.uint8)
+                self.base = np.repeat(np.tile(ramp, (height, 1))[:, :, None], 3, axis=2)
+            main = np.roll(self.base, sequence * 4, axis=1)
+        arrays = {'main': main}
+        raw = self.camera_config.get('raw')
+        if raw:
+            order, bits, packed = parse_format(raw['format'])
+            if packed and bits != 10:
+                raise ValueError(f"Fake camera cannot produce {raw['format']}")
+            bayer = mosaic(main, order, bits)
+            arrays['raw'] = pack_csi2p10(bayer) if packed else bayer
+        lores = self.camera_config.get('lores')
+        if lores:
+            lw, lh = lores['size']
+            step_y, step_x = max(1, height // lh), max(1, width // lw)
+            luma = main[::step_y, ::step_x, 1][:lh, :lw]
+            yuv = np.full((lh * 3 // 2, lw), 128, dtype=np.uint8)
+            yuv[:lh] = luma
+            arrays['lores'] = yuv
+        return arrays
+
+    def capture_request(self, wait=None):
+        """Block until the next frame is exposed and return its request."""
+        with self.lock:
+            if not self.started:
+                raise RuntimeError("Camera is not started")
+            now = _sensor_clock_ns()
+            period = self.frame_duration * 1000
+            if self.pace == 'fast':
+                sequence = self.sequence + 1
+            else:
+                # Frames whose time has passed while nobody waited are dropped.
+                sequence = max(self.sequence + 1, (now - self.start_ns) // period)
+            self.sequence = sequence
+            due = self._frame_time_ns(sequence)
+            duration = self.frame_duration
+        delay = (due - now) / 1e9
+        if delay > 0 and self.pace != 'fast':
+            time.sleep(delay)
+        metadata = {
+            'SensorTimestamp': due,
+            'FrameDuration': duration,
+            'ExposureTime': self.controls.get('ExposureTime', duration),
+            'AnalogueGain': self.controls.get('AnalogueGain', 1.0),
+        }
+        return FakeRequest(self._stream_arrays(sequence), metadata)
+
+    def capture_array(self, name='main'):
+        """Capture one frame of stream ``name``."""
+        request = self.capture_request()
+        try:
+            return request.make_array(name)
+        finally:
+            request.release()
+
+    def capture_metadata(self):
+        """Capture the metadata of the next frame."""
+        request = self.capture_request()
+        try:
+            return request.get_metadata()
+        finally:
+            request.release()
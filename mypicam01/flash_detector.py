@@ -1,28 +1,78 @@
 """Bright-flash detection."""
 
-import numpy as np
+import math
+
+from frame_context import FrameContext
+
 
 class FlashDetector:
-    """Detect sudden increases in overall brightness."""
+    """Detect sudden increases in overall brightness.
+
+    Brightness is the mean luma of every ``flash_stride``-th row, taken from
+    the shared ``FrameContext`` (or the Y plane of a single-channel frame).
+    The baseline is the mean of the previous ``max_history - 1`` values,
+    kept as running sums over a fixed ring so each frame costs O(1) beyond
+    the subsample. With ``flash_sigma`` set, a frame triggers when it
+    exceeds the baseline by that many standard deviations instead of by
+    ``flash_threshold`` levels.
+    """
+
+    RESYNC_INTERVAL = 1000  # Recompute the sums now and then to shed rounding drift
 
     def __init__(self, config):
         """Create the detector with configuration options."""
         self.threshold = config.get('flash_threshold', 5.0)
-        self.history = []
+        self.sigma = config.get('flash_sigma', 0)
+        self.min_std = config.get('flash_min_std', 0.5)
+        self.stride = max(1, int(config.get('flash_stride', 4)))
         self.max_history = 10  # Average over last 10 frames
+        self.window = self.max_history - 1
+        self.values = [0.0] * self.window
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.pushes = 0
 
-    def check(self, frame):
-        """Return ``True`` if the frame triggers the flash detector."""
-        gray = np.mean(frame)
-        self.history.append(gray)
+    def brightness(self, frame):
+        """Return the mean luma of a row subsample of ``frame``.
+
+        Skipping whole rows keeps each row contiguous, which lets
+        ``cv2.mean`` run vectorized; skipping columns as well would not.
+        """
+        return FrameContext.wrap(frame).mean_level(self.stride)
 
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
+    def _push(self, value):
+        if self.count == self.window:
+            old = self.values[self.index]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.total += value
+        self.total_sq += value * value
+        self.index = (self.index + 1) % self.window
 
-        if len(self.history) < self.max_history:
-            return False  # Not enough history yet
+        self.pushes += 1
+        if self.pushes % self.RESYNC_INTERVAL == 0:
+            self.total = math.fsum(self.values)
+            self.total_sq = math.fsum(v * v for v in self.values)
+
+    def check(self, frame):
+        """Return ``True`` if the frame (array or ``FrameContext``) triggers."""
+        value = self.brightness(frame)
+        triggered = False
 
-        avg = sum(self.history[:-1]) / (len(self.history) - 1)
-        delta = gray - avg
+        if self.count == self.window:
+            avg = self.total / self.window
+            delta = value - avg
+            if self.sigma:
+                variance = max(self.total_sq / self.window - avg * avg, 0.0)
+                std = max(math.sqrt(variance), self.min_std)
+                triggered = delta > self.sigma * std
+            else:
+                triggered = delta > self.threshold
 
-        return delta > self.threshold
+        self._push(value)
+        return triggered
@@ -1,66 +1,615 @@
 """In-memory rolling video buffer for pre/post event recording."""
 
 import datetime
+import itertools
+import math
 import os
 import threading
+import weakref
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
+import numpy as np
+
+import metrics
+from spill_buffer import DiskRing
+
+
+class DequeStore:
+    """Frame storage backed by a ``deque`` of frames."""
+
+    def __init__(self, max_frames, config=None):
+        """Create an empty store holding at most ``max_frames`` frames."""
+        self.max_frames = max_frames
+        self.frames = deque(maxlen=max_frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def append(self, frame, timestamp):
+        """Store ``frame`` together with ``timestamp``.
+
+        Read-only frames (such as pooled ``Frame.array`` views) are immutable
+        and kept by reference; writable ones are copied.
+        """
+        if frame.flags.writeable:
+            frame = frame.copy()
+        self.frames.append((frame, timestamp))
+
+    def resize(self, max_frames):
+        """Change capacity, keeping the most recent frames."""
+        self.max_frames = max_frames
+        self.frames = deque(list(self.frames)[-max_frames:], maxlen=max_frames)
+
+    def clear(self):
+        """Drop all stored frames."""
+        self.frames.clear()
+
+    def drop_oldest(self):
+        """Discard the oldest stored frame."""
+        self.frames.popleft()
+
+    def oldest(self):
+        """Return the oldest ``(frame, timestamp)`` pair."""
+        return self.frames[0]
+
+    def items(self):
+        """Yield ``(frame, timestamp)`` pairs from oldest to newest."""
+        yield from self.frames
+
+    def snapshot(self):
+        """Return a list of ``(frame, timestamp)`` pairs safe to use unlocked.
+
+        Stored frames are private copies that are never written again, so
+        the snapshot only copies references.
+        """
+        return list(self.frames)
+
+    def frame_shape(self):
+        """Return the shape of the stored frames or ``None`` when empty."""
+        return self.frames[0][0].shape if self.frames else None
+
+    def nbytes(self):
+        """Return the number of bytes held by stored frames."""
+        return sum(frame.nbytes for frame, _ in self.frames)
+
+    raw_nbytes = nbytes
+
+
+class RingFrame:
+    """Reference to a ``RingStore`` slot, pinned for as long as it exists.
+
+    Before reusing a pinned slot the ring copies the frame out into
+    ``data``, so a slow reader still gets every frame it was handed.
+    """
+
+    __slots__ = ('store', 'slot', 'shape', 'data', '__weakref__')
+
+    def __init__(self, store, slot):
+        self.store = store
+        self.slot = slot
+        self.shape = store.frames.shape[1:]
+        self.data = None  # Set when the ring reused the slot
+
+    def decode(self):
+        """Return a copy of the frame."""
+        with self.store.pin_lock:
+            if self.data is not None:
+                return self.data
+            return self.store.frames[self.slot].copy()
+
+
+class RingStore:
+    """Frame storage backed by one preallocated ``(N, H, W, C)`` array.
+
+    Frames are copied in place into the next slot, so steady-state capture
+    performs no allocations. The block is (re)allocated lazily when the
+    first frame arrives or when the frame shape or dtype changes.
+
+    Slots handed out by ``snapshot`` stay pinned while their ``RingFrame``
+    is alive; a pinned slot is copied out before it is overwritten, which
+    only costs memory when a reader falls behind capture.
+    """
+
+    def __init__(self, max_frames, config=None):
+        """Create an empty store holding at most ``max_frames`` frames."""
+        self.max_frames = max_frames
+        self.frames = None
+        self.timestamps = np.zeros(max_frames, dtype=np.float64)
+        self.head = 0  # Next slot to write
+        self.count = 0
+        self.pins = weakref.WeakValueDictionary()  # slot -> RingFrame
+        self.pin_lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _unpin_all(self):
+        """Copy out every pinned slot before the slots are remapped."""
+        with self.pin_lock:
+            for slot, ref in list(self.pins.items()):
+                ref.data = self.frames[slot].copy()
+            self.pins.clear()
+
+    def _allocate(self, shape, dtype):
+        if self.frames is not None:
+            self._unpin_all()
+        self.frames = None  # Release the old block before allocating
+        self.frames = np.empty((self.max_frames,) + tuple(shape), dtype=dtype)
+        self.timestamps = np.zeros(self.max_frames, dtype=np.float64)
+        self.head = 0
+        self.count = 0
+
+    def append(self, frame, timestamp):
+        """Copy ``frame`` into the next ring slot."""
+        if (self.frames is None or self.frames.shape[1:] != frame.shape
+                or self.frames.dtype != frame.dtype):
+            self._allocate(frame.shape, frame.dtype)
+        with self.pin_lock:
+            pinned = self.pins.pop(self.head, None)
+            if pinned is not None:
+                pinned.data = self.frames[self.head].copy()
+        np.copyto(self.frames[self.head], frame)
+        self.timestamps[self.head] = timestamp
+        self.head = (self.head + 1) % self.max_frames
+        self.count = min(self.count + 1, self.max_frames)
+
+    def _order(self):
+        """Return slot indices from oldest to newest."""
+        start = (self.head - self.count) % self.max_frames
+        return [(start + i) % self.max_frames for i in range(self.count)]
+
+    def resize(self, max_frames):
+        """Reallocate with a new capacity, keeping the most recent frames."""
+        if self.frames is None or not self.count:
+            if self.frames is not None:
+                self._unpin_all()
+            self.max_frames = max_frames
+            self.frames = None
+            self.timestamps = np.zeros(max_frames, dtype=np.float64)
+            self.head = 0
+            return
+        keep = self._order()[-max_frames:]
+        old_frames, old_timestamps = self.frames, self.timestamps
+        self.max_frames = max_frames
+        self._allocate(old_frames.shape[1:], old_frames.dtype)
+        for idx in keep:
+            self.append(old_frames[idx], old_timestamps[idx])
+
+    def clear(self):
+        """Drop all stored frames but keep the allocation."""
+        if self.frames is not None:
+            self._unpin_all()
+        self.head = 0
+        self.count = 0
+
+    def oldest(self):
+        """Return the oldest ``(view, timestamp)`` pair."""
+        idx = (self.head - self.count) % self.max_frames
+        return self.frames[idx], float(self.timestamps[idx])
+
+    def items(self):
+        """Yield ``(view, timestamp)`` pairs from oldest to newest.
+
+        The yielded frames are views into the ring and are only valid until
+        the slot is overwritten, so callers must hold the buffer lock.
+        """
+        for idx in self._order():
+            yield self.frames[idx], float(self.timestamps[idx])
+
+    def snapshot(self):
+        """Return ``(RingFrame, timestamp)`` pairs copied out one at a time.
+
+        Nothing is copied up front; the slots stay pinned until the
+        returned frames are dropped. Snapshots share the frames of slots
+        that are already pinned.
+        """
+        frames = []
+        with self.pin_lock:
+            for idx in self._order():
+                ref = self.pins.get(idx)
+                if ref is None:
+                    ref = self.pins[idx] = RingFrame(self, idx)
+                frames.append((ref, float(self.timestamps[idx])))
+        return frames
+
+    def frame_shape(self):
+        """Return the shape of the stored frames or ``None`` when empty."""
+        return self.frames.shape[1:] if self.count else None
+
+    def nbytes(self):
+        """Return the number of bytes held by stored frames."""
+        if self.frames is None:
+            return 0
+        return self.frames[0].nbytes * self.count
+
+    raw_nbytes = nbytes
+
+
+class EncodedFrame:
+    """A buffered frame held as an encoded image until it is needed."""
+
+    __slots__ = ('future', 'shape')
+
+    def __init__(self, future, shape):
+        self.future = future
+        self.shape = shape
+
+    def encoded(self):
+        """Return the encoded bytes, waiting for the encoder if necessary."""
+        return self.future.result()
+
+    def nbytes(self):
+        """Return the encoded size, or the raw size while still encoding."""
+        if self.future.done():
+            return len(self.future.result())
+        return int(np.prod(self.shape))
+
+    def decode(self):
+        """Decode back into an image array."""
+        return cv2.imdecode(self.encoded(), cv2.IMREAD_UNCHANGED)
+
+
+class EncodedStore:
+    """Frame storage holding JPEG (or PNG) encoded frames.
+
+    Encoding runs on a small thread pool since ``cv2.imencode`` releases the
+    GIL; frames are only decoded again when a clip is written. The caller
+    must not modify a frame after appending it, as it is read by the pool.
+    """
+
+    def __init__(self, max_frames, config=None):
+        """Create an empty store holding at most ``max_frames`` frames."""
+        config = config or {}
+        self.max_frames = max_frames
+        self.frames = deque(maxlen=max_frames)
+        self.ext = config.get('encoding', '.jpg')
+        if self.ext == '.png':
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+        else:
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, config.get('jpeg_quality', 90)]
+        workers = config.get('encode_workers', 2)
+        self.pool = ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix='buffer-encode')
+        self.max_pending = workers * 4
+        self.pending = deque()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _encode(self, frame):
+        ok, data = cv2.imencode(self.ext, frame, self.params)
+        if not ok:
+            raise ValueError(f"Failed to encode frame as {self.ext}")
+        return data
+
+    def append(self, frame, timestamp):
+        """Queue ``frame`` for encoding and store its placeholder."""
+        # Bound the number of raw frames held by in-flight encodes.
+        while self.pending and self.pending[0].done():
+            self.pending.popleft()
+        if len(self.pending) >= self.max_pending:
+            self.pending.popleft().result()
+        future = self.pool.submit(self._encode, frame)
+        self.pending.append(future)
+        self.frames.append((EncodedFrame(future, frame.shape), timestamp))
+
+    def resize(self, max_frames):
+        """Change capacity, keeping the most recent frames."""
+        self.max_frames = max_frames
+        self.frames = deque(list(self.frames)[-max_frames:], maxlen=max_frames)
+
+    def clear(self):
+        """Drop all stored frames."""
+        self.frames.clear()
+
+    def drop_oldest(self):
+        """Discard the oldest stored frame."""
+        self.frames.popleft()
+
+    def items(self):
+        """Yield decoded ``(frame, timestamp)`` pairs from oldest to newest."""
+        for frame, timestamp in self.frames:
+            yield frame.decode(), timestamp
+
+    def snapshot(self):
+        """Return ``(EncodedFrame, timestamp)`` pairs; decode happens later."""
+        return list(self.frames)
+
+    def frame_shape(self):
+        """Return the shape of the stored frames or ``None`` when empty."""
+        return self.frames[0][0].shape if self.frames else None
+
+    def nbytes(self):
+        """Return the number of bytes held by stored frames."""
+        return sum(frame.nbytes() for frame, _ in self.frames)
+
+    def encoded_nbytes(self):
+        """Return the bytes held by frames that have finished encoding."""
+        return sum(frame.nbytes() for frame, _ in self.frames
+                   if frame.future.done())
+
+    def mean_encoded_nbytes(self):
+        """Return the mean size of encoded frames, or ``None`` if none are done."""
+        sizes = [frame.nbytes() for frame, _ in self.frames if frame.future.done()]
+        return sum(sizes) / len(sizes) if sizes else None
+
+    def raw_nbytes(self):
+        """Return the size the stored frames would occupy uncompressed."""
+        return sum(int(np.prod(frame.shape)) for frame, _ in self.frames)
+
+    def close(self):
+        """Stop the encoder threads once queued frames are encoded.
+
+        Frames handed out by ``snapshot`` stay readable.
+        """
+        self.pool.shutdown(wait=False)
+
+
+def write_video(frames, fps, output_dir, prefix="buffer"):
+    """Encode ``(frame, timestamp)`` pairs to a timestamped MP4 file.
+
+    Frames may be arrays or lazy frames (``RingFrame``, ``EncodedFrame``,
+    ``DiskFrame``) which are decoded one at a time and skipped if no longer
+    available. ``frames`` may be any iterable, so a clip can be encoded
+    while it is still being recorded. Frames whose size differs from the
+    first one (e.g. buffered at reduced resolution, or captured after a
+    resolution change) are resized to match. Returns the path written or
+    ``None``.
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return None
+
+    now = datetime.datetime.now()
+    filename = now.strftime(f"{prefix}_%Y%m%d_%H%M%S.mp4")
+    filepath = os.path.join(output_dir, filename)
+
+    shape = tuple(first[0].shape)
+    height, width = shape[:2]
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    written = 0
+    with metrics.timer('save'):
+        writer = cv2.VideoWriter(filepath, fourcc, fps, (width, height))
+        for frame, _ in itertools.chain([first], frames):
+            if tuple(frame.shape[2:]) != shape[2:]:
+                continue  # Different pixel format, cannot be mixed in one clip
+            if not isinstance(frame, np.ndarray):
+                frame = frame.decode()
+                if frame is None:
+                    continue
+            if frame.shape[:2] != (height, width):
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+            writer.write(frame)
+            written += 1
+        writer.release()
+    metrics.count('clips_saved')
+    metrics.count('frames_saved', written)
+    return filepath
+
+
+STORAGE_MODES = {
+    'deque': DequeStore,
+    'ring': RingStore,
+    'encoded': EncodedStore,
+}
+
+
+DEGRADE_MODES = ('drop', 'downscale', 'compress')
+
+# Compression assumed for encoded frames until their sizes are measured.
+ENCODED_RATIO_ESTIMATE = 10
+
+
+def parse_memory(value):
+    """Return a memory budget as whole MB, with 0 meaning unlimited.
+
+    Raises ``ValueError`` for values that are not finite numbers, including
+    ``None`` and empty strings from a cleared form field, so a missing
+    value never lifts the bound by accident; negative budgets become 0.
+    """
+    if value is None or isinstance(value, bool):
+        raise ValueError(f"Invalid buffer memory budget: {value!r}")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid buffer memory budget: {value!r}") from None
+    if not math.isfinite(value):
+        raise ValueError(f"Invalid buffer memory budget: {value!r}")
+    return max(0, int(value))
+
 
 class FrameBuffer:
-    """Maintain a fixed-size deque of frames for quick saving."""
+    """Maintain a fixed-size rolling store of frames for quick saving.
+
+    When ``memory`` (MB, 0 = unlimited) is set, the capacity is derived from
+    the shape of the incoming frames, or for encoded storage from the
+    measured encoded size, so the store never exceeds the budget.
+    If ``length`` seconds do not fit, ``degrade`` chooses what gives way:
+    ``drop`` keeps fewer frames, ``downscale`` stores frames at a lower
+    resolution and ``compress`` switches to encoded storage.
+
+    With ``spill_path`` set, frames evicted from a raw RAM store are copied
+    into a memory-mapped ``DiskRing`` of ``spill_size`` MB, and saved clips
+    span both tiers. Frames a pending clip still needs are pinned in both
+    tiers; while the disk tier is pinned or behind on syncing, evicted
+    frames are dropped from it rather than stalling capture.
+    """
 
     def __init__(self, config):
         """Create the buffer according to ``config``."""
+        self.config = config
         self.buffer_seconds = config.get('length', 5)
         self.fps = config.get('fps', 10)
-        self.max_frames = int(self.buffer_seconds * self.fps)
-        self.frames = deque(maxlen=self.max_frames)
+        self.storage = config.get('storage', 'deque')
+        self.memory_budget = parse_memory(config.get('memory', 0))  # MB, 0 = unlimited
+        self.degrade = config.get('degrade', 'drop')
+        if self.degrade not in DEGRADE_MODES:
+            raise ValueError(f"Unknown buffer degrade mode: {self.degrade}")
+        self.frame_shape = None  # Shape of incoming frames
+        self.store_size = None  # (width, height) when downscaling
+        self.frames_since_check = 0
+        self.max_frames, self.active_storage, _ = self._plan()
+        self.frames = STORAGE_MODES[self.active_storage](self.max_frames, config)
+        self.spill = None
+        if config.get('spill_path'):
+            self.spill = DiskRing(config['spill_path'], config.get('spill_size', 1024),
+                                  config.get('spill_sync_frames', 0))
         self.lock = threading.Lock()
-        self.output_dir = "captures"
+        self.output_dir = config.get('output_dir', "captures")
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def update_config(self, fps=None, length=None):
-        """Adjust buffer settings such as FPS and length safely."""
+    def _plan(self):
+        """Return ``(capacity, storage, store_size)`` for the live frame shape."""
+        wanted = max(1, int(self.buffer_seconds * self.fps))
+        budget = int(self.memory_budget * 1024 * 1024)
+        if not budget or self.frame_shape is None:
+            return wanted, self.storage, None
+
+        frame_bytes = int(np.prod(self.frame_shape))
+        if self.storage == 'encoded' or (wanted * frame_bytes > budget
+                                         and self.degrade == 'compress'):
+            frame_bytes = max(1, int(self._encoded_frame_bytes(frame_bytes)))
+            return max(1, min(wanted, budget // frame_bytes)), 'encoded', None
+        if wanted * frame_bytes <= budget:
+            return wanted, self.storage, None
+
+        store_size = None
+        if self.degrade == 'downscale':
+            height, width = self.frame_shape[:2]
+            scale = (budget / (wanted * frame_bytes)) ** 0.5
+            store_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            frame_bytes = store_size[0] * store_size[1] * int(np.prod(self.frame_shape[2:]))
+        return max(1, min(wanted, budget // frame_bytes)), self.storage, store_size
+
+    def _encoded_frame_bytes(self, raw_bytes):
+        """Return the measured, or else estimated, size of an encoded frame."""
+        if self.active_storage == 'encoded':
+            measured = self.frames.mean_encoded_nbytes()
+            if measured:
+                return measured
+        return raw_bytes / ENCODED_RATIO_ESTIMATE
+
+    def _replan(self):
+        """Apply ``_plan`` to the store; caller holds ``self.lock``."""
+        capacity, storage, store_size = self._plan()
+        if storage != self.active_storage:
+            if self.active_storage == 'encoded':
+                self.frames.close()
+            self.frames = STORAGE_MODES[storage](capacity, self.config)
+            self.active_storage = storage
+        elif store_size != self.store_size:
+            self.frames.clear()
+            self.frames.resize(capacity)
+        elif capacity != self.max_frames:
+            self.frames.resize(capacity)
+        self.max_frames = capacity
+        self.store_size = store_size
+
+    def _enforce_budget(self):
+        """Evict encoded frames over budget; caller holds ``self.lock``.
+
+        Summing encoded sizes is linear in the buffer length, so the check
+        runs about once per second of frames. Frames still being encoded are
+        ignored here; their number is bounded by the encoder backlog. The
+        capacity is then replanned from the measured encoded size.
+        """
+        self.frames_since_check += 1
+        if self.frames_since_check < self.fps:
+            return
+        self.frames_since_check = 0
+        budget = self.memory_budget * 1024 * 1024
+        while len(self.frames) > 1 and self.frames.encoded_nbytes() > budget:
+            self.frames.drop_oldest()
+        self._replan()
+
+    def update_config(self, fps=None, length=None, memory=None, degrade=None,
+                      spill_size=None):
+        """Adjust buffer settings such as FPS, length and memory budget safely."""
+        if degrade is not None and degrade not in DEGRADE_MODES:
+            raise ValueError(f"Unknown buffer degrade mode: {degrade}")
+        if memory is not None:
+            memory = parse_memory(memory)
         with self.lock:
             if fps is not None:
                 self.fps = fps
             if length is not None:
                 self.buffer_seconds = length
-            new_max = int(self.buffer_seconds * self.fps)
-            if new_max != self.max_frames:
-                self.max_frames = new_max
-                self.frames = deque(list(self.frames)[-self.max_frames:],
-                                   maxlen=self.max_frames)
+            if memory is not None:
+                self.memory_budget = memory
+            if degrade is not None:
+                self.degrade = degrade
+            if spill_size is not None and self.spill is not None:
+                self.spill.resize(spill_size)
+            self._replan()
 
     def add_frame(self, frame, timestamp):
-        """Append a frame and timestamp to the buffer."""
-        with self.lock:
-            self.frames.append((frame.copy(), timestamp))
+        """Append a frame and timestamp to the buffer.
 
-    def save_to_file(self):
-        """Write the buffered frames to an MP4 file."""
-        with self.lock:
-            if not self.frames:
-                return
+        A change of frame shape (e.g. after a camera reconfiguration) drops
+        the old frames and recomputes the capacity for the new shape.
+        """
+        with metrics.timer('buffer_add'), self.lock:
+            if frame.shape != self.frame_shape:
+                self.frame_shape = frame.shape
+                self.frames.clear()
+                self._replan()
+            if self.store_size is not None:
+                frame = cv2.resize(frame, self.store_size, interpolation=cv2.INTER_AREA)
+            if (self.spill is not None and self.active_storage != 'encoded'
+                    and len(self.frames) >= self.max_frames):
+                self.spill.append(*self.frames.oldest())
+            self.frames.append(frame, timestamp)
+            if self.active_storage == 'encoded' and self.memory_budget:
+                self._enforce_budget()
 
-            now = datetime.datetime.now()
-            filename = now.strftime("buffer_%Y%m%d_%H%M%S.mp4")
-            filepath = os.path.join(self.output_dir, filename)
+    def snapshot(self):
+        """Return the buffered ``(frame, timestamp)`` pairs, oldest first.
 
-            height, width, _ = self.frames[0][0].shape
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            writer = cv2.VideoWriter(filepath, fourcc, self.fps, (width, height))
+        The lock is only held while the frames are gathered, so the result
+        can be encoded without blocking ``add_frame``.
+        """
+        with self.lock:
+            frames = self.frames.snapshot()
+            if self.spill is not None and len(self.spill):
+                frames = self.spill.snapshot() + frames
+            return frames
 
-            for frame, _ in self.frames:
-                writer.write(frame)
-            writer.release()
+    def save_to_file(self):
+        """Write the buffered frames to an MP4 file."""
+        filepath = write_video(self.snapshot(), self.fps, self.output_dir)
+        if filepath:
             print(f"[BUFFER] Saved video to {filepath}")
 
     def estimate_memory_usage(self):
         """Return approximate buffer memory usage in megabytes."""
-        if not self.frames:
-            return 0
-        h, w, c = self.frames[0][0].shape
-        bytes_per_frame = h * w * c
-        return round(bytes_per_frame * len(self.frames) / (1024 * 1024), 2)  # MB
+        with self.lock:
+            return round(self.frames.nbytes() / (1024 * 1024), 2)  # MB
+
+    def spill_usage(self):
+        """Return disk tier frame count and megabytes, or ``None`` if disabled."""
+        if self.spill is None:
+            return None
+        with self.lock:
+            return {
+                'frames': len(self.spill),
+                'capacity_frames': self.spill.capacity,
+                'memory_usage': round(self.spill.nbytes() / (1024 * 1024), 2),
+                'dropped': self.spill.dropped,
+            }
+
+    def close(self):
+        """Commit and close the disk tier, if any."""
+        with self.lock:
+            if self.spill is not None:
+                self.spill.close()
+
+    def compression_ratio(self):
+        """Return raw bytes divided by stored bytes (1.0 for raw storage)."""
+        with self.lock:
+            stored = self.frames.nbytes()
+            if not stored:
+                return 1.0
+            return round(self.frames.raw_nbytes() / stored, 2)
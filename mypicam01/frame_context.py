@@ -0,0 +1,110 @@
+"""Per-frame cache of derived images shared by all detectors."""
+
+import threading
+
+import cv2
+
+# Luma weights matching cv2.COLOR_RGB2GRAY
+LUMA_WEIGHTS = (0.299, 0.587, 0.114)
+
+
+class FrameContext:
+    """Wrap a captured frame and lazily cache views derived from it.
+
+    One context is created per frame and handed to every detector, so each
+    conversion (gray, downscaled levels, histogram, mean level) runs at most
+    once per frame no matter how many detectors ask for it, even when they
+    run concurrently. Derived images are read-only by convention and must
+    not be modified by consumers.
+    """
+
+    def __init__(self, frame, timestamp=None, full_size=None):
+        """Create the context for ``frame`` captured at ``timestamp``.
+
+        ``full_size`` is the ``(width, height)`` of the full-resolution
+        capture when ``frame`` is a smaller image of the same scene (the
+        lores stream, or an image built from the raw stream at half size),
+        so detectors can express their limits in full-resolution pixels.
+        """
+        self.frame = frame
+        self.timestamp = timestamp
+        self.full_size = full_size
+        self._gray = None
+        self._scaled = {}
+        self._pyramid = []
+        self._hist = None
+        self._mean = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def wrap(cls, frame):
+        """Return ``frame`` if it is already a context, else wrap it."""
+        return frame if isinstance(frame, cls) else cls(frame)
+
+    @property
+    def shape(self):
+        """Shape of the underlying frame."""
+        return self.frame.shape
+
+    def full_ratio(self):
+        """Return ``(x, y)`` full-resolution pixels per frame pixel."""
+        if self.full_size is None:
+            return (1.0, 1.0)
+        height, width = self.frame.shape[:2]
+        return (self.full_size[0] / width, self.full_size[1] / height)
+
+    @property
+    def gray(self):
+        """Full-resolution luma; single-channel frames are used as-is."""
+        with self._lock:
+            if self._gray is None:
+                if self.frame.ndim == 2:
+                    self._gray = self.frame
+                else:
+                    self._gray = cv2.cvtColor(self.frame, cv2.COLOR_RGB2GRAY)
+            return self._gray
+
+    def scaled(self, factor):
+        """Return the luma decimated by an integer ``factor`` (INTER_AREA)."""
+        if factor <= 1:
+            return self.gray
+        with self._lock:
+            if factor not in self._scaled:
+                gray = self.gray
+                size = (max(1, gray.shape[1] // factor), max(1, gray.shape[0] // factor))
+                self._scaled[factor] = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+            return self._scaled[factor]
+
+    def pyramid(self, level):
+        """Return Gaussian pyramid level ``level`` of the luma (0 = full)."""
+        if level == 0:
+            return self.gray
+        with self._lock:
+            if not self._pyramid:
+                self._pyramid.append(self.gray)
+            while len(self._pyramid) <= level:
+                self._pyramid.append(cv2.pyrDown(self._pyramid[-1]))
+            return self._pyramid[level]
+
+    def histogram(self):
+        """Return the 256-bin luma histogram as a float32 array."""
+        with self._lock:
+            if self._hist is None:
+                self._hist = cv2.calcHist([self.gray], [0], None, [256], [0, 256]).ravel()
+            return self._hist
+
+    def mean_level(self, stride=1):
+        """Return the mean luma over every ``stride``-th row.
+
+        Uses the cached luma when available; otherwise weights the
+        per-channel means, which gives the same value without a conversion.
+        """
+        with self._lock:
+            if stride not in self._mean:
+                if self._gray is not None or self.frame.ndim == 2:
+                    value = cv2.mean(self.gray[::stride])[0]
+                else:
+                    means = cv2.mean(self.frame[::stride])
+                    value = sum(w * m for w, m in zip(LUMA_WEIGHTS, means))
+                self._mean[stride] = value
+            return self._mean[stride]
@@ -0,0 +1,121 @@
+"""Immutable captured frames backed by a pool of reusable buffers."""
+
+import itertools
+import threading
+import weakref
+from collections import deque
+
+import numpy as np
+
+
+class Frame:
+    """A captured frame shared by reference between all consumers.
+
+    ``array`` is a read-only view of a pooled buffer and ``lores`` an
+    optional read-only luma image of the same instant from the camera's
+    low-resolution stream, used for detection. ``full_size`` is the
+    ``(width, height)`` the scene was captured at when it differs from
+    ``array``, as for the half-size image built from the raw stream.
+    There is no explicit
+    release: the buffer goes back to the pool once this frame, ``array``
+    and every view of it are gone.
+    """
+
+    __slots__ = ('frame_id', 'timestamp', 'sensor_timestamp', 'array', 'lores', 'full_size')
+
+    def __init__(self, frame_id, array, timestamp, sensor_timestamp=None, lores=None,
+                 full_size=None):
+        self.frame_id = frame_id
+        self.array = array
+        self.timestamp = timestamp
+        self.sensor_timestamp = sensor_timestamp
+        self.lores = lores
+        self.full_size = full_size
+
+    @property
+    def shape(self):
+        """Shape of the frame data."""
+        return self.array.shape
+
+
+class FramePool:
+    """Hand out capture buffers, reusing those no longer referenced.
+
+    Each buffer is a ``bytearray`` kept by the pool. It is handed out
+    wrapped in a fresh root array, which every view of it keeps alive
+    through ``.base``, and a finalizer on that root returns the buffer
+    once the last view is gone. So a frame still held by the buffer, a
+    detector, a queued clip or a stream client is never overwritten. Free
+    buffers of a stale shape are discarded.
+    """
+
+    def __init__(self, max_free=4):
+        """Create an empty pool keeping at most ``max_free`` idle buffers."""
+        self.max_free = max_free
+        self.free = deque()  # (buffer, layout) pairs ready for reuse
+        self.lock = threading.RLock()  # Finalizers may run on any thread
+        self.ids = itertools.count()
+        self.in_use = 0
+        self.allocated = 0
+        self.reused = 0
+
+    def _release(self, block, layout):
+        """Take back ``block`` once no array refers to it."""
+        with self.lock:
+            self.in_use -= 1
+            if len(self.free) < self.max_free:
+                self.free.append((block, layout))
+
+    def _acquire(self, shape, dtype):
+        """Return a writable buffer of ``shape``/``dtype`` nobody references."""
+        layout = (tuple(shape), dtype)
+        with self.lock:
+            block = None
+            while self.free:
+                candidate, candidate_layout = self.free.popleft()
+                if candidate_layout == layout:
+                    block = candidate
+                    break  # Stale layouts popped on the way are freed
+            if block is None:
+                block = bytearray(int(np.prod(shape, dtype=np.int64)) * dtype.itemsize)
+                self.allocated += 1
+            else:
+                self.reused += 1
+            self.in_use += 1
+        root = np.frombuffer(block, dtype=dtype)
+        weakref.finalize(root, self._release, block, layout).atexit = False
+        return root.reshape(shape)
+
+    def fill_array(self, shape, dtype, fill):
+        """Return a read-only pooled array of ``shape`` written by ``fill(buf)``."""
+        buf = self._acquire(shape, np.dtype(dtype))
+        fill(buf)
+        view = buf.view()
+        view.flags.writeable = False
+        return view
+
+    def copy_array(self, source):
+        """Copy ``source`` into a pooled buffer and return a read-only view."""
+        return self.fill_array(source.shape, source.dtype,
+                               lambda buf: np.copyto(buf, source))
+
+    def make_frame(self, array, timestamp, sensor_timestamp=None, lores=None,
+                   full_size=None):
+        """Wrap a pooled ``array`` in a new ``Frame``."""
+        return Frame(next(self.ids), array, timestamp, sensor_timestamp, lores, full_size)
+
+    def copy_from(self, source, timestamp, sensor_timestamp=None, lores=None):
+        """Copy ``source`` into a pooled buffer and return it as a ``Frame``.
+
+        ``lores``, if given, is attached as is; use ``copy_array`` to pool it.
+        """
+        return self.make_frame(self.copy_array(source), timestamp, sensor_timestamp, lores)
+
+    def stats(self):
+        """Return pool size and allocation counters."""
+        with self.lock:
+            return {
+                'buffers': self.in_use + len(self.free),
+                'allocated': self.allocated,
+                'reused': self.reused,
+            }
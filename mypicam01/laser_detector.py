@@ -1,40 +1,133 @@
 """Laser-spot detection."""
 
+from collections import namedtuple
+
 import cv2
 import numpy as np
 
+from frame_context import FrameContext
+
+LaserDetection = namedtuple('LaserDetection', ['triggered', 'centroids', 'areas'])
+LaserDetection.__doc__ = """Result of ``LaserDetector.detect``.
+
+``centroids`` is an ``(N, 2)`` array of ``(x, y)`` positions and ``areas``
+the matching blob areas, both in full-resolution pixels even when the
+lores stream was analysed.
+"""
+
+# Shared result for frames without a spot, so none is built per frame.
+NO_DETECTION = LaserDetection(False, np.empty((0, 2)), np.empty(0))
+NO_DETECTION.centroids.flags.writeable = False
+NO_DETECTION.areas.flags.writeable = False
+
+
 class LaserDetector:
-    """Detect focused bright spots against a dark background."""
+    """Detect focused bright spots against a dark background.
+
+    The frame is optionally cropped to ``laser_roi`` (x, y, w, h) and
+    decimated by ``laser_scale`` before processing. ``laser_roi``,
+    ``min_blob`` and ``max_blob`` are in full-resolution pixels; for a
+    ``FrameContext`` of the lores stream they are scaled by its
+    ``full_ratio``. Without a ROI the luma and decimated images come from
+    the shared ``FrameContext``; all other intermediate images are
+    preallocated and reused, and blobs are found in one pass with
+    ``connectedComponentsWithStats`` over the bounding box of the lit
+    pixels, with the blob areas filtered vectorized.
+    """
 
     def __init__(self, config):
         """Create the detector with configuration options."""
         self.threshold = config.get('laser_threshold', 50)
         self.min_blob = config.get('min_blob', 5)
         self.max_blob = config.get('max_blob', 100)
+        self.scale = max(1, int(config.get('laser_scale', 1)))
+        self.roi = config.get('laser_roi')
+        self.roi_px = None  # ``roi`` in pixels of the analysed frame
+        self.ratio = (1.0, 1.0)
         self.background = None
         self.alpha = 0.95  # Background blend weight (0 = no memory, 1 = static bg)
+        self.input_shape = None
 
-    def check(self, frame):
-        """Return ``True`` if a laser spot is detected in ``frame``."""
-        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    def _allocate(self, shape, ratio):
+        """(Re)create the working buffers for frames of ``shape``."""
+        height, width = shape[:2]
+        if self.roi:
+            x, y, w, h = self.roi
+            sx, sy = ratio
+            self.roi_px = (round(x / sx), round(y / sy),
+                           max(1, round(w / sx)), max(1, round(h / sy)))
+            _, _, width, height = self.roi_px
+        self.gray = None  # Only needed when converting without a context
+        self.size = (max(1, width // self.scale), max(1, height // self.scale))
+        small_shape = (self.size[1], self.size[0])
+        self.small = np.empty(small_shape, dtype=np.uint8) if self.scale > 1 else None
+        self.bg_u8 = np.empty(small_shape, dtype=np.uint8)
+        self.diff = np.empty(small_shape, dtype=np.uint8)
+        self.mask = np.empty(small_shape, dtype=np.uint8)
+        self.labels = np.empty(small_shape, dtype=np.int32)
+        self.background = None
+        self.input_shape = shape
+        self.ratio = ratio
+
+    def _prepare(self, frame):
+        """Crop, convert and decimate ``frame`` into ``self.small``."""
+        ratio = frame.full_ratio() if isinstance(frame, FrameContext) else (1.0, 1.0)
+        if frame.shape != self.input_shape or ratio != self.ratio:
+            self._allocate(frame.shape, ratio)
+        if isinstance(frame, FrameContext):
+            if not self.roi:
+                return frame.scaled(self.scale)
+            frame = frame.gray
+        if self.roi:
+            x, y, w, h = self.roi_px
+            frame = frame[y:y + h, x:x + w]
+        if frame.ndim == 3:
+            if self.gray is None:
+                self.gray = np.empty(frame.shape[:2], dtype=np.uint8)
+            cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY, dst=self.gray)
+            gray = self.gray
+        else:
+            gray = frame  # Already luma (e.g. a Y plane)
+        if self.scale == 1:
+            return gray
+        cv2.resize(gray, self.size, dst=self.small, interpolation=cv2.INTER_AREA)
+        return self.small
 
+    def detect(self, frame):
+        """Return a ``LaserDetection`` for ``frame`` (array or ``FrameContext``)."""
+        gray = self._prepare(frame)
         if self.background is None:
             self.background = gray.astype(np.float32)
-            return False
+            return NO_DETECTION
 
-        # Update background model
-        cv2.accumulateWeighted(gray, self.background, self.alpha)
-        bg = cv2.convertScaleAbs(self.background)
+        # Find bright spots against the background of the previous frames,
+        # then blend this frame in with weight ``1 - alpha``.
+        cv2.convertScaleAbs(self.background, dst=self.bg_u8)
+        cv2.subtract(gray, self.bg_u8, dst=self.diff)
+        cv2.accumulateWeighted(gray, self.background, 1 - self.alpha)
+        cv2.threshold(self.diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self.mask)
+        if not cv2.countNonZero(self.mask):
+            return NO_DETECTION
 
-        # Find bright spots
-        diff = cv2.subtract(gray, bg)
-        _, thresh = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        # Label only the bounding box of the lit pixels, which is usually
+        # tiny compared with the frame.
+        x, y, w, h = cv2.boundingRect(self.mask)
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(
+            self.mask[y:y + h, x:x + w], labels=self.labels[:h, :w], connectivity=8)
 
-        # Filter by contour size (to avoid single pixel noise)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if self.min_blob < area < self.max_blob:
-                return True  # Triggered
+        # Filter by blob area (to avoid single pixel noise); limits are in
+        # full-resolution pixels, so scale decimated and lores areas up.
+        sx, sy = self.ratio
+        areas = stats[1:count, cv2.CC_STAT_AREA] * (self.scale * self.scale * sx * sy)
+        keep = (areas > self.min_blob) & (areas < self.max_blob)
+        if not keep.any():
+            return NO_DETECTION
 
-        return False
+        points = (centroids[1:count][keep] + (x + 0.5, y + 0.5)) * self.scale
+        if self.roi:
+            points += self.roi_px[:2]
+        return LaserDetection(True, points * self.ratio - 0.5, areas[keep])
+
+    def check(self, frame):
+        """Return ``True`` if a laser spot is detected in ``frame``."""
+        return self.detect(frame).triggered
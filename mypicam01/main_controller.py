@@ -5,25 +5,55 @@ import subprocess
 import threading
 import time
 
-from picamera2 import Picamera2
+from camera_sources import mapped_array_type, open_camera
+from bayer import BayerConverter
+from camera_initializer import camera_controls, configure_camera
+from capture_timing import CaptureTiming
+from clip_writer import ClipWriter
+from detector_manager import DetectorManager
 from frame_buffer import FrameBuffer
-from flash_detector import FlashDetector
-from laser_detector import LaserDetector
+from frame_context import FrameContext
+from frame_pool import FramePool
+from pipeline import Pipeline
+import metrics
+
+# Defaults for each pipeline stage, overridable per stage via
+# ``config['pipeline'][name]``.
+PIPELINE_STAGES = {
+    'record': {'workers': 1, 'queue': 8, 'policy': 'block'},
+    'detect': {'workers': 1, 'queue': 2, 'policy': 'drop-oldest'},
+    'alert': {'workers': 1, 'queue': 16, 'policy': 'drop-newest'},
+}
+
+# Camera settings that change the stream layout and need a full restart;
+# everything else maps to controls the running camera accepts.
+RESTART_KEYS = ('resolution', 'lores', 'demosaic', 'format')
 
 class MainController:
     """High level control of capture, detection and buffering."""
 
     def __init__(self, config):
         """Initialize controller from a configuration dictionary."""
-        self.picam2 = Picamera2()
         self.config = config
+        # Created first: in process mode it forks workers, best done before
+        # the camera or any other threads exist.
+        self.detectors = DetectorManager(config['detection'], self._on_detection)
+        self.picam2 = open_camera(config.get('source'))
+        self.mapped_array = mapped_array_type(self.picam2)
         self.buffer = FrameBuffer(config['buffer'])
-        self.flash_detector = FlashDetector(config['detection'])
-        self.laser_detector = LaserDetector(config['detection'])
+        self.buffer.update_config(fps=config['camera']['fps'])
+        self.clip_writer = ClipWriter(self.buffer, config['buffer'])
+        self.frame_pool = FramePool()
+        self.lores_pool = FramePool()  # Separate: a pool holds one layout
+        self.bayer = None  # BayerConverter for the raw stream in demosaic-off mode
+        self.timing = CaptureTiming(config['camera']['fps'])
+        self.pipeline = self._build_pipeline()
         self.running = False
         self.trigger_callback = None
         self.last_frame = None
-        self.last_frame_lock = threading.Lock()
+        self.last_frame_lock = threading.Condition()  # Notified on every new frame
+        self.first_frame = threading.Event()
+        self.applied_camera = {}
         self.stream_lock = threading.Lock()
         self.stop_event = threading.Event()
         self.thread = None
@@ -35,121 +65,267 @@ class MainController:
                 return
             self._apply_camera_config()
             self.picam2.start()
+            self.pipeline.start()
             self.running = True
             self.stop_event.clear()
-            self.thread = threading.Thread(target=self.run_loop, daemon=True)
+            self.thread = threading.Thread(target=self.run_loop, name='capture', daemon=True)
             self.thread.start()
 
+    def _build_pipeline(self):
+        """Define the stages fed by the capture loop.
+
+        Captured frames fan out to ``record`` (pre-event buffer and clip
+        writer) and ``detect``; detections go to ``alert``, which saves
+        clips, plays sounds and notifies clients. Each stage has its own
+        bounded queue so a slow stage never stalls capture or its siblings.
+        """
+        overrides = self.config.get('pipeline', {})
+        detection = self.config['detection']
+        stages = {
+            'record': self._record_stage,
+            'detect': self._detect_stage,
+            'alert': self._alert_stage,
+        }
+        pipeline = Pipeline()
+        for name, func in stages.items():
+            options = dict(PIPELINE_STAGES[name])
+            if name == 'detect':
+                options['queue'] = detection.get('detector_queue', options['queue'])
+            options.update(overrides.get(name, {}))
+            pipeline.add_stage(name, func, workers=options['workers'],
+                               queue_size=options['queue'], policy=options['policy'])
+        return pipeline
+
     def _apply_camera_config(self):
         """Configure the underlying ``Picamera2`` instance."""
         cfg = self.config['camera']
-        controls = {
-            "FrameDurationLimits": (
-                int(1e6 / cfg['fps']),
-                int(1e6 / cfg['fps'])
-            ),
-            "AnalogueGain": cfg['gain'],
-            "ExposureTime": cfg['exposure'],
-            "AwbEnable": cfg.get('awb', False),
-            "AeEnable": cfg.get('ae', False),
-            "NoiseReductionMode": 0,
-            "Sharpness": cfg.get('sharpness', 0),
-            "Contrast": cfg.get('contrast', 0),
-            "Saturation": cfg.get('saturation', 0),
-            "Brightness": cfg.get('brightness', 0),
-        }
-        if 'colour_gains' in cfg:
-            controls['ColourGains'] = cfg['colour_gains']
-        if 'denoise' in cfg:
-            controls['NoiseReductionStrength'] = cfg['denoise']
-
-        if cfg.get('demosaic') == 'off':
-            self.picam2.configure(
-                self.picam2.create_video_configuration(
-                    main={"size": cfg['resolution'], "format": "RGB888"},
-                    transform=None,
-                    raw=True,
-                )
-            )
-        else:
-            self.picam2.configure(
-                self.picam2.create_video_configuration(
-                    main={"size": cfg['resolution'], "format": "RGB888"},
-                    transform=None,
-                    controls=controls,
-                )
-            )
+        configure_camera(self.picam2, cfg)
+        self.applied_camera = dict(cfg)
+        self.bayer = None
+        raw = self.picam2.camera_config.get('raw')
+        if cfg.get('demosaic') == 'off' and raw:
+            try:
+                self.bayer = BayerConverter(raw['format'], raw['size'])
+            except ValueError as exc:
+                print(f"[CAMERA] {exc}; using the main stream")
 
-        self.picam2.set_controls(controls)
+    def reconfigure_camera(self, new_camera_config, timeout=2.0):
+        """Apply camera settings, restarting the stream only when required.
 
-    def reconfigure_camera(self, new_camera_config):
-        """Safely update camera settings and restart the stream."""
+        Changes to resolution, format or raw mode stop the capture thread,
+        reconfigure and restart the camera. Anything else is sent to the
+        running camera with ``set_controls`` and the stream never stops.
+        Returns a dict with the ``path`` taken (``none``, ``controls``,
+        ``restart`` or ``deferred`` when the camera is stopped), the
+        ``changed`` keys and the ``outage_ms`` until the first new frame.
+        """
         with self.stream_lock:
-            self.running = False
-            self.stop_event.set()
-            if self.thread:
-                self.thread.join()
-            self.picam2.stop()
-            old_fps = self.config['camera'].get('fps')
-            self.config['camera'].update(new_camera_config)
-            self._apply_camera_config()
-            self.picam2.start()
-            self.running = True
-            self.stop_event.clear()
-            self.thread = threading.Thread(target=self.run_loop, daemon=True)
-            self.thread.start()
+            start = time.perf_counter()
+            cfg = self.config['camera']
+            cfg.update(new_camera_config)
+            changed = sorted(key for key in cfg if cfg[key] != self.applied_camera.get(key))
+            outage = 0.0
+            if not changed:
+                path = 'none'
+            elif not self.running:
+                path = 'deferred'  # Applied by the next start()
+            elif any(key in RESTART_KEYS for key in changed):
+                path = 'restart'
+                self.running = False
+                self.stop_event.set()
+                if self.thread:
+                    self.thread.join()
+                self.picam2.stop()
+                self._update_rate(cfg['fps'])
+                self._apply_camera_config()
+                self.first_frame.clear()
+                self.picam2.start()
+                self.running = True
+                self.stop_event.clear()
+                self.thread = threading.Thread(target=self.run_loop, name='capture', daemon=True)
+                self.thread.start()
+                self.first_frame.wait(timeout)
+                outage = time.perf_counter() - start
+            else:
+                path = 'controls'
+                old = camera_controls(self.applied_camera)
+                controls = {key: value for key, value in camera_controls(cfg).items()
+                            if old.get(key) != value}
+                if 'fps' in changed:
+                    self._update_rate(cfg['fps'])
+                self.picam2.set_controls(controls)
+                self.applied_camera = dict(cfg)
+        elapsed = (time.perf_counter() - start) * 1e3
+        metrics.observe('reconfigure', elapsed / 1e3, path=path)
+        print(f"[CAMERA] Reconfigure via {path} ({', '.join(changed) or 'no changes'}): "
+              f"{elapsed:.1f} ms, outage {outage * 1e3:.1f} ms")
+        return {'path': path, 'changed': changed,
+                'elapsed_ms': round(elapsed, 1), 'outage_ms': round(outage * 1e3, 1)}
+
+    def _update_rate(self, fps):
+        """Resize the buffer and reset timing for a new frame rate."""
+        # A new resolution is picked up by the buffer from the first frame.
+        self.buffer.update_config(fps=fps)
+        self.timing.set_nominal_fps(fps)
+
+    def capture_frame(self):
+        """Capture one frame from the ``main`` stream into a pooled ``Frame``.
+
+        Blocks until the sensor delivers the next frame, which paces the
+        capture loop. The camera buffer is mapped and copied once into a
+        reusable buffer, then the request is returned to the camera straight
+        away. The frame timestamp is derived from ``SensorTimestamp``. With
+        a ``lores`` stream configured its Y plane is copied as well and
+        attached as ``Frame.lores`` for detection. In demosaic-off mode both
+        images come straight from the Bayer raw stream instead: a half-size
+        debayered frame and its green-channel luma.
+        """
+        with metrics.timer('capture'):
+            request = self.picam2.capture_request()
+        try:
+            with metrics.timer('frame_copy'):
+                camera_config = self.picam2.camera_config
+                width, height = camera_config['main']['size']
+                metadata = request.get_metadata()
+                sensor_timestamp = metadata.get('SensorTimestamp')
+                timestamp = self.timing.record(sensor_timestamp, metadata.get('FrameDuration'))
+                if self.bayer is not None:
+                    return self._frame_from_raw(request, timestamp, sensor_timestamp)
+                lores = None
+                if camera_config.get('lores'):
+                    lores_width, lores_height = camera_config['lores']['size']
+                    with self.mapped_array(request, 'lores') as mapped:
+                        # YUV420 is planar: the first rows hold the Y plane.
+                        lores = self.lores_pool.copy_array(mapped.array[:lores_height, :lores_width])
+                with self.mapped_array(request, 'main') as mapped:
+                    source = mapped.array[:height, :width]
+                    return self.frame_pool.copy_from(source, timestamp, sensor_timestamp, lores)
+        finally:
+            request.release()
 
-            # Adjust buffer FPS if changed
-            if new_camera_config.get('fps') and new_camera_config['fps'] != old_fps:
-                self.buffer.update_config(fps=new_camera_config['fps'])
+    def _frame_from_raw(self, request, timestamp, sensor_timestamp):
+        """Build a ``Frame`` from the raw stream without the ISP's demosaic."""
+        bayer = self.bayer
+        with self.mapped_array(request, 'raw') as mapped:
+            raw = mapped.array
+            lores = self.lores_pool.fill_array(bayer.shape, 'uint8',
+                                               lambda buf: bayer.green_luma(raw, buf))
+            image = self.frame_pool.fill_array(bayer.shape + (3,), 'uint8',
+                                               lambda buf: bayer.debayer_half(raw, buf, lores))
+        return self.frame_pool.make_frame(image, timestamp, sensor_timestamp, lores,
+                                          full_size=bayer.size)
 
     def run_loop(self):
-        """Capture frames continuously and run detection."""
+        """Capture frames and feed them into the pipeline.
+
+        The loop is paced by the sensor through ``capture_frame``. Each
+        captured ``Frame`` is immutable and handed by reference to the
+        stages and the stream; none of them copy it.
+        """
+        failures = 0
         while not self.stop_event.is_set():
             try:
-                frame = self.picam2.capture_array()
-            except Exception:
+                frame = self.capture_frame()
+            except Exception as exc:
+                self.timing.record_error()
+                metrics.count('capture_errors')
+                failures += 1
+                if failures == 1 or failures % 50 == 0:
+                    print(f"[CAPTURE] Capture failed ({failures}x): {exc}")
+                # Back off instead of spinning while the camera recovers.
+                self.stop_event.wait(min(1.0, 0.01 * failures))
                 continue
-            timestamp = time.time()
+            failures = 0
+            metrics.count('frames_captured')
             with self.last_frame_lock:
-                self.last_frame = frame.copy()
-            self.buffer.add_frame(frame, timestamp)
-
-            if self.flash_detector.check(frame):
-                if self.config['detection']['autosave_flash']:
-                    self.buffer.save_to_file()
-                if self.config['detection']['sound_flash']:
-                    self.play_alert('flash')
-                if self.trigger_callback:
-                    self.trigger_callback("Flash Detected")
-
-            if self.laser_detector.check(frame):
-                if self.config['detection']['autosave_laser']:
-                    self.buffer.save_to_file()
-                if self.config['detection']['sound_laser']:
-                    self.play_alert('laser')
-                if self.trigger_callback:
-                    self.trigger_callback("Laser Detected")
-
-            time.sleep(1 / self.config['camera']['fps'])
+                self.last_frame = frame
+                self.last_frame_lock.notify_all()
+            self.first_frame.set()
+            self.pipeline.submit('record', frame)
+            self.pipeline.submit('detect', frame)
+
+    def _record_stage(self, frame):
+        """Append a frame to the pre-event buffer and any clip in progress."""
+        self.buffer.add_frame(frame.array, frame.timestamp)
+        self.clip_writer.add_frame(frame.array, frame.timestamp)
+
+    def _detect_stage(self, frame):
+        """Run all detectors on a frame; hits arrive via ``_on_detection``.
+
+        Detectors get the lores Y plane when there is one, so their cost
+        does not depend on the recording resolution. The full capture size
+        (the main stream, or the sensor in raw mode) is passed along so
+        their limits stay in full-resolution pixels.
+        """
+        full_size = frame.full_size
+        if frame.lores is None:
+            context = FrameContext(frame.array, frame.timestamp, full_size)
+        else:
+            if full_size is None:
+                height, width = frame.array.shape[:2]
+                full_size = (width, height)
+            context = FrameContext(frame.lores, frame.timestamp, full_size)
+        self.detectors.run(context)
+
+    def _on_detection(self, name, context):
+        """Queue a detection reported by a detector for the alert stage."""
+        metrics.count('detections', kind=name)
+        self.pipeline.submit('alert', (name, context))
+
+    def _alert_stage(self, event):
+        """Save, alert and notify for one detection."""
+        name, context = event
+        detection = self.config['detection']
+        if detection.get(f'autosave_{name}'):
+            self.clip_writer.trigger(name, context.timestamp)
+        if detection.get(f'sound_{name}'):
+            self.play_alert(name)
+        if self.trigger_callback:
+            self.trigger_callback(f"{name.capitalize()} Detected")
 
     def stop(self):
-        """Stop capturing and shut down the camera."""
+        """Stop capturing and release the camera, detectors, clip writer and buffer.
+
+        Clips still being written are finished first. The controller cannot
+        be started again afterwards.
+        """
         with self.stream_lock:
             self.running = False
             self.stop_event.set()
             if self.thread:
                 self.thread.join()
             self.picam2.stop()
+            self.pipeline.stop()
+            self.detectors.close()
+            self.clip_writer.stop()
+            self.buffer.close()
 
     def set_trigger_callback(self, callback):
         """Set a callback to be invoked on detection events."""
         self.trigger_callback = callback
 
     def get_last_frame(self):
-        """Return a copy of the most recently captured frame."""
+        """Return the most recently captured ``Frame`` or ``None``.
+
+        The frame is shared, not copied; its ``array`` is read-only.
+        """
+        with self.last_frame_lock:
+            return self.last_frame
+
+    def wait_frame(self, after_id=None, timeout=None):
+        """Block until a frame newer than ``after_id`` arrives and return it.
+
+        Returns the latest frame (skipping any in between), or ``None`` if
+        none arrived within ``timeout`` seconds.
+        """
+        def ready():
+            frame = self.last_frame
+            return frame is not None and (after_id is None or frame.frame_id != after_id)
+
         with self.last_frame_lock:
-            return self.last_frame.copy() if self.last_frame is not None else None
+            if not self.last_frame_lock.wait_for(ready, timeout):
+                return None
+            return self.last_frame
 
     def play_alert(self, kind):
         """Play an alert sound if the corresponding file exists."""
@@ -0,0 +1,209 @@
+"""Latency histograms and event counters with Prometheus and JSON export.
+
+Instrumented code calls the module-level helpers::
+
+    with metrics.timer('buffer_add'):
+        ...
+    metrics.count('frames_captured')
+
+While disabled (the default unless ``MYPICAM_METRICS=1``) each call is a
+function call and one attribute check: ``timer`` returns a shared no-op
+context manager and ``count``/``observe`` return at once. ``enable`` turns
+collection on at runtime (``web_server`` does, per ``config['metrics']``).
+"""
+
+import bisect
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the latency buckets; the last bucket is +Inf.
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PREFIX = 'mypicam'
+
+
+class Histogram:
+    """Counts of observations per bucket plus their sum and maximum."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Add one observation (seconds)."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate quantile ``q`` by interpolating within its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                low = self.buckets[index - 1] if index else 0.0
+                high = self.buckets[index] if index < len(self.buckets) else self.max
+                value = low + (high - low) * (rank - seen) / bucket_count
+                return min(value, self.max)
+            seen += bucket_count
+        return self.max
+
+
+class _Timer:
+    """Context manager recording its elapsed time in a histogram."""
+
+    __slots__ = ('metrics', 'key', 'start')
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    """Shared context manager used while metrics are disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+
+def _label_text(labels, extra=()):
+    pairs = [f'{name}="{value}"' for name, value in tuple(labels) + tuple(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metrics:
+    """A registry of latency histograms and counters.
+
+    Latencies are keyed by an operation name plus optional labels (e.g.
+    ``timer('detector_check', detector='flash')``) and exported as one
+    ``mypicam_latency_seconds`` histogram family with an ``op`` label.
+    Each counter name becomes ``mypicam_<name>_total``.
+    """
+
+    def __init__(self, enabled=False):
+        """Create an empty registry."""
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def enable(self, enabled=True):
+        """Turn collection on or off; collected values are kept."""
+        self.enabled = bool(enabled)
+
+    def reset(self):
+        """Forget all collected values."""
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def timer(self, op, **labels):
+        """Return a context manager timing one ``op``."""
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, _key(op, labels))
+
+    def observe(self, op, seconds, **labels):
+        """Record an ``op`` latency measured elsewhere."""
+        if self.enabled:
+            self._observe(_key(op, labels), seconds)
+
+    def _observe(self, key, seconds):
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, n=1, **labels):
+        """Add ``n`` to counter ``name``."""
+        if not self.enabled or not n:
+            return
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def prometheus(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            if histograms:
+                family = f'{PREFIX}_latency_seconds'
+                lines.append(f'# HELP {family} Time spent per operation.')
+                lines.append(f'# TYPE {family} histogram')
+                for (op, labels), histogram in histograms:
+                    labels = (('op', op),) + labels
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f'{family}_bucket{_label_text(labels, [("le", bound)])} {cumulative}')
+                    lines.append(f'{family}_sum{_label_text(labels)} {histogram.sum:.9f}')
+                    lines.append(f'{family}_count{_label_text(labels)} {histogram.count}')
+            last = None
+            for (name, labels), value in counters:
+                family = f'{PREFIX}_{name}_total'
+                if name != last:
+                    lines.append(f'# TYPE {family} counter')
+                    last = name
+                lines.append(f'{family}{_label_text(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Return count, mean, quantiles and maximum (ms) per op, and counters."""
+        def name_of(key):
+            op, labels = key
+            return op + ''.join(f':{value}' for _, value in labels)
+
+        with self.lock:
+            latency = {
+                name_of(key): {
+                    'count': h.count,
+                    'avg_ms': round(h.sum / h.count * 1e3, 3) if h.count else 0.0,
+                    'p50_ms': round(h.quantile(0.5) * 1e3, 3),
+                    'p95_ms': round(h.quantile(0.95) * 1e3, 3),
+                    'p99_ms': round(h.quantile(0.99) * 1e3, 3),
+                    'max_ms': round(h.max * 1e3, 3),
+                }
+                for key, h in sorted(self.histograms.items())
+            }
+            counters = {name_of(key): value for key, value in sorted(self.counters.items())}
+        return {'enabled': self.enabled, 'latency': latency, 'counters': counters}
+
+
+METRICS = Metrics(enabled=os.environ.get('MYPICAM_METRICS') == '1')
+enable = METRICS.enable
+timer = METRICS.timer
+observe = METRICS.observe
+count = METRICS.count
+prometheus = METRICS.prometheus
+summary = METRICS.summary
@@ -0,0 +1,275 @@
+"""Encode the live preview once and fan it out to all stream clients."""
+
+from collections import OrderedDict
+import threading
+import time
+
+import cv2
+
+import metrics
+
+BOUNDARY = 'frame'
+WIDTHS = (320, 640, 1280, 0)  # Preview widths offered; 0 is the native width
+
+
+def mjpeg_part(jpeg, timestamp):
+    """Return one ``multipart/x-mixed-replace`` part for ``jpeg``.
+
+    ``X-Timestamp`` carries the frame's capture time (seconds since the
+    epoch) so clients can measure end-to-end latency.
+    """
+    return (f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+            f'Content-Length: {len(jpeg)}\r\nX-Timestamp: {timestamp:.6f}\r\n\r\n'
+            ).encode('ascii') + jpeg + b'\r\n'
+
+
+def variant_key(width=None, quality=None, default_quality=80):
+    """Normalize requested ``width`` and ``quality`` to a variant key.
+
+    Widths snap down to the nearest entry of ``WIDTHS`` (``None``/``0``
+    means native) and quality to a multiple of 5, so the many values
+    clients might ask for share a handful of encodings.
+    """
+    width = int(width or 0)
+    if width:
+        width = max([w for w in WIDTHS if w and w <= width] or [min(w for w in WIDTHS if w)])
+    quality = default_quality if quality is None else int(quality)
+    quality = min(95, max(10, round(quality / 5) * 5))
+    return width, quality
+
+
+class AdaptiveWidth:
+    """Pick a preview width from a client's observed send throughput.
+
+    ``record`` is given the size of each part and how long the server took
+    to write it. Once per ``window`` parts it compares the throughput with
+    what the current width needs at ``fps`` and steps one width down when
+    the client cannot keep up, or one up when it would still have twice the
+    headroom at the next width (which needs about four times the bytes).
+    """
+
+    def __init__(self, fps, width=640, window=10):
+        """Start at ``width`` for a stream targeting ``fps``."""
+        self.fps = fps or 10
+        self.widths = list(WIDTHS)
+        self.index = self.widths.index(width) if width in self.widths else 1
+        self.window = window
+        self.bytes = 0
+        self.seconds = 0.0
+        self.parts = 0
+
+    @property
+    def width(self):
+        return self.widths[self.index]
+
+    def record(self, nbytes, seconds):
+        """Add one sent part; return the new width when it changes, else ``None``."""
+        self.bytes += nbytes
+        self.seconds += seconds
+        self.parts += 1
+        if self.parts < self.window:
+            return None
+        throughput = self.bytes / max(self.seconds, 1e-6)
+        needed = self.bytes / self.parts * self.fps
+        self.bytes, self.seconds, self.parts = 0, 0.0, 0
+        if throughput < needed * 1.2 and self.index > 0:
+            self.index -= 1
+        elif throughput > needed * 8 and self.index < len(self.widths) - 1:
+            self.index += 1
+        else:
+            return None
+        return self.width
+
+
+class PreviewVariant:
+    """The newest encoding of the preview at one width and quality."""
+
+    def __init__(self, width, quality):
+        self.width = width
+        self.quality = quality
+        self.clients = 0
+        self.jpeg = None
+        self.frame_id = None
+        self.timestamp = 0.0
+        self.encoded = 0
+
+
+class MjpegBroadcaster:
+    """Encode each new frame to JPEG once per variant and share it.
+
+    A single thread waits for frames from ``source.wait_frame`` and encodes
+    them, at most ``max_fps`` per second and only for the variants (width
+    and quality, see ``variant_key``) that have clients. Each width is
+    resized once per frame, whatever the number of qualities. At most
+    ``max_variants`` variants are kept, least recently used first out; when
+    all of them have clients a new request shares the closest one.
+
+    Clients block on a condition variable until a frame newer than the one
+    they last sent is ready; a client that falls behind simply gets the
+    latest frame next, skipping the ones in between, so it never sees
+    duplicates and never slows down the others.
+    """
+
+    def __init__(self, source, quality=80, max_fps=10, max_variants=4):
+        """Create the broadcaster for ``source`` (e.g. a ``MainController``)."""
+        self.source = source
+        self.quality = quality
+        self.max_fps = max_fps
+        self.interval = 1 / max_fps if max_fps else 0
+        self.max_variants = max(1, max_variants)
+        self.cond = threading.Condition()
+        self.variants = OrderedDict()
+        self.clients = 0
+        self.encoded = 0
+        self.sent = 0
+        self.encode_time = 0.0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start the encoder thread."""
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._encode_loop, name='mjpeg', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the encoder thread and release waiting clients."""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def _acquire(self, width=None, quality=None):
+        # Called with self.cond held; returns the variant the client joins.
+        key = variant_key(width, quality, self.quality)
+        variant = self.variants.get(key)
+        if variant is None:
+            if len(self.variants) >= self.max_variants:
+                idle = next((k for k, v in self.variants.items() if not v.clients), None)
+                if idle is None:
+                    key = min(self.variants, key=lambda k: (
+                        abs((k[0] or 10 ** 6) - (key[0] or 10 ** 6)), abs(k[1] - key[1])))
+                else:
+                    del self.variants[idle]
+            variant = self.variants.setdefault(key, PreviewVariant(*key))
+        self.variants.move_to_end(key)
+        variant.clients += 1
+        self.clients += 1
+        self.cond.notify_all()
+        return variant
+
+    def _release(self, variant):
+        # Called with self.cond held.
+        variant.clients -= 1
+        self.clients -= 1
+        if not variant.clients:
+            variant.jpeg = None  # Don't greet the next client with a stale frame
+
+    def _encode(self, frame, variants):
+        encoded = []
+        height, width = frame.array.shape[:2]
+        scaled = {}
+        for variant in variants:
+            target = variant.width if variant.width and variant.width < width else width
+            image = scaled.get(target)
+            if image is None:
+                if target == width:
+                    image = frame.array
+                else:
+                    size = (target, max(2, round(height * target / width / 2) * 2))
+                    image = cv2.resize(frame.array, size, interpolation=cv2.INTER_AREA)
+                scaled[target] = image
+            with metrics.timer('jpeg_encode'):
+                ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, variant.quality])
+            if ok:
+                encoded.append((variant, buffer.tobytes()))
+        return encoded
+
+    def _encode_loop(self):
+        last_id = None
+        while True:
+            with self.cond:
+                while self.running and not self.clients:
+                    self.cond.wait()
+                if not self.running:
+                    return
+            frame = self.source.wait_frame(last_id, timeout=0.5)
+            if frame is None:
+                continue
+            with self.cond:
+                variants = [v for v in self.variants.values() if v.clients]
+            start = time.perf_counter()
+            encoded = self._encode(frame, variants)
+            elapsed = time.perf_counter() - start
+            last_id = frame.frame_id
+            with self.cond:
+                for variant, jpeg in encoded:
+                    if not variant.clients:
+                        continue  # Its last client left while we encoded
+                    variant.jpeg = jpeg
+                    variant.frame_id = last_id
+                    variant.timestamp = frame.timestamp
+                    variant.encoded += 1
+                self.encoded += 1
+                self.encode_time += elapsed
+                self.cond.notify_all()
+            if self.interval > elapsed:
+                time.sleep(self.interval - elapsed)
+
+    def frames(self, width=None, quality=None, timeout=5.0):
+        """Yield ``(jpeg, timestamp)`` for one client, always the newest frame.
+
+        ``width`` and ``quality`` select the variant (see ``variant_key``);
+        ``width='auto'`` adapts the width to how fast the consumer takes
+        each part, measured as the time between ``yield`` and the next
+        ``next()`` call (the server's write of the previous part).
+
+        The generator registers the client while it is alive; closing it
+        (as Flask does when the client disconnects) unregisters it.
+        """
+        adaptive = AdaptiveWidth(self.max_fps) if width == 'auto' else None
+        with self.cond:
+            variant = self._acquire(adaptive.width if adaptive else width, quality)
+        try:
+            last_id = None
+            while True:
+                with self.cond:
+                    self.cond.wait_for(
+                        lambda: not self.running or (variant.jpeg is not None and variant.frame_id != last_id),
+                        timeout)
+                    if not self.running:
+                        return
+                    if variant.jpeg is None or variant.frame_id == last_id:
+                        continue  # No new frame yet; keep waiting
+                    jpeg, last_id, timestamp = variant.jpeg, variant.frame_id, variant.timestamp
+                    self.sent += 1
+                start = time.perf_counter()
+                yield jpeg, timestamp
+                if adaptive:
+                    new_width = adaptive.record(len(jpeg), time.perf_counter() - start)
+                    if new_width is not None:
+                        with self.cond:
+                            self._release(variant)
+                            variant = self._acquire(new_width, quality)
+        finally:
+            with self.cond:
+                self._release(variant)
+
+    def stats(self):
+        """Return client count, encode/send counters and the variants."""
+        with self.cond:
+            return {
+                'clients': self.clients,
+                'encoded': self.encoded,
+                'sent': self.sent,
+                'avg_encode_ms': round(self.encode_time / self.encoded * 1e3, 3)
+                if self.encoded else 0.0,
+                'variants': [{'width': v.width or 'native', 'quality': v.quality,
+                              'clients': v.clients, 'encoded': v.encoded}
+                             for v in self.variants.values()],
+            }
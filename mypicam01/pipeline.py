@@ -0,0 +1,170 @@
+"""Staged processing pipeline with bounded queues and backpressure."""
+
+import threading
+import time
+from collections import deque
+
+POLICIES = ('block', 'drop-oldest', 'drop-newest')
+
+
+class StageStats:
+    """Counters and latency figures for one stage."""
+
+    def __init__(self):
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.busy_total = 0.0
+
+    def as_dict(self, depth):
+        """Return the counters with times in milliseconds."""
+        done = self.processed or 1
+        return {
+            'depth': depth,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'avg_latency_ms': round(self.latency_total / done * 1e3, 3),
+            'max_latency_ms': round(self.latency_max * 1e3, 3),
+            'avg_busy_ms': round(self.busy_total / done * 1e3, 3),
+        }
+
+
+class Stage:
+    """A named step with its own bounded queue and worker threads.
+
+    ``func(item)`` runs on one of ``workers`` threads; a non-``None`` return
+    value is submitted to every stage listed in ``outputs``. When the queue
+    is full ``policy`` decides what happens: ``block`` waits for room,
+    ``drop-oldest`` discards the oldest queued item and ``drop-newest``
+    discards the item being submitted. Stages with more than one worker do
+    not preserve order.
+    """
+
+    def __init__(self, pipeline, name, func, workers=1, queue_size=4,
+                 policy='block', outputs=()):
+        """Create the stage; threads start with ``Pipeline.start``."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.pipeline = pipeline
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.policy = policy
+        self.outputs = tuple(outputs)
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.cond = threading.Condition()
+        self.stats = StageStats()
+        self.running = False
+        self.threads = []
+
+    def put(self, item):
+        """Enqueue ``item`` according to the policy; return ``False`` if dropped."""
+        with self.cond:
+            if len(self.queue) >= self.queue_size:
+                if self.policy == 'drop-newest':
+                    self.stats.dropped += 1
+                    return False
+                if self.policy == 'drop-oldest':
+                    self.queue.popleft()
+                    self.stats.dropped += 1
+                else:
+                    while self.running and len(self.queue) >= self.queue_size:
+                        self.cond.wait()
+                    if not self.running:
+                        self.stats.dropped += 1
+                        return False
+            self.queue.append((time.perf_counter(), item))
+            self.stats.enqueued += 1
+            self.cond.notify_all()
+            return True
+
+    def start(self):
+        """Start the worker threads."""
+        with self.cond:
+            self.running = True
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"stage-{self.name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """Stop the workers and discard queued items."""
+        with self.cond:
+            self.running = False
+            self.queue.clear()
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while self.running and not self.queue:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                enqueued, item = self.queue.popleft()
+                self.cond.notify_all()  # Wake producers blocked on a full queue
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as exc:
+                with self.cond:
+                    self.stats.errors += 1
+                print(f"[PIPELINE] Stage {self.name} failed: {exc}")
+                continue
+            done = time.perf_counter()
+            with self.cond:
+                self.stats.processed += 1
+                self.stats.busy_total += done - start
+                self.stats.latency_total += done - enqueued
+                self.stats.latency_max = max(self.stats.latency_max, done - enqueued)
+            if result is not None:
+                for name in self.outputs:
+                    self.pipeline.submit(name, result)
+
+    def get_stats(self):
+        """Return this stage's counters."""
+        with self.cond:
+            return self.stats.as_dict(len(self.queue))
+
+
+class Pipeline:
+    """A set of stages connected by bounded queues."""
+
+    def __init__(self):
+        """Create an empty pipeline."""
+        self.stages = {}
+
+    def add_stage(self, name, func, workers=1, queue_size=4, policy='block', outputs=()):
+        """Register a stage; see ``Stage`` for the meaning of the options."""
+        stage = Stage(self, name, func, workers, queue_size, policy, outputs)
+        self.stages[name] = stage
+        return stage
+
+    def submit(self, name, item):
+        """Hand ``item`` to stage ``name``; return ``False`` if it was dropped."""
+        return self.stages[name].put(item)
+
+    def start(self):
+        """Start every stage."""
+        for stage in self.stages.values():
+            stage.start()
+
+    def stop(self):
+        """Stop every stage."""
+        for stage in self.stages.values():
+            stage.stop()
+
+    def stats(self):
+        """Return per-stage counters keyed by stage name."""
+        return {name: stage.get_stats() for name, stage in self.stages.items()}
@@ -0,0 +1,197 @@
+"""Run detectors in worker processes fed through shared memory."""
+
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from frame_context import FrameContext
+
+SLOT_TIMEOUT = 1.0  # Seconds to wait for a free slot before checking workers
+
+
+def _attach(name):
+    """Attach to an existing shared memory block owned by the parent.
+
+    Forked workers share the parent's resource tracker, where registering
+    the same block again is a no-op, so older Pythons need no special
+    handling; newer ones are told not to track it at all.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(name, factory, config, inbox, results):
+    """Run one detector over frames announced on ``inbox``."""
+    detector = factory(config)
+    shm = None
+    while True:
+        msg = inbox.get()
+        if msg is None:
+            break
+        shm_name, offset, shape, dtype, seq, timestamp, full_size = msg
+        if shm is None or shm.name != shm_name:
+            if shm is not None:
+                shm.close()
+            shm = _attach(shm_name)
+        frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        frame.flags.writeable = False
+        context = FrameContext(frame, timestamp, full_size)
+        start = time.perf_counter()
+        error = None
+        try:
+            hit = bool(detector.check(context))
+        except Exception as exc:
+            hit, error = False, str(exc)
+        results.put((seq, name, hit, time.perf_counter() - start, error))
+        del context, frame  # Drop views before the block can be closed
+    if shm is not None:
+        shm.close()
+
+
+class ProcessDetectorPool:
+    """Run each detector in its own process over a shared-memory slot ring.
+
+    A frame is copied once into a free slot of a ``SharedMemory`` block and
+    only the slot location is sent to the workers, so no pixel data is
+    pickled. Every detector lives in a dedicated process and therefore still
+    sees frames in order, while different detectors (and consecutive frames)
+    run in parallel across cores. A slot is reused once all detectors have
+    reported on it; results arrive through ``on_result`` on a collector
+    thread. A worker that dies is dropped and the slots waiting for its
+    reports are released, so ``submit`` never blocks on it forever.
+
+    Workers are forked when the pool is created, so it should be built
+    before the camera and capture threads start.
+    """
+
+    def __init__(self, factories, config, on_result, slots=4):
+        """Start one worker per entry of ``factories`` (name -> factory)."""
+        self.on_result = on_result
+        self.slots = slots
+        self.ctx = multiprocessing.get_context('fork')
+        # Start the tracker now so forked workers share it instead of each
+        # spawning their own, which would unlink the blocks when they exit.
+        resource_tracker.ensure_running()
+        self.results = self.ctx.Queue()
+        self.workers = {}
+        for name, factory in factories.items():
+            inbox = self.ctx.Queue()
+            proc = self.ctx.Process(target=_worker_main, daemon=True,
+                                    name=f"detector-{name}",
+                                    args=(name, factory, config, inbox, self.results))
+            proc.start()
+            self.workers[name] = (proc, inbox)
+        self.shm = None
+        self.layout = None  # (shape, dtype) the slot ring is sized for
+        self.slot_bytes = 0
+        self.free = queue.Queue()
+        self.pending = {}  # seq -> [slot, names yet to report, context]
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.collector = threading.Thread(target=self._collect_loop, name='detect-collect', daemon=True)
+        self.collector.start()
+
+    def _ensure_ring(self, frame):
+        """(Re)create the slot ring when the frame layout changes."""
+        layout = (frame.shape, frame.dtype.str)
+        if layout == self.layout:
+            return
+        # Wait for in-flight frames so no worker still reads the old block.
+        for _ in range(self.slots if self.shm is not None else 0):
+            self._take_slot()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+        self.slot_bytes = frame.nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * self.slots)
+        self.layout = layout
+        for slot in range(self.slots):
+            self.free.put(slot)
+
+    def submit(self, context):
+        """Copy the frame into a free slot and hand it to every worker.
+
+        Blocks while all slots are in use, which bounds the work in flight.
+        """
+        if not self.workers:
+            return
+        frame = context.frame
+        self._ensure_ring(frame)
+        slot = self._take_slot()
+        offset = slot * self.slot_bytes
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf, offset=offset)
+        np.copyto(view, frame)
+        del view
+        with self.lock:
+            seq = self.seq
+            self.seq += 1
+            self.pending[seq] = [slot, set(self.workers), context]
+        msg = (self.shm.name, offset, frame.shape, frame.dtype.str, seq,
+               context.timestamp, context.full_size)
+        for _, inbox in self.workers.values():
+            inbox.put(msg)
+
+    def _take_slot(self):
+        """Return a free slot, reaping dead workers while waiting for one."""
+        while True:
+            try:
+                return self.free.get(timeout=SLOT_TIMEOUT)
+            except queue.Empty:
+                self._reap_workers()
+
+    def _reap_workers(self):
+        """Drop dead workers and release the slots waiting on their reports."""
+        for name, (proc, inbox) in list(self.workers.items()):
+            if proc.is_alive():
+                continue
+            print(f"[DETECT] {name} worker exited with code {proc.exitcode}, disabling it")
+            del self.workers[name]
+            inbox.cancel_join_thread()
+            inbox.close()
+            with self.lock:
+                for seq in list(self.pending):
+                    self._reported(seq, name)
+
+    def _reported(self, seq, name):
+        """Mark ``name`` done with frame ``seq``; caller holds ``self.lock``.
+
+        Returns the pending entry, or ``None`` for a stale report.
+        """
+        entry = self.pending.get(seq)
+        if entry is None or name not in entry[1]:
+            return None
+        entry[1].discard(name)
+        if not entry[1]:
+            del self.pending[seq]
+            self.free.put(entry[0])
+        return entry
+
+    def _collect_loop(self):
+        while True:
+            msg = self.results.get()
+            if msg is None:
+                break
+            seq, name, hit, elapsed, error = msg
+            with self.lock:
+                entry = self._reported(seq, name)
+            if entry is not None:
+                self.on_result(name, entry[2], hit, elapsed, error)
+
+    def close(self):
+        """Stop the workers and release the shared memory."""
+        for proc, inbox in self.workers.values():
+            inbox.put(None)
+        for proc, _ in self.workers.values():
+            proc.join()
+        self.results.put(None)
+        self.collector.join()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
@@ -0,0 +1,112 @@
+"""Time-boxed statistical profiler for the running process's threads."""
+
+from collections import Counter
+import os
+import sys
+import threading
+import time
+
+MAX_SECONDS = 60
+MIN_INTERVAL = 0.001
+MAX_OVERHEAD = 0.05  # Fraction of wall time the sampler may spend sampling
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profile is requested while another one runs."""
+
+
+_running = threading.Lock()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(frames, names, threads=None):
+    """Return collapsed stacks (``thread;outer;...;inner``) for one sample.
+
+    ``frames`` is ``sys._current_frames()``, ``names`` maps thread ids to
+    names, and ``threads`` optionally lists name substrings to keep.
+    """
+    stacks = []
+    for ident, frame in frames.items():
+        name = names.get(ident, f'thread-{ident}')
+        if threads and not any(part in name for part in threads):
+            continue
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        labels.append(name.replace(';', '_').replace(' ', '_'))
+        stacks.append(';'.join(reversed(labels)))
+    return stacks
+
+
+def profile(seconds=5.0, interval=0.005, threads=None):
+    """Sample every thread's stack for ``seconds`` and return the result.
+
+    Every ``interval`` seconds the stacks of all threads (or only those
+    whose name contains one of ``threads``) are read from
+    ``sys._current_frames()``; the profiler's own thread is skipped. The
+    pause between samples grows if needed so sampling never takes more
+    than ``MAX_OVERHEAD`` of the wall time. Only one profile runs at a
+    time; a second caller gets ``ProfilerBusy``.
+
+    Returns a dict with ``stacks`` (a ``Counter`` of collapsed stacks, the
+    input format of ``flamegraph.pl`` and speedscope) and sampling stats.
+    """
+    seconds = min(max(float(seconds), 0.1), MAX_SECONDS)
+    interval = max(float(interval), MIN_INTERVAL)
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        busy = 0.0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while True:
+            before = time.perf_counter()
+            if before >= deadline:
+                break
+            frames = sys._current_frames()
+            frames.pop(me, None)
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks.update(sample_stacks(frames, names, threads))
+            del frames
+            samples += 1
+            cost = time.perf_counter() - before
+            busy += cost
+            time.sleep(max(interval - cost, cost / MAX_OVERHEAD - cost))
+        elapsed = time.perf_counter() - start
+        return {
+            'stacks': stacks,
+            'samples': samples,
+            'seconds': round(elapsed, 3),
+            'interval_ms': round(interval * 1e3, 3),
+            'overhead': round(busy / elapsed, 4) if elapsed else 0.0,
+        }
+    finally:
+        _running.release()
+
+
+def collapsed(result):
+    """Return ``result['stacks']`` as collapsed-stack text, one stack per line."""
+    return ''.join(f'{stack} {count}\n' for stack, count in result['stacks'].most_common())
+
+
+def top_functions(result, limit=20):
+    """Return the ``limit`` functions seen on top of stacks most often."""
+    counts = Counter()
+    for stack, count in result['stacks'].items():
+        counts[stack.rsplit(';', 1)[-1]] += count
+    total = sum(counts.values()) or 1
+    return [{'function': name, 'samples': count, 'pct': round(100 * count / total, 1)}
+            for name, count in counts.most_common(limit)]
+
+
+def is_running():
+    """Return whether a profile is in progress."""
+    return _running.locked()
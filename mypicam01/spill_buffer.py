@@ -0,0 +1,366 @@
+"""Memory-mapped on-disk ring of frames used as a second buffer tier."""
+
+import mmap
+import os
+import struct
+import threading
+import weakref
+import zlib
+
+import numpy as np
+
+MAGIC = b'FBRING01'
+VERSION = 1
+HEADER_SLOT = 512  # Two alternating header copies live at 0 and 512
+DATA_ALIGN = 4096
+# magic, version, generation, height, width, channels (0 for 2-D frames),
+# dtype, capacity, written, count, crc32
+HEADER_FORMAT = '<8sIQIII8sQQQI'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SAFETY_MARGIN = 8  # Frames closer than this to being overwritten are skipped
+
+
+def _align(value, alignment=DATA_ALIGN):
+    return (value + alignment - 1) // alignment * alignment
+
+
+class DiskFrame:
+    """Reference to a frame in a ``DiskRing`` that is read on demand.
+
+    The ring does not overwrite the frame while this reference exists.
+    """
+
+    __slots__ = ('ring', 'seq', 'shape', '__weakref__')
+
+    def __init__(self, ring, seq, shape):
+        self.ring = ring
+        self.seq = seq
+        self.shape = shape
+
+    def decode(self):
+        """Return a copy of the frame or ``None`` if it is gone."""
+        view = self.ring.read(self.seq)
+        return None if view is None else view.copy()
+
+
+class DiskRing:
+    """Fixed-size ring of raw frames stored in a memory-mapped file.
+
+    The file starts with two alternating header copies, each protected by a
+    CRC and a generation counter, followed by a timestamp table and the
+    frame slots. Every ``sync_frames`` frames (by default an eighth of the
+    capacity) a background thread flushes the frame data to disk and only
+    then writes and flushes a header. That header leaves out the oldest
+    frames that the next ``2 * sync_frames`` appends will overwrite, so
+    after a crash the newest valid header only points at complete frames
+    and the history can be recovered on the next start.
+
+    ``append`` never waits for the disk: a frame that would overwrite a
+    slot the on-disk header still claims, because the flusher is behind,
+    or a slot pinned by a live ``DiskFrame`` is dropped and counted in
+    ``dropped`` instead. With ``background`` false commits run inline in
+    ``append`` and only pinned slots cause drops.
+
+    Sequence numbers keep counting across ``format`` and ``resize``, so a
+    ``DiskFrame`` taken earlier reads its own frame or ``None``, never a
+    different frame that landed in the same slot.
+    """
+
+    def __init__(self, path, size_mb, sync_frames=0, background=True):
+        """Open or create the ring file at ``path`` sized ``size_mb`` MB."""
+        self.path = path
+        self.size = int(size_mb * 1024 * 1024)
+        self.sync_frames = sync_frames
+        self.background = background
+        self.generation = 0
+        self.shape = None
+        self.dtype = None
+        self.capacity = 0
+        self.written = 0  # Total frames ever written; slot = seq % capacity
+        self.count = 0
+        self.committed = 0  # Oldest seq the on-disk header claims
+        self.dropped = 0
+        self.pins = weakref.WeakValueDictionary()  # seq -> DiskFrame
+        self.timestamps = None
+        self.mm = None
+        self.fd = None
+        self.lock = threading.Lock()  # Guards written/count/committed
+        self.commit_lock = threading.Lock()  # One header write at a time
+        self.wake = threading.Event()
+        self.closing = False
+        self.flusher = None
+        self._open()
+        self._start_flusher()
+
+    # ---- File handling ----
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size != self.size:
+            os.ftruncate(self.fd, self.size)
+        self.mm = mmap.mmap(self.fd, self.size)
+        header = self._read_header()
+        if header is not None and self._layout_fits(header):
+            self._load(header)
+
+    def _start_flusher(self):
+        if not self.background:
+            return
+        self.closing = False
+        self.flusher = threading.Thread(target=self._flush_loop, name='spill-flush',
+                                        daemon=True)
+        self.flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            if self.closing:
+                return
+            try:
+                self._commit(self.reserve)
+            except (OSError, ValueError) as exc:
+                print(f"[SPILL] Commit failed: {exc}")
+
+    def _request_commit(self):
+        if self.background:
+            self.wake.set()
+        else:
+            self._commit(self.reserve)
+
+    def close(self):
+        """Stop the flusher, commit the header and close the backing file."""
+        if self.flusher is not None:
+            self.closing = True
+            self.wake.set()
+            self.flusher.join()
+            self.flusher = None
+        if self.mm is not None:
+            if self.shape is not None:
+                self._commit()
+            self.timestamps = None
+            try:
+                self.mm.close()
+            except BufferError:
+                pass  # Views handed to readers keep the map alive until released
+            self.mm = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def flush(self):
+        """Force the frames to disk and commit a header describing them.
+
+        Runs in the calling thread; the header leaves room for the next
+        appends like the background commits do.
+        """
+        if self.shape is not None:
+            self._commit(self.reserve)
+
+    def _commit(self, reserve=0):
+        """Flush the frame data, then write and flush a header for it.
+
+        The header claims only frames written before the data flush and
+        leaves out the frames that the next ``reserve`` appends will
+        overwrite. ``append`` may run meanwhile: until the new header is
+        on disk it keeps to the slots the previous header left free.
+        """
+        with self.commit_lock:
+            with self.lock:
+                written, count = self.written, self.count
+            self.mm.flush()
+            with self.lock:
+                committed = max(written - count, self.written + reserve - self.capacity)
+            self._write_header(written, max(0, written - committed))
+            self.mm.flush(0, min(self.size, mmap.PAGESIZE))
+            with self.lock:
+                self.committed = committed
+
+    # ---- Header ----
+    def _read_header(self):
+        """Return the newest valid header as a dict, or ``None``."""
+        best = None
+        for offset in (0, HEADER_SLOT):
+            raw = self.mm[offset:offset + HEADER_SIZE]
+            fields = struct.unpack(HEADER_FORMAT, raw)
+            if fields[0] != MAGIC or fields[1] != VERSION:
+                continue
+            if zlib.crc32(raw[:-4]) != fields[-1]:
+                continue
+            header = {
+                'generation': fields[2],
+                'shape': fields[3:6] if fields[5] else fields[3:5],
+                'dtype': fields[6].rstrip(b'\0').decode(),
+                'capacity': fields[7],
+                'written': fields[8],
+                'count': fields[9],
+            }
+            if best is None or header['generation'] > best['generation']:
+                best = header
+        return best
+
+    def _write_header(self, written, count):
+        self.generation += 1
+        height, width = self.shape[:2]
+        channels = self.shape[2] if len(self.shape) > 2 else 0
+        packed = struct.pack(
+            HEADER_FORMAT[:-1], MAGIC, VERSION, self.generation,
+            height, width, channels, self.dtype.str.encode(), self.capacity,
+            written, count,
+        )
+        packed += struct.pack('<I', zlib.crc32(packed))
+        offset = (self.generation % 2) * HEADER_SLOT
+        self.mm[offset:offset + HEADER_SIZE] = packed
+
+    def _layout(self, shape, dtype):
+        """Return ``(capacity, timestamp_offset, data_offset)`` for a shape."""
+        frame_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        usable = self.size - DATA_ALIGN
+        capacity = max(0, usable // (frame_bytes + 8))
+        while capacity and _align(DATA_ALIGN + capacity * 8) + capacity * frame_bytes > self.size:
+            capacity -= 1
+        return capacity, DATA_ALIGN, _align(DATA_ALIGN + capacity * 8)
+
+    def _layout_fits(self, header):
+        capacity, _, _ = self._layout(header['shape'], header['dtype'])
+        return capacity == header['capacity'] and header['count'] <= capacity
+
+    def _load(self, header):
+        self.generation = header['generation']
+        self._map(header['shape'], np.dtype(header['dtype']))
+        self.written = header['written']
+        self.count = header['count']
+        self.committed = self.written - self.count
+
+    def _map(self, shape, dtype):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.capacity, ts_offset, self.data_offset = self._layout(shape, dtype)
+        self.frame_bytes = int(np.prod(shape)) * self.dtype.itemsize
+        self.sync_every = self.sync_frames or max(1, self.capacity // 8)
+        self.reserve = min(self.capacity, 2 * self.sync_every)
+        self.timestamps = np.frombuffer(self.mm, dtype=np.float64,
+                                        count=self.capacity, offset=ts_offset)
+
+    def format(self, shape, dtype):
+        """Discard contents and lay the file out for frames of ``shape``.
+
+        The new header is written before returning, so this waits for the
+        disk; it only happens when the frame shape changes.
+        """
+        with self.commit_lock:
+            self.timestamps = None
+            self.pins = weakref.WeakValueDictionary()
+            self._map(shape, dtype)
+            with self.lock:
+                self.count = 0
+                self.committed = self.written
+        self._commit()
+
+    # ---- Frames ----
+    def __len__(self):
+        return self.count
+
+    def _slot(self, seq):
+        offset = self.data_offset + (seq % self.capacity) * self.frame_bytes
+        count = self.frame_bytes // self.dtype.itemsize
+        view = np.frombuffer(self.mm, dtype=self.dtype, count=count, offset=offset)
+        return view.reshape(self.shape)
+
+    def append(self, frame, timestamp):
+        """Copy ``frame`` into the next slot, reformatting on shape changes.
+
+        Returns ``False`` if the frame was dropped rather than overwrite a
+        slot that is still needed.
+        """
+        if self.shape != frame.shape or self.dtype != frame.dtype:
+            self.format(frame.shape, frame.dtype)
+        if not self.capacity:
+            return False
+        seq = self.written
+        replaced = seq - self.capacity
+        if replaced in self.pins:
+            self.dropped += 1
+            return False
+        if replaced >= self.committed:
+            # The on-disk header still claims the frame in this slot.
+            self._request_commit()
+            if replaced >= self.committed:
+                self.dropped += 1
+                return False
+        np.copyto(self._slot(seq), frame)
+        self.timestamps[seq % self.capacity] = timestamp
+        with self.lock:
+            self.written = seq + 1
+            self.count = min(self.count + 1, self.capacity)
+        if self.written % self.sync_every == 0:
+            self._request_commit()
+        return True
+
+    def read(self, seq):
+        """Return a read-only view of frame ``seq`` or ``None`` if it is gone.
+
+        Unless the frame is pinned by a ``DiskFrame``, frames about to be
+        overwritten are treated as gone, so a view handed to a slow reader
+        is not replaced underneath it.
+        """
+        if self.mm is None or not self.written - self.count <= seq < self.written:
+            return None
+        margin = min(SAFETY_MARGIN, self.capacity // 8)
+        if seq not in self.pins and seq + self.capacity <= self.written + margin:
+            return None
+        view = self._slot(seq)
+        view.flags.writeable = False
+        return view
+
+    def items(self):
+        """Yield ``(view, timestamp)`` pairs from oldest to newest."""
+        for seq in range(self.written - self.count, self.written):
+            yield self._slot(seq), float(self.timestamps[seq % self.capacity])
+
+    def snapshot(self):
+        """Return ``(DiskFrame, timestamp)`` pairs read lazily at save time.
+
+        The frames stay pinned until the returned references are dropped.
+        """
+        frames = []
+        for seq in range(self.written - self.count, self.written):
+            ref = self.pins.get(seq)
+            if ref is None:
+                ref = self.pins[seq] = DiskFrame(self, seq, self.shape)
+            frames.append((ref, float(self.timestamps[seq % self.capacity])))
+        return frames
+
+    def nbytes(self):
+        """Return the number of bytes held by stored frames."""
+        return self.count * self.frame_bytes if self.shape else 0
+
+    def resize(self, size_mb):
+        """Change the file size, keeping as many recent frames as fit.
+
+        Frames are copied slot by slot into a new file which then atomically
+        replaces the old one, so a crash mid-resize leaves a valid ring.
+        Kept frames keep their sequence numbers, so outstanding
+        ``DiskFrame`` references stay valid or read as gone.
+        """
+        tmp_path = self.path + '.resize'
+        new = DiskRing(tmp_path, size_mb, self.sync_frames, background=False)
+        written = self.written
+        if self.shape is not None:
+            keep = min(self.count, new._layout(self.shape, self.dtype)[0])
+            new.written = written - keep
+            new.format(self.shape, self.dtype)
+            for seq in range(written - keep, written):
+                new.append(self._slot(seq), self.timestamps[seq % self.capacity])
+        new.close()
+        self.close()
+        os.replace(tmp_path, self.path)
+        self.size = int(size_mb * 1024 * 1024)
+        self.shape = None
+        self.capacity = self.count = 0
+        self._open()
+        self.written = max(self.written, written)
+        self.committed = max(self.committed, self.written - self.count)
+        self._start_flusher()
@@ -0,0 +1,229 @@
+"""Push detection events and status changes to browsers (Server-Sent Events)."""
+
+from collections import deque
+import json
+import threading
+import time
+
+KEEPALIVE = 15  # seconds between SSE comments on an idle connection
+
+
+def sse_message(kind, data, event_id=None):
+    """Return one Server-Sent Events message as bytes."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {kind}')
+    lines.append(f'data: {json.dumps(data, default=str)}')
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+def status_delta(old, new):
+    """Return the parts of ``new`` that differ from ``old``.
+
+    Nested dicts are compared key by key, anything else (lists included)
+    as a whole. Keys missing from ``new`` are not reported.
+    """
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key) if isinstance(old, dict) else None
+        if isinstance(value, dict) and isinstance(previous, dict):
+            inner = status_delta(previous, value)
+            if inner:
+                delta[key] = inner
+        elif value != previous or key not in old:
+            delta[key] = value
+    return delta
+
+
+def _hold(new, old, path):
+    """Return ``new`` with the value at key ``path`` (a tuple) taken from ``old``."""
+    if not isinstance(new, dict) or not isinstance(old, dict):
+        return new
+    key, rest = path[0], path[1:]
+    if key not in new or key not in old:
+        return new
+    new = dict(new)
+    new[key] = _hold(new[key], old[key], rest) if rest else old[key]
+    return new
+
+
+class EventHub:
+    """Numbered events with a short history, shared by all subscribers.
+
+    ``publish`` appends an event and wakes waiters; each subscriber keeps
+    only the id of the last event it sent, so a thousand subscribers cost
+    no more memory than one. A subscriber that falls more than ``history``
+    events behind gets ``None`` from ``since`` and must resynchronize.
+    ``add_listener`` registers a callback run on every publish, used to
+    wake event loops that cannot block on the condition.
+    """
+
+    def __init__(self, history=100):
+        """Create a hub remembering the last ``history`` events."""
+        self.cond = threading.Condition()
+        self.events = deque(maxlen=history)
+        self.last_id = 0
+        self.listeners = []
+
+    def publish(self, kind, data):
+        """Add an event and return its id."""
+        with self.cond:
+            self.last_id += 1
+            self.events.append((self.last_id, kind, data))
+            self.cond.notify_all()
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener()
+        return self.last_id
+
+    def since(self, after_id):
+        """Return events newer than ``after_id``, or ``None`` if some were lost."""
+        with self.cond:
+            return self._since(after_id)
+
+    def _since(self, after_id):
+        if self.events and after_id < self.events[0][0] - 1:
+            return None
+        return [event for event in self.events if event[0] > after_id]
+
+    def wait(self, after_id, timeout=None):
+        """Block until there are events newer than ``after_id`` and return them.
+
+        Returns ``[]`` on timeout and ``None`` if events were lost.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.last_id > after_id, timeout)
+            return self._since(after_id)
+
+    def add_listener(self, callback):
+        """Call ``callback()`` after every publish."""
+        with self.cond:
+            self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Stop calling ``callback``."""
+        with self.cond:
+            self.listeners.remove(callback)
+
+
+class StatusPublisher:
+    """Sample the status once per ``interval`` and publish what changed.
+
+    ``collect()`` builds the full status dict (what ``/get_config``
+    returns). The worker caches it for ``snapshot`` and publishes a
+    ``status`` event holding only the changed keys, so the cost does not
+    depend on how many pages are open and idle periods send nothing.
+    ``refresh`` samples again at once, e.g. after a config change.
+
+    Keys listed in ``volatile`` (dotted paths such as ``'system'`` or
+    ``'buffer.memory_usage'``) hold counters and readings that change on
+    every sample. Their changes are only published every
+    ``volatile_interval`` seconds, so an otherwise idle system does not
+    send a delta each interval; ``snapshot`` always has the latest values.
+    """
+
+    def __init__(self, collect, hub=None, interval=1.0, volatile=(), volatile_interval=10.0):
+        """Create the publisher; call ``start`` to begin sampling."""
+        self.collect = collect
+        self.hub = hub or EventHub()
+        self.interval = interval
+        self.volatile = [tuple(path.split('.')) for path in volatile]
+        self.volatile_interval = volatile_interval
+        self.volatile_due = 0.0
+        self.sent = None  # The status as subscribers know it
+        self.cond = threading.Condition()
+        self.status = None
+        self.samples = 0
+        self.published = 0
+        self.wakeup = False
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Take the first sample and start the worker thread."""
+        self._sample()
+        self.running = True
+        self.thread = threading.Thread(target=self._worker, name='status', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the worker thread."""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def refresh(self):
+        """Sample and publish now instead of at the next interval."""
+        with self.cond:
+            self.wakeup = True
+            self.cond.notify_all()
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.wakeup or not self.running, self.interval)
+                if not self.running:
+                    return
+                self.wakeup = False
+            try:
+                self._sample()
+            except Exception as exc:
+                print(f"[STATUS] Sampling failed: {exc}")
+
+    def _sample(self):
+        status = self.collect()
+        # Round-trip through JSON so tuples and lists compare equal next time.
+        status = json.loads(json.dumps(status, default=str))
+        with self.cond:
+            previous, self.status = self.status, status
+            self.samples += 1
+        sent = status
+        now = time.monotonic()
+        if now >= self.volatile_due:
+            self.volatile_due = now + self.volatile_interval
+        elif previous is not None:
+            for path in self.volatile:
+                sent = _hold(sent, self.sent, path)
+        delta = status_delta(self.sent or {}, sent)
+        self.sent = sent
+        if previous is not None and delta:
+            self.hub.publish('status', delta)
+            with self.cond:
+                self.published += 1
+
+    def snapshot(self):
+        """Return the last sampled status."""
+        with self.cond:
+            return self.status
+
+    def events(self, last_id=None, keepalive=KEEPALIVE):
+        """Yield SSE messages for one subscriber (blocking; for threaded servers).
+
+        Starts with a ``snapshot`` event holding the full status unless
+        ``last_id`` (the browser's ``Last-Event-ID``) can be resumed from;
+        an idle connection gets a comment every ``keepalive`` seconds,
+        which is also how a disconnected client is noticed.
+        """
+        if last_id is None or self.hub.since(last_id) is None:
+            last_id = self.hub.last_id
+            yield sse_message('snapshot', self.snapshot(), last_id)
+        while True:
+            events = self.hub.wait(last_id, keepalive)
+            if events is None:
+                last_id = self.hub.last_id
+                yield sse_message('snapshot', self.snapshot(), last_id)
+                continue
+            if not events:
+                yield b': keepalive\n\n'
+            for last_id, kind, data in events:
+                yield sse_message(kind, data, last_id)
+
+    def stats(self):
+        """Return sample and publish counters."""
+        with self.cond:
+            return {'samples': self.samples, 'published': self.published,
+                    'last_event_id': self.hub.last_id}
@@ -0,0 +1,194 @@
+"""Sample system health (temperature, CPU, memory, disk, throttling) in the background."""
+
+import os
+import subprocess
+import threading
+import time
+
+THERMAL_ZONE = 'sys/class/thermal/thermal_zone0/temp'
+THROTTLED = 'sys/devices/platform/soc/soc:firmware/get_throttled'
+
+# Bits of the firmware's get_throttled value: current state in the low
+# bits, "has happened since boot" in bits 16-19.
+THROTTLE_FLAGS = {
+    0: 'under_voltage',
+    1: 'freq_capped',
+    2: 'throttled',
+    3: 'soft_temp_limit',
+}
+
+
+def decode_throttled(value):
+    """Return the active and past throttling flags of a ``get_throttled`` value."""
+    if value is None:
+        return None
+    return {
+        'raw': hex(value),
+        'now': [name for bit, name in THROTTLE_FLAGS.items() if value & (1 << bit)],
+        'since_boot': [name for bit, name in THROTTLE_FLAGS.items() if value & (1 << (bit + 16))],
+    }
+
+
+class SystemStats:
+    """Read system stats on a fixed interval and keep the latest snapshot.
+
+    Everything is read by one background thread from files under ``root``
+    (``/`` normally; point it at a fake tree to test). ``vcgencmd`` is only
+    run by that thread, and only where sysfs lacks the temperature or
+    throttling state, so callers of ``snapshot`` never block or fork.
+    Each sample is a new dict that replaces the previous one in a single
+    assignment; readers take no lock and must not modify it.
+    """
+
+    def __init__(self, root='/', captures_dir='captures', interval=2.0, vcgencmd=True):
+        """Create the sampler; call ``start`` to begin sampling."""
+        self.root = root
+        self.captures_dir = captures_dir
+        self.interval = interval
+        self.vcgencmd = vcgencmd
+        self.last_cpu = None
+        self.latest = {}
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def _path(self, relative):
+        return os.path.join(self.root, relative)
+
+    def _read(self, relative):
+        try:
+            with open(self._path(relative), encoding='ascii') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _run_vcgencmd(self, *args):
+        if not self.vcgencmd:
+            return None
+        try:
+            return subprocess.check_output(['vcgencmd', *args], text=True, timeout=2)
+        except (subprocess.SubprocessError, OSError):
+            return None
+
+    def read_temperature(self):
+        """Return the SoC temperature in Celsius or ``None``."""
+        text = self._read(THERMAL_ZONE)
+        if text and text.strip().lstrip('-').isdigit():
+            return int(text) / 1000
+        output = self._run_vcgencmd('measure_temp')  # e.g. temp=48.3'C
+        try:
+            return float(output.split('=')[1].split("'")[0])
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    def read_throttled(self):
+        """Return the decoded throttling state or ``None``."""
+        text = self._read(THROTTLED)
+        if text is None:
+            text = self._run_vcgencmd('get_throttled')  # e.g. throttled=0x50000
+            text = text.split('=')[-1] if text else None
+        try:
+            return decode_throttled(int(text.strip(), 16))
+        except (AttributeError, ValueError):
+            return None
+
+    def read_load(self):
+        """Return the 1, 5 and 15 minute load averages or ``None``."""
+        text = self._read('proc/loadavg')
+        try:
+            return [float(x) for x in text.split()[:3]]
+        except (AttributeError, ValueError):
+            return None
+
+    def read_cpu(self):
+        """Return per-core and total CPU use (%) since the previous call."""
+        text = self._read('proc/stat')
+        if text is None:
+            return None
+        times = {}
+        for line in text.splitlines():
+            fields = line.split()
+            if fields and fields[0].startswith('cpu'):
+                values = [int(x) for x in fields[1:]]
+                idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+                times[fields[0]] = (sum(values), idle)
+        previous, self.last_cpu = self.last_cpu, times
+        if previous is None:
+            return None
+        usage = {}
+        for name, (total, idle) in times.items():
+            if name not in previous:
+                continue
+            elapsed = total - previous[name][0]
+            busy = elapsed - (idle - previous[name][1])
+            usage[name] = round(100 * busy / elapsed, 1) if elapsed > 0 else 0.0
+        return {
+            'total': usage.pop('cpu', None),
+            'cores': [usage[name] for name in sorted(usage, key=lambda n: int(n[3:]))],
+        }
+
+    def read_memory(self):
+        """Return process RSS and system available/total memory in MB."""
+        memory = {'rss_mb': None, 'available_mb': None, 'total_mb': None}
+        status = self._read('proc/self/status') or ''
+        for line in status.splitlines():
+            if line.startswith('VmRSS:'):
+                memory['rss_mb'] = round(int(line.split()[1]) / 1024, 1)
+        meminfo = self._read('proc/meminfo') or ''
+        for line in meminfo.splitlines():
+            name, _, value = line.partition(':')
+            if name == 'MemAvailable':
+                memory['available_mb'] = round(int(value.split()[0]) / 1024, 1)
+            elif name == 'MemTotal':
+                memory['total_mb'] = round(int(value.split()[0]) / 1024, 1)
+        return memory
+
+    def read_disk(self):
+        """Return free and total space (MB) of the captures directory."""
+        try:
+            st = os.statvfs(self.captures_dir)
+        except OSError:
+            return None
+        return {
+            'path': self.captures_dir,
+            'free_mb': round(st.f_bavail * st.f_frsize / (1024 * 1024), 1),
+            'total_mb': round(st.f_blocks * st.f_frsize / (1024 * 1024), 1),
+        }
+
+    def sample(self):
+        """Read every stat once, publish and return the new snapshot."""
+        snapshot = {
+            'time': time.time(),
+            'cpu_temp': self.read_temperature(),
+            'load': self.read_load(),
+            'cpu': self.read_cpu(),
+            'memory': self.read_memory(),
+            'disk': self.read_disk(),
+            'throttled': self.read_throttled(),
+        }
+        self.latest = snapshot
+        return snapshot
+
+    def snapshot(self):
+        """Return the latest sample (empty before the first)."""
+        return self.latest
+
+    def start(self):
+        """Take a first sample and start the sampler thread."""
+        self.sample()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._loop, name='system-stats', daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        while not self.stopping.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as exc:
+                print(f"[STATS] Sampling failed: {exc}")
+
+    def stop(self):
+        """Stop the sampler thread."""
+        self.stopping.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
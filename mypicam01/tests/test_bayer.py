@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from bayer import BayerConverter, mosaic, pack_csi2p10, parse_format
+
+WIDTH, HEIGHT = 64, 32
+
+
+def image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+def cells(order):
+    """Return the 2x2 ``(row, col)`` positions of each channel of ``order``."""
+    positions = {}
+    for index, name in enumerate(order):
+        positions.setdefault(name, []).append(divmod(index, 2))
+    return positions
+
+
+def raw_frame(bgr, fmt, padding=0):
+    order, bits, packed = parse_format(fmt)
+    bayer = mosaic(bgr, order, bits)
+    if packed:
+        raw = pack_csi2p10(bayer)
+    elif bits == 8:
+        raw = bayer.astype(np.uint8)
+    else:
+        raw = bayer.view(np.uint8).reshape(HEIGHT, WIDTH * 2)
+    if padding:  # Row stride wider than the image, as mapped buffers have
+        raw = np.pad(raw, ((0, 0), (0, padding)))
+    return raw
+
+
+@pytest.mark.parametrize('fmt', ['SBGGR10_CSI2P', 'SRGGB10_CSI2P', 'SGRBG8', 'SGBRG10', 'SBGGR16'])
+@pytest.mark.parametrize('padding', [0, 16])
+def test_mosaic_round_trip(fmt, padding):
+    bgr = image()
+    converter = BayerConverter(fmt, (WIDTH, HEIGHT))
+    raw = raw_frame(bgr, fmt, padding)
+    positions = cells(converter.order)
+
+    (r1, c1), (r2, c2) = positions['G']
+    expected = (bgr[r1::2, c1::2, 1].astype(np.int16) + bgr[r2::2, c2::2, 1]) / 2
+    luma = converter.green_luma(raw)
+    assert luma.shape == (HEIGHT // 2, WIDTH // 2)
+    assert np.abs(luma - expected).max() <= 1
+
+    half = converter.debayer_half(raw)
+    (rb, cb), = positions['B']
+    (rr, cr), = positions['R']
+    assert np.array_equal(half[:, :, 0], bgr[rb::2, cb::2, 0])
+    assert np.abs(half[:, :, 1] - expected).max() <= 1
+    assert np.array_equal(half[:, :, 2], bgr[rr::2, cr::2, 2])
+
+
+def test_debayer_half_reuses_green_luma():
+    bgr = image()
+    converter = BayerConverter('SBGGR10_CSI2P', (WIDTH, HEIGHT))
+    raw = raw_frame(bgr, 'SBGGR10_CSI2P')
+    luma = converter.green_luma(raw)
+    assert np.array_equal(converter.debayer_half(raw, green=luma)[:, :, 1], luma)
+
+
+def test_unpacked_samples_as_uint16():
+    bgr = image()
+    converter = BayerConverter('SRGGB12', (WIDTH, HEIGHT))
+    bayer = mosaic(bgr, 'RGGB', 12)
+    assert np.array_equal(converter.debayer_half(bayer)[:, :, 2], bgr[0::2, 0::2, 2])
+
+
+@pytest.mark.parametrize('fmt', ['SBGGR14', 'SRRGB10', 'SBGGR8_CSI2P', 'YUV420', None])
+def test_parse_format_rejects_unsupported(fmt):
+    with pytest.raises(ValueError):
+        parse_format(fmt)
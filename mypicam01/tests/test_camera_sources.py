@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+import pytest
+
+from camera_sources import SyntheticScene, VideoReplay, open_camera
+from flash_detector import FlashDetector
+from frame_context import FrameContext
+from laser_detector import LaserDetector
+
+DETECTION = {'flash_threshold': 5.0, 'laser_threshold': 50, 'min_blob': 5, 'max_blob': 2000}
+
+
+def test_scene_events():
+    scene = SyntheticScene(flash_every=10, laser_every=10, laser_offset=5, lasers=(3,))
+    assert scene.events(20) == [(3, 'laser'), (5, 'laser'), (10, 'flash'), (15, 'laser')]
+
+
+def test_scene_frames_are_deterministic():
+    shape = (120, 160, 3)
+    first = SyntheticScene(seed=3, lasers=(2,))
+    second = SyntheticScene(seed=3, lasers=(2,))
+    assert np.array_equal(first(2, shape), second(2, shape))
+    x, y = first.laser_position(2, shape)
+    assert first(2, shape)[y, x].tolist() == [255, 255, 255]
+    assert first(1, shape).max() <= first.noise
+
+
+@pytest.mark.parametrize('main, lores', [((640, 480), (320, 240)), ((1280, 720), (320, 180)),
+                                         ((640, 480), None)])
+def test_detectors_find_every_injected_event(main, lores):
+    count = 90
+    camera = open_camera({'type': 'synthetic', 'pace': 'fast', 'seed': 1,
+                          'flash_every': 15, 'laser_every': 10, 'laser_offset': 4})
+    streams = {'main': {'size': main}}
+    if lores:
+        streams['lores'] = {'size': lores}
+    camera.configure(camera.create_video_configuration(**streams))
+    camera.start()
+    detectors = {'flash': FlashDetector(DETECTION), 'laser': LaserDetector(DETECTION)}
+    hits = []
+    for index in range(count):
+        if lores:
+            image = camera.capture_array('lores')[:lores[1]]
+            context = FrameContext(image, float(index), main)
+        else:
+            context = FrameContext(camera.capture_array(), float(index))
+        hits += [(index, name) for name, detector in detectors.items() if detector.check(context)]
+    camera.stop()
+
+    expected = camera.pattern.events(count)
+    assert sum(kind == 'laser' for _, kind in expected) == 9
+    assert sum(kind == 'flash' for _, kind in expected) == 5
+    assert sorted(hits) == sorted(expected)
+
+
+def test_replay_returns_file_frames(tmp_path):
+    path = str(tmp_path / 'clip.mp4')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48))
+    for value in range(0, 250, 50):
+        writer.write(np.full((48, 64, 3), value, dtype=np.uint8))
+    writer.release()
+
+    camera = open_camera({'type': 'replay', 'path': path, 'pace': 'fast', 'loop': False})
+    camera.configure(camera.create_video_configuration(main={'size': (32, 24)}))
+    camera.start()
+    levels = [int(camera.capture_array().mean()) for _ in range(5)]
+    # mp4v is lossy, so only check each frame came back in order.
+    assert all(abs(level - value) <= 8 for level, value in zip(levels, range(0, 250, 50)))
+    with pytest.raises(EOFError):
+        camera.capture_array()
+    camera.pattern.close()
+
+
+def test_replay_rejects_missing_file(tmp_path):
+    with pytest.raises(ValueError):
+        VideoReplay(str(tmp_path / 'missing.mp4'))
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import clip_writer
+from clip_writer import ClipWriter
+from frame_buffer import FrameBuffer
+
+FPS = 30
+
+
+def frame(value):
+    return np.full((8, 8, 3), value % 256, dtype=np.uint8)
+
+
+class BlockedWriter:
+    """Stand-in for ``write_video`` that starts reading only when released."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.clips = []
+
+    def __call__(self, frames, fps, output_dir, prefix="buffer"):
+        self.gate.wait()
+        decoded = []
+        for image, _ in frames:
+            if not isinstance(image, np.ndarray):
+                image = image.decode()
+            decoded.append(None if image is None else int(image[0, 0, 0]))
+        self.clips.append(decoded)
+        return 'clip.mp4'
+
+
+def make_writer(tmp_path, monkeypatch, **options):
+    config = {'length': 1, 'fps': FPS, 'output_dir': str(tmp_path)}
+    config.update(options)
+    buffer = FrameBuffer(config)
+    fake = BlockedWriter()
+    monkeypatch.setattr(clip_writer, 'write_video', fake)
+    return buffer, ClipWriter(buffer, config), fake
+
+
+def record(buffer, writer, start, stop):
+    for value in range(start, stop):
+        image = frame(value)
+        buffer.add_frame(image, value / FPS)
+        writer.add_frame(image, value / FPS)
+
+
+@pytest.mark.parametrize('storage', ['deque', 'ring'])
+def test_writer_behind_capture_keeps_pre_event_frames(tmp_path, monkeypatch, storage):
+    buffer, writer, fake = make_writer(tmp_path, monkeypatch, storage=storage,
+                                       post_seconds=1)
+    record(buffer, writer, 0, FPS)
+    assert writer.trigger('test', (FPS - 1) / FPS)
+    # Capture runs on for two ring lengths before the writer reads anything.
+    record(buffer, writer, FPS, 3 * FPS)
+    fake.gate.set()
+    writer.stop()
+    [clip] = fake.clips
+    assert len(clip) >= 2 * FPS
+    assert clip == list(range(len(clip)))  # Every pre- and post-event frame
+
+
+def test_ring_slots_are_released_once_read(tmp_path, monkeypatch):
+    buffer, writer, fake = make_writer(tmp_path, monkeypatch, storage='ring')
+    record(buffer, writer, 0, FPS)
+    writer.trigger('test', (FPS - 1) / FPS)
+    fake.gate.set()
+    writer.stop()
+    assert fake.clips == [list(range(FPS))]
+    assert len(buffer.frames.pins) == 0
+
+
+def test_trigger_reports_dropped_clips(tmp_path, monkeypatch):
+    buffer, writer, fake = make_writer(tmp_path, monkeypatch, max_queue=1)
+    record(buffer, writer, 0, FPS)
+    assert writer.trigger('first')
+    deadline = time.monotonic() + 5
+    while not writer.queue.empty() and time.monotonic() < deadline:
+        time.sleep(0.01)  # Until the writer holds the first clip at the gate
+    assert writer.trigger('second')
+    assert not writer.trigger('third')
+    assert writer.stats()['dropped'] == 1
+    fake.gate.set()
+    writer.stop()
+    assert len(fake.clips) == 2
+
+
+def test_writer_behind_capture_keeps_both_tiers(tmp_path, monkeypatch):
+    buffer, writer, fake = make_writer(tmp_path, monkeypatch, storage='ring',
+                                       spill_path=str(tmp_path / 'spill.ring'),
+                                       spill_size=0.02, post_seconds=1)
+
+    def record_synced(start, stop):
+        for value in range(start, stop):
+            record(buffer, writer, value, value + 1)
+            buffer.spill.flush()  # Keep the test independent of the flusher
+
+    record_synced(0, FPS)
+    spilled = buffer.spill.capacity
+    record_synced(FPS, FPS + spilled)
+    last = FPS + spilled - 1
+    assert writer.trigger('test', last / FPS)
+    record_synced(last + 1, last + 1 + 3 * FPS)
+    fake.gate.set()
+    writer.stop()
+    buffer.close()
+    [clip] = fake.clips
+    assert clip[0] == 0 and len(clip) >= spilled + 2 * FPS
+    assert clip == list(range(len(clip)))
@@ -0,0 +1,81 @@
+import time
+
+import numpy as np
+import pytest
+
+from bayer import BayerConverter
+import fake_picamera2
+from fake_picamera2 import MappedArray, Picamera2
+
+
+def started(pace='fast', **streams):
+    camera = Picamera2(pace=pace)
+    camera.configure(camera.create_video_configuration(**streams))
+    camera.start()
+    return camera
+
+
+def test_capture_array_shapes():
+    camera = started(main={'size': (320, 240)}, lores={'size': (160, 120)})
+    assert camera.capture_array().shape == (240, 320, 3)
+    lores = camera.capture_array('lores')
+    assert lores.shape == (180, 160) and lores.dtype == np.uint8
+    camera.stop()
+
+
+def test_raw_stream_matches_main():
+    camera = started(main={'size': (320, 240)}, raw=True)
+    request = camera.capture_request()
+    with MappedArray(request, 'raw') as mapped:
+        raw = mapped.array
+        half = BayerConverter('SBGGR10_CSI2P', (320, 240)).debayer_half(raw)
+    main = request.make_array('main')
+    request.release()
+    assert np.array_equal(half[:, :, 0], main[0::2, 0::2, 0])
+    assert np.array_equal(half[:, :, 2], main[1::2, 1::2, 2])
+
+
+def test_fast_pace_advances_one_frame_duration():
+    camera = started(controls={'FrameDurationLimits': (50000, 50000)})
+    stamps = [camera.capture_metadata()['SensorTimestamp'] for _ in range(5)]
+    assert np.diff(stamps).tolist() == [50_000_000] * 4
+
+
+def test_realtime_pace_skips_missed_frames():
+    camera = started('realtime', controls={'FrameDurationLimits': (10000, 10000)})
+    first = camera.capture_metadata()['SensorTimestamp']
+    time.sleep(0.05)
+    second = camera.capture_metadata()['SensorTimestamp']
+    assert second - first >= 3 * 10_000_000
+
+
+def test_pattern_supplies_frames():
+    def pattern(index, shape):
+        return np.full(shape, index, dtype=np.uint8)
+
+    camera = Picamera2(pattern=pattern, pace='fast')
+    camera.start()
+    assert [int(camera.capture_array()[0, 0, 0]) for _ in range(3)] == [0, 1, 2]
+    assert camera.capture_array().shape == fake_picamera2.DEFAULT_SIZE[::-1] + (3,)
+
+
+def test_reconfigure_requires_stop():
+    camera = started(main={'size': (320, 240)})
+    with pytest.raises(RuntimeError):
+        camera.configure(camera.create_video_configuration(main={'size': (640, 480)}))
+    camera.stop()
+    with pytest.raises(RuntimeError):
+        camera.capture_request()
+    camera.configure(camera.create_video_configuration(main={'size': (640, 480)}))
+    camera.start()
+    assert camera.capture_array().shape == (480, 640, 3)
+
+
+def test_set_controls_changes_frame_rate_while_running():
+    camera = started(controls={'FrameDurationLimits': (20000, 20000)})
+    camera.capture_metadata()
+    camera.set_controls({'FrameDurationLimits': (40000, 40000), 'AnalogueGain': 2.0})
+    metadata = [camera.capture_metadata() for _ in range(2)]
+    assert all(m['FrameDuration'] == 40000 for m in metadata)
+    assert metadata[0]['AnalogueGain'] == 2.0
+    assert metadata[1]['SensorTimestamp'] - metadata[0]['SensorTimestamp'] == 40_000_000
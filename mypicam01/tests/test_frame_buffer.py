@@ -0,0 +1,45 @@
+import math
+
+import numpy as np
+import pytest
+
+from frame_buffer import FrameBuffer, parse_memory
+
+
+@pytest.mark.parametrize('value, expected', [(0, 0), (256, 256), ('64', 64), (12.7, 12), (-5, 0)])
+def test_parse_memory_accepts_numbers(value, expected):
+    assert parse_memory(value) == expected
+
+
+@pytest.mark.parametrize('value', [None, '', 'lots', math.nan, math.inf, True, [1]])
+def test_parse_memory_rejects_missing_and_invalid_values(value):
+    with pytest.raises(ValueError):
+        parse_memory(value)
+
+
+def fill_encoded(buffer, image, count):
+    for i in range(count):
+        buffer.add_frame(image, i / buffer.fps)
+        for frame, _ in buffer.frames.snapshot():
+            frame.encoded()  # Keep the measured sizes deterministic
+
+
+def test_encoded_storage_is_budgeted_on_encoded_size(tmp_path):
+    buffer = FrameBuffer({'length': 5, 'fps': 10, 'storage': 'encoded', 'memory': 10,
+                          'output_dir': str(tmp_path)})
+    gradient = np.tile(np.arange(1280, dtype=np.uint8) // 5, (720, 1))
+    image = np.dstack([gradient] * 3)  # 2.6 MB raw, a few KB as JPEG
+    fill_encoded(buffer, image, 30)
+    assert buffer.max_frames == 50
+    assert len(buffer.frames) == 30
+    buffer.frames.close()
+
+
+def test_encoded_storage_stays_within_budget(tmp_path):
+    buffer = FrameBuffer({'length': 5, 'fps': 10, 'storage': 'encoded', 'memory': 1,
+                          'output_dir': str(tmp_path)})
+    noise = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    fill_encoded(buffer, noise, 60)
+    assert 1 <= buffer.max_frames < 50
+    assert buffer.frames.nbytes() <= 1024 * 1024
+    buffer.frames.close()
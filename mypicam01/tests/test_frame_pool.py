@@ -0,0 +1,72 @@
+import gc
+
+import numpy as np
+import pytest
+
+from frame_pool import FramePool
+
+
+def source(value, shape=(4, 6, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def buffer_of(array):
+    return array.base.base.obj  # The pooled bytearray under the root array
+
+
+def test_buffer_is_reused_once_released():
+    pool = FramePool()
+    frame = pool.copy_from(source(1), 0.0)
+    block = buffer_of(frame.array)
+    del frame
+    gc.collect()
+    again = pool.copy_from(source(2), 1.0)
+    assert buffer_of(again.array) is block
+    assert pool.stats() == {'buffers': 1, 'allocated': 1, 'reused': 1}
+
+
+@pytest.mark.parametrize('make_view', [
+    lambda array: array,
+    lambda array: array[1:3, ::2, 0],
+    lambda array: array.T,
+    lambda array: np.asarray(array),
+    memoryview,
+])
+def test_any_view_keeps_the_buffer(make_view):
+    pool = FramePool()
+    frame = pool.copy_from(source(1), 0.0)
+    view = make_view(frame.array)
+    del frame
+    gc.collect()
+    other = pool.copy_from(source(2), 1.0)
+    assert pool.stats()['allocated'] == 2
+    assert (np.asarray(view) == 1).all()  # Not overwritten
+    del view
+    gc.collect()
+    del other
+    gc.collect()
+    assert pool.stats() == {'buffers': 2, 'allocated': 2, 'reused': 0}
+
+
+def test_arrays_are_read_only():
+    pool = FramePool()
+    array = pool.copy_array(source(3))
+    assert not array.flags.writeable
+    assert array.shape == (4, 6, 3) and (array == 3).all()
+
+
+def test_stale_layouts_are_dropped():
+    pool = FramePool()
+    pool.copy_array(source(1))
+    gc.collect()
+    array = pool.copy_array(source(2, (2, 2)))
+    assert pool.stats() == {'buffers': 1, 'allocated': 2, 'reused': 0}
+    assert array.shape == (2, 2)
+
+
+def test_idle_buffers_are_trimmed():
+    pool = FramePool(max_free=2)
+    arrays = [pool.copy_array(source(i)) for i in range(5)]
+    del arrays
+    gc.collect()
+    assert pool.stats()['buffers'] == 2
@@ -0,0 +1,61 @@
+import numpy as np
+
+from frame_context import FrameContext
+from laser_detector import LaserDetector
+
+LORES = (320, 240)
+MAIN = (640, 480)  # Two full-resolution pixels per lores pixel on each axis
+
+
+def lores_frame(spot=None, size=2):
+    frame = np.zeros((LORES[1], LORES[0]), dtype=np.uint8)
+    if spot is not None:
+        x, y = spot
+        frame[y:y + size, x:x + size] = 255
+    return frame
+
+
+def run(detector, frame, full_size=MAIN):
+    detector.detect(FrameContext(lores_frame(), 0.0, full_size))
+    return detector.detect(FrameContext(frame, 1.0, full_size))
+
+
+def test_blob_limits_are_in_full_resolution_pixels():
+    # A 2x2 lores blob covers 16 full-resolution pixels.
+    config = {'laser_threshold': 8, 'min_blob': 10, 'max_blob': 20}
+    result = run(LaserDetector(config), lores_frame((100, 50)))
+    assert result.triggered
+    assert result.areas.tolist() == [16]
+
+    # Measured in lores pixels the same blob (4) would be below min_blob.
+    assert not run(LaserDetector(config), lores_frame((100, 50)), None).triggered
+    assert not run(LaserDetector({**config, 'max_blob': 12}), lores_frame((100, 50))).triggered
+
+
+def test_centroids_are_in_full_resolution_pixels():
+    config = {'laser_threshold': 8, 'min_blob': 1, 'max_blob': 100}
+    result = run(LaserDetector(config), lores_frame((100, 50)))
+    # Lores pixels 100-101 span full-resolution pixels 200-203.
+    assert np.allclose(result.centroids, [[201.5, 101.5]])
+
+
+def test_roi_is_in_full_resolution_pixels():
+    config = {'laser_threshold': 8, 'min_blob': 1, 'max_blob': 100,
+              'laser_roi': (180, 80, 60, 60)}  # Lores (90, 40, 30, 30)
+    detector = LaserDetector(config)
+    result = run(detector, lores_frame((100, 50)))
+    assert detector.roi_px == (90, 40, 30, 30)
+    assert result.triggered
+    assert np.allclose(result.centroids, [[201.5, 101.5]])
+    assert not run(LaserDetector(config), lores_frame((200, 150))).triggered
+
+
+def test_full_resolution_frames_are_unscaled():
+    config = {'laser_threshold': 8, 'min_blob': 1, 'max_blob': 100}
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    detector = LaserDetector(config)
+    detector.detect(frame)
+    frame[10:13, 20:23] = 255
+    result = detector.detect(frame)
+    assert result.areas.tolist() == [9]
+    assert np.allclose(result.centroids, [[21, 11]])
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from camera_initializer import CameraInitializer, lores_stream
+from laser_detector import LaserDetector
+from main_controller import MainController
+
+MAIN = (640, 480)
+SPOT = (400, 200)  # Top-left corner of a 6x6 spot in main-stream pixels
+LASER = {'laser_threshold': 20, 'min_blob': 5, 'max_blob': 200}
+
+
+def scene(index, shape):
+    frame = np.zeros(shape, dtype=np.uint8)
+    if index >= 3:
+        x, y = SPOT
+        frame[y:y + 6, x:x + 6] = 255
+    return frame
+
+
+def make_controller(tmp_path, **camera):
+    camera = {'resolution': MAIN, 'fps': 30, 'exposure': 10000, 'gain': 1.0, **camera}
+    config = {
+        'source': scene,
+        'camera': camera,
+        'detection': {'detectors': [], **LASER},
+        'buffer': {'length': 1, 'output_dir': str(tmp_path)},
+    }
+    controller = MainController(config)
+    controller._apply_camera_config()
+    controller.picam2.start()
+    return controller
+
+
+def detection_contexts(controller, count=5):
+    """Capture ``count`` frames and return the contexts given to detectors."""
+    contexts = []
+    controller.detectors.run = contexts.append
+    frames = [controller.capture_frame() for _ in range(count)]
+    for frame in frames:
+        controller._detect_stage(frame)
+    return frames, contexts
+
+
+def detect_laser(contexts):
+    detector = LaserDetector(LASER)
+    return [detector.detect(context) for context in contexts][-1]
+
+
+@pytest.fixture
+def stop():
+    controllers = []
+    yield controllers.append
+    for controller in controllers:
+        controller.stop()
+
+
+@pytest.mark.parametrize('lores, expected', [
+    (None, None),
+    ((321, 241), {'size': (320, 240), 'format': 'YUV420'}),  # Rounded down to even
+    (MAIN, None),  # No smaller than main
+    ((1280, 240), None),
+    ((0, 240), None),
+])
+def test_lores_stream(lores, expected):
+    assert lores_stream({'resolution': MAIN, 'lores': lores}) == expected
+
+
+def test_camera_initializer_configures_lores_and_raw():
+    config = {'resolution': MAIN, 'lores': (320, 240), 'fps': 25, 'exposure': 10000,
+              'gain': 2.0, 'demosaic': 'off'}
+    initializer = CameraInitializer(config, scene)
+    initializer.apply_config()
+    camera = initializer.get_camera()
+    assert camera.camera_config['lores']['size'] == (320, 240)
+    assert camera.camera_config['raw']
+    assert camera.controls['FrameDurationLimits'] == (40000, 40000)
+    assert camera.controls['AnalogueGain'] == 2.0
+
+
+def test_detection_runs_on_lores_plane(tmp_path, stop):
+    controller = make_controller(tmp_path, lores=(320, 240))
+    stop(controller)
+    frames, contexts = detection_contexts(controller)
+    assert frames[-1].array.shape == (480, 640, 3)
+    assert frames[-1].lores.shape == (240, 320)
+    for frame, context in zip(frames, contexts):
+        assert context.frame is frame.lores
+        assert context.full_size == MAIN
+    result = detect_laser(contexts)
+    assert result.triggered
+    assert np.allclose(result.centroids, [[SPOT[0] + 2.5, SPOT[1] + 2.5]], atol=1)
+    assert result.areas.tolist() == [36]
+
+
+def test_detection_without_lores_uses_main(tmp_path, stop):
+    controller = make_controller(tmp_path)
+    stop(controller)
+    frames, contexts = detection_contexts(controller)
+    assert frames[-1].lores is None
+    assert contexts[-1].frame is frames[-1].array
+    assert contexts[-1].full_ratio() == (1.0, 1.0)
+    result = detect_laser(contexts)
+    assert result.areas.tolist() == [36]
+
+
+def test_raw_mode_reports_sensor_pixels(tmp_path, stop):
+    controller = make_controller(tmp_path, demosaic='off')
+    stop(controller)
+    frames, contexts = detection_contexts(controller)
+    assert frames[-1].array.shape == (240, 320, 3)  # Half-size debayer
+    assert all(context.full_size == MAIN for context in contexts)
+    result = detect_laser(contexts)
+    assert result.triggered
+    assert np.allclose(result.centroids, [[SPOT[0] + 2.5, SPOT[1] + 2.5]], atol=1)
+    assert result.areas.tolist() == [36]
@@ -0,0 +1,160 @@
+import threading
+
+import numpy as np
+
+from spill_buffer import DiskRing
+
+SIZE_MB = 0.02  # Room for about a dozen 32x32 frames
+
+
+def frame(value):
+    return np.full((32, 32), value % 256, dtype=np.uint8)
+
+
+def fill(ring, start, stop):
+    for value in range(start, stop):
+        ring.append(frame(value), float(value))
+
+
+def open_ring(path, sync_frames=0, background=False):
+    """Return a ring laid out for the test frames, plus its capacity.
+
+    Commits run inline by default so headers can be checked frame by frame.
+    """
+    ring = DiskRing(str(path), SIZE_MB, sync_frames, background)
+    ring.format((32, 32), np.uint8)
+    return ring, ring.capacity
+
+
+def header_range(ring):
+    header = ring._read_header()
+    return header['written'] - header['count'], header['written']
+
+
+def test_wraparound_keeps_newest_frames_in_order(tmp_path):
+    ring, capacity = open_ring(tmp_path / 'ring')
+    assert capacity > 4
+    fill(ring, 0, capacity * 2 + 3)
+    total = capacity * 2 + 3
+    assert len(ring) == capacity
+    items = list(ring.items())
+    assert [ts for _, ts in items] == [float(v) for v in range(total - capacity, total)]
+    assert all(view[0, 0] == int(ts) % 256 for view, ts in items)
+    ring.close()
+
+
+def test_snapshot_pins_frames_until_dropped(tmp_path):
+    ring, capacity = open_ring(tmp_path / 'ring')
+    fill(ring, 0, capacity)
+    snapshot = ring.snapshot()
+    assert not ring.append(frame(100), 100.0)
+    assert ring.dropped == 1
+    for disk_frame, ts in snapshot:
+        assert disk_frame.decode()[0, 0] == int(ts)
+    del snapshot, disk_frame
+    fill(ring, 100, 103)
+    assert [ts for _, ts in ring.items()][-3:] == [100.0, 101.0, 102.0]
+    assert ring.dropped == 1
+    ring.close()
+
+
+def test_unpinned_frames_expire_when_overwritten(tmp_path):
+    ring, capacity = open_ring(tmp_path / 'ring')
+    fill(ring, 0, capacity)
+    seq = ring.written - capacity
+    fill(ring, 100, 103)
+    assert ring.read(seq) is None
+    assert ring.read(ring.written - 1)[0, 0] == 102
+    ring.close()
+
+
+def test_commits_run_on_the_flusher_and_never_block_append(tmp_path):
+    ring, capacity = open_ring(tmp_path / 'ring', background=True)
+    commit = ring._commit
+    gate = threading.Event()
+    threads = []
+
+    def stalled_commit(reserve=0):
+        threads.append(threading.current_thread().name)
+        gate.wait()  # A disk that takes forever to sync
+        commit(reserve)
+
+    ring._commit = stalled_commit
+    fill(ring, 0, capacity * 3)
+    assert ring.dropped > 0
+    assert set(threads) == {'spill-flush'}
+    gate.set()
+    ring.flush()
+    assert ring.append(frame(0), 0.0)
+    ring.close()
+
+
+def test_reopen_recovers_frames(tmp_path):
+    path = str(tmp_path / 'ring')
+    ring = DiskRing(path, SIZE_MB)
+    fill(ring, 0, 20)
+    stored = [(view.copy(), ts) for view, ts in ring.items()]
+    ring.close()
+
+    ring = DiskRing(path, SIZE_MB)
+    assert len(ring) == len(stored)
+    for (view, ts), (expected, expected_ts) in zip(ring.items(), stored):
+        assert ts == expected_ts
+        assert np.array_equal(view, expected)
+    ring.close()
+
+
+def test_header_never_claims_a_slot_being_overwritten(tmp_path):
+    ring, capacity = open_ring(tmp_path / 'ring', sync_frames=3)
+    for value in range(capacity * 3):
+        oldest, newest = header_range(ring)
+        # The next append overwrites seq written - capacity.
+        assert ring.written - capacity < oldest
+        assert newest <= ring.written
+        ring.append(frame(value), float(value))
+    ring.close()
+
+
+def test_crash_recovers_only_complete_frames(tmp_path):
+    ring, capacity = open_ring(tmp_path / 'ring', sync_frames=4)
+    fill(ring, 0, capacity * 2 + 1)  # Not closed, as after a crash
+    oldest, newest = header_range(ring)
+    assert newest < ring.written
+    recovered = DiskRing(str(tmp_path / 'ring'), SIZE_MB)
+    assert recovered.written == newest
+    assert len(recovered) == newest - oldest > 0
+    for view, ts in recovered.items():
+        assert view[0, 0] == int(ts) % 256
+    recovered.close()
+    ring.close()
+
+
+def test_resize_keeps_sequence_numbers(tmp_path):
+    ring, capacity = open_ring(tmp_path / 'ring')
+    fill(ring, 0, capacity)
+    snapshot = ring.snapshot()
+    ring.resize(SIZE_MB * 2)
+    assert ring.capacity > len(snapshot)
+    for disk_frame, ts in snapshot:
+        view = disk_frame.decode()
+        assert view is not None and view[0, 0] == int(ts) % 256
+
+    snapshot = ring.snapshot()
+    ring.resize(SIZE_MB / 2)
+    kept = len(ring)
+    assert 0 < kept < len(snapshot)
+    decoded = [disk_frame.decode() for disk_frame, _ in snapshot]
+    assert all(view is None for view in decoded[:-kept])
+    for view, (_, ts) in zip(decoded[-kept:], snapshot[-kept:]):
+        assert view[0, 0] == int(ts) % 256
+    ring.close()
+
+
+def test_format_on_new_shape_expires_old_frames(tmp_path):
+    ring = DiskRing(str(tmp_path / 'ring'), SIZE_MB)
+    fill(ring, 0, 5)
+    snapshot = ring.snapshot()
+    ring.append(np.zeros((16, 16), dtype=np.uint8), 5.0)
+    assert all(disk_frame.decode() is None for disk_frame, _ in snapshot)
+    assert len(ring) == 1
+    ring.close()
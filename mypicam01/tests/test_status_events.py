@@ -0,0 +1,53 @@
+from status_events import EventHub, StatusPublisher, status_delta
+
+
+class Source:
+    """Status with one setting and ever-changing counters."""
+
+    def __init__(self):
+        self.mode = 'a'
+        self.frames = 0
+
+    def __call__(self):
+        self.frames += 1
+        return {'mode': self.mode, 'time': self.frames,
+                'stats': {'frames': self.frames, 'fps': 10},
+                'buffer': {'length': 5, 'memory_usage': self.frames}}
+
+
+def published(hub):
+    return [data for _, kind, data in hub.since(0) if kind == 'status']
+
+
+def test_status_delta_reports_changed_keys():
+    old = {'a': 1, 'b': {'c': 2, 'd': 3}, 'e': [1]}
+    new = {'a': 1, 'b': {'c': 2, 'd': 4}, 'e': [1, 2], 'f': None}
+    assert status_delta(old, new) == {'b': {'d': 4}, 'e': [1, 2], 'f': None}
+
+
+def test_volatile_keys_are_throttled():
+    source, hub = Source(), EventHub()
+    publisher = StatusPublisher(source, hub, volatile=('time', 'stats', 'buffer.memory_usage'),
+                                volatile_interval=3600)
+    publisher._sample()
+    for _ in range(5):
+        publisher._sample()
+    assert published(hub) == []
+    assert publisher.snapshot()['stats']['frames'] == 6
+
+    source.mode = 'b'
+    publisher._sample()
+    assert published(hub) == [{'mode': 'b'}]
+
+    publisher.volatile_due = 0.0
+    publisher._sample()
+    assert published(hub)[-1] == {'time': 8, 'stats': {'frames': 8},
+                                  'buffer': {'memory_usage': 8}}
+
+
+def test_without_volatile_keys_every_change_is_published():
+    source, hub = Source(), EventHub()
+    publisher = StatusPublisher(source, hub)
+    publisher._sample()
+    publisher._sample()
+    assert published(hub) == [{'time': 2, 'stats': {'frames': 2}, 'buffer': {'memory_usage': 2}}]
@@ -0,0 +1,100 @@
+from system_stats import THERMAL_ZONE, THROTTLED, SystemStats, decode_throttled
+
+STAT = """cpu  {0} 0 {0} {1} {2} 0 0 0 0 0
+cpu0 {0} 0 0 {1} 0 0 0 0 0 0
+cpu1 0 0 {0} 0 {2} 0 0 0 0 0
+intr 1 2 3
+"""
+MEMINFO = """MemTotal:        3884292 kB
+MemFree:          123456 kB
+MemAvailable:    2048000 kB
+"""
+STATUS = """Name:\tpython
+VmRSS:\t   51200 kB
+"""
+
+
+def write(root, relative, text):
+    path = root / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def fake_tree(root):
+    write(root, THERMAL_ZONE, '48312\n')
+    write(root, THROTTLED, '50005\n')
+    write(root, 'proc/loadavg', '0.52 0.31 0.20 1/123 4567\n')
+    write(root, 'proc/stat', STAT.format(100, 100, 0))
+    write(root, 'proc/meminfo', MEMINFO)
+    write(root, 'proc/self/status', STATUS)
+
+
+def stats_for(root):
+    return SystemStats(root=str(root), captures_dir=str(root), vcgencmd=False)
+
+
+def test_sample_reads_the_tree(tmp_path):
+    fake_tree(tmp_path)
+    snapshot = stats_for(tmp_path).sample()
+    assert snapshot['cpu_temp'] == 48.312
+    assert snapshot['load'] == [0.52, 0.31, 0.20]
+    assert snapshot['cpu'] is None  # Needs two samples
+    assert snapshot['memory'] == {'rss_mb': 50.0, 'available_mb': 2000.0, 'total_mb': 3793.3}
+    assert snapshot['disk']['total_mb'] > 0
+    assert snapshot['throttled'] == {'raw': '0x50005', 'now': ['under_voltage', 'throttled'],
+                                     'since_boot': ['under_voltage', 'throttled']}
+
+
+def test_cpu_usage_between_samples(tmp_path):
+    fake_tree(tmp_path)
+    stats = stats_for(tmp_path)
+    stats.sample()
+    # cpu0: 100 busy + 300 idle jiffies; cpu1: 100 busy + 100 iowait.
+    write(tmp_path, 'proc/stat', STAT.format(200, 400, 100))
+    assert stats.sample()['cpu'] == {'total': 33.3, 'cores': [25.0, 50.0]}
+
+
+def test_missing_files_read_as_none(tmp_path):
+    snapshot = stats_for(tmp_path).sample()
+    assert snapshot['cpu_temp'] is None
+    assert snapshot['load'] is None
+    assert snapshot['cpu'] is None
+    assert snapshot['throttled'] is None
+    assert snapshot['memory'] == {'rss_mb': None, 'available_mb': None, 'total_mb': None}
+    assert stats_for(tmp_path / 'missing').read_disk() is None
+
+
+def test_garbage_is_ignored(tmp_path):
+    write(tmp_path, THERMAL_ZONE, 'error\n')
+    write(tmp_path, THROTTLED, 'zz\n')
+    write(tmp_path, 'proc/loadavg', 'n/a\n')
+    stats = stats_for(tmp_path)
+    assert stats.read_temperature() is None
+    assert stats.read_throttled() is None
+    assert stats.read_load() is None
+
+
+def test_background_thread_replaces_snapshot(tmp_path):
+    fake_tree(tmp_path)
+    stats = SystemStats(root=str(tmp_path), captures_dir=str(tmp_path),
+                        interval=0.01, vcgencmd=False)
+    assert stats.snapshot() == {}
+    stats.start()
+    first = stats.snapshot()
+    write(tmp_path, THERMAL_ZONE, '51000\n')
+    try:
+        for _ in range(200):
+            if stats.snapshot()['cpu_temp'] == 51.0:
+                break
+            stats.stopping.wait(0.01)
+    finally:
+        stats.stop()
+    assert first['cpu_temp'] == 48.312
+    assert stats.snapshot()['cpu_temp'] == 51.0
+    assert stats.thread is None
+
+
+def test_decode_throttled():
+    assert decode_throttled(None) is None
+    assert decode_throttled(0) == {'raw': '0x0', 'now': [], 'since_boot': []}
+    assert decode_throttled(0x80008)['now'] == ['soft_temp_limit']
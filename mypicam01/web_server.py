@@ -1,13 +1,20 @@
 """Flask web server exposing the surveillance UI and API."""
 
 import datetime
-import subprocess
+import hmac
+import json
 import threading
 import time
 
-import cv2
 from flask import Flask, render_template_string, Response, request, jsonify
+from config_scheduler import ConfigScheduler
+from frame_buffer import parse_memory
 from main_controller import MainController
+import metrics
+from mjpeg_broadcaster import BOUNDARY, MjpegBroadcaster, mjpeg_part
+import sampling_profiler
+from status_events import EventHub, StatusPublisher
+from system_stats import SystemStats
 
 app = Flask(__name__)
 
@@ -21,10 +28,15 @@ config = {
         'autosave_flash': True,
         'autosave_laser': True,
         'sound_flash': True,
-        'sound_laser': True
+        'sound_laser': True,
+        'detectors': ['flash', 'laser'],
+        'detector_mode': 'thread',  # or 'process' for multi-core Pis
+        'detector_workers': 2,
+        'detector_queue': 2
     },
     'camera': {
         'resolution': (640, 480),
+        'lores': (320, 240),  # YUV420 stream for detection, None to detect on main
         'fps': 10,
         'exposure': 10000,
         'gain': 2.0,
@@ -41,25 +53,49 @@ config = {
     },
     'buffer': {
         'length': 5,
-        'memory': 0
+        'memory': 256,  # MB, 0 = unlimited
+        'degrade': 'drop',
+        'spill_path': None,  # e.g. '/mnt/ssd/prebuffer.ring' to enable
+        'spill_size': 1024,  # MB
+        'storage': 'ring',
+        'post_seconds': 2,
+        'max_queue': 2
+    },
+    'stream': {
+        'quality': 80,  # Default JPEG quality of /stream
+        'max_fps': 10,
+        'max_variants': 4  # Width/quality combinations encoded at once
+    },
+    'status_interval': 1.0,  # Seconds between status samples pushed on /events
+    'status_volatile_interval': 10.0,  # Seconds between pushes of ever-changing stats
+    'metrics': True,  # Latency histograms and counters on /metrics
+    'profiler': {
+        'enabled': False,  # Sampling profiler on /admin/profile
+        'token': None  # Required (as ?token= or X-Admin-Token) once enabled
+    },
+    'system_stats': {
+        'interval': 2.0,  # Seconds between temperature/CPU/memory/disk samples
+        'root': '/',  # Where proc/ and sys/ are read from
+        'vcgencmd': True  # Fall back to vcgencmd where sysfs lacks a value
     }
 }
 
+metrics.enable(config.get('metrics', True))
+# config['source'] picks the camera source (see camera_sources); unset
+# means the live camera, or MYPICAM_SOURCE such as 'synthetic' or
+# 'replay:captures/clip.mp4' to run without one.
 controller = MainController(config)
+stats_config = config['system_stats']
+system_stats = SystemStats(stats_config.get('root', '/'), controller.buffer.output_dir,
+                           stats_config.get('interval', 2.0), stats_config.get('vcgencmd', True))
+system_stats.start()
 
 event_log: list[str] = []
 event_log_lock = threading.Lock()
+event_hub = EventHub()
 
 # Register callback and start the main controller after defining logging helper
 
-def get_cpu_temp():
-    """Return the CPU temperature in Celsius or ``None`` if unavailable."""
-    try:
-        output = subprocess.check_output(['vcgencmd', 'measure_temp'], text=True)
-        return float(output.split('=')[1].split("'")[0])
-    except (subprocess.CalledProcessError, FileNotFoundError, IndexError, ValueError):
-        return None
-
 # ---- Event Logging ----
 def log_event(kind):
     """Append a detection event to the rolling log."""
@@ -68,9 +104,16 @@ def log_event(kind):
         event_log.append(f"{timestamp} - {kind}")
         if len(event_log) > 10:
             event_log.pop(0)
+        log_copy = list(event_log)
+    event_hub.publish('detection', {'time': timestamp, 'kind': kind, 'log': log_copy})
 
 controller.set_trigger_callback(log_event)
 controller.start()
+stream_config = config['stream']
+broadcaster = MjpegBroadcaster(controller, stream_config.get('quality', 80),
+                               stream_config.get('max_fps', 10),
+                               stream_config.get('max_variants', 4))
+broadcaster.start()
 
 # ---- Web Interface ----
 @app.route('/')
@@ -82,25 +125,29 @@ def index():
 
 @app.route('/stream')
 def stream():
-    """Stream JPEG frames from the camera as multipart data."""
+    """Stream JPEG frames from the camera as multipart data.
+
+    Optional ``width`` (pixels, or ``auto`` to follow the connection's
+    throughput) and ``quality`` query parameters select a preview variant.
+    """
+    width = request.args.get('width')
+    quality = request.args.get('quality', type=int)
+    if width != 'auto':
+        width = request.args.get('width', type=int)
+
     def generate():
-        while True:
-            frame = controller.get_last_frame()
-            if frame is not None:
-                _, buffer = cv2.imencode('.jpg', frame)
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-            time.sleep(0.1)
-    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+        for jpeg, timestamp in broadcaster.frames(width, quality):
+            yield mjpeg_part(jpeg, timestamp)
+    return Response(generate(), mimetype=f'multipart/x-mixed-replace; boundary={BOUNDARY}')
 
 # ---- API Routes ----
-@app.route('/get_config')
-def get_config():
-    """Return the current runtime configuration as JSON."""
+def config_snapshot():
+    """Return the runtime configuration and status served by ``/get_config``."""
     with event_log_lock:
         log_copy = list(event_log)
+    system = system_stats.snapshot()
 
-    return jsonify({
+    return {
         'detection': config['detection'],
         'camera': {
             **config['camera'],
@@ -108,19 +155,66 @@ def get_config():
         },
         'buffer': {
             **config['buffer'],
-            'memory_usage': controller.buffer.estimate_memory_usage()
+            'memory_usage': controller.buffer.estimate_memory_usage(),
+            'capacity_frames': controller.buffer.max_frames,
+            'spill': controller.buffer.spill_usage(),
+            'compression_ratio': controller.buffer.compression_ratio(),
+            'clip_writer': controller.clip_writer.stats()
         },
+        'detector_stats': controller.detectors.stats(),
+        'pipeline_stats': controller.pipeline.stats(),
+        'capture_stats': controller.timing.stats(),
+        'config_version': config_scheduler.status(),
+        'stream_stats': broadcaster.stats(),
         'log': log_copy,
-        'cpu_temp': get_cpu_temp()
-    })
+        'cpu_temp': system.get('cpu_temp'),
+        'system': system
+    }
+
+@app.route('/get_config')
+def get_config():
+    """Return the current runtime configuration and status (cached) as JSON."""
+    return jsonify(status_publisher.snapshot())
+
+@app.route('/events')
+def events():
+    """Push detection events and status changes as Server-Sent Events.
+
+    The first message is a ``snapshot`` with what ``/get_config`` returns;
+    ``status`` messages then carry only the values that changed and
+    ``detection`` messages arrive as detections are logged.
+    """
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(status_publisher.events(last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+@app.route('/metrics')
+def metrics_text():
+    """Return latency histograms and counters for Prometheus."""
+    return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics.json')
+def metrics_json():
+    """Return a per-operation latency and counter summary."""
+    return jsonify(metrics.summary())
+
+def apply_updates(data):
+    """Apply a merged configuration update; run by the config scheduler."""
+    buffer_data = dict(data.get('buffer', {}))
+    if 'memory' in buffer_data:
+        buffer_data['memory'] = parse_memory(buffer_data['memory'])  # Before any change
+    buffer_changes = {
+        key: buffer_data[key] for key in ('length', 'memory', 'degrade', 'spill_size')
+        if key in buffer_data and buffer_data[key] != config['buffer'].get(key)
+    }
+    if buffer_changes:
+        # Raises on invalid values, so only settings the buffer took are stored.
+        controller.buffer.update_config(**buffer_changes)
+        config['buffer'].update(buffer_changes)
 
-@app.route('/update_config', methods=['POST'])
-def update_config():
-    """Update detection or camera settings from the client."""
-    data = request.json or {}
     config['detection'].update(data.get('detection', {}))
 
-    cam_data = data.get('camera', {})
+    cam_data = dict(data.get('camera', {}))
     if 'resolution' in cam_data:
         res = cam_data['resolution']
         if isinstance(res, str) and 'x' in res:
@@ -132,34 +226,113 @@ def update_config():
             config['camera'][key] = val
             reconfig_needed = True
 
-    buffer_data = data.get('buffer', {})
-    if 'length' in buffer_data and buffer_data['length'] != config['buffer'].get('length'):
-        config['buffer']['length'] = buffer_data['length']
-        controller.buffer.update_config(length=buffer_data['length'])
-
+    result = None
     if reconfig_needed:
-        controller.reconfigure_camera(config['camera'])
+        result = controller.reconfigure_camera(config['camera'])
+    return {'camera': result}
 
-    return jsonify({'status': 'updated'})
+config_scheduler = ConfigScheduler(apply_updates, config.get('config_interval', 0.25),
+                                   on_applied=lambda version: status_publisher.refresh())
+# Counters and readings that change on every sample; pushed less often.
+VOLATILE_STATUS = ('detector_stats', 'pipeline_stats', 'capture_stats', 'stream_stats',
+                   'system', 'cpu_temp', 'buffer.memory_usage', 'buffer.compression_ratio',
+                   'buffer.spill', 'buffer.clip_writer')
+status_publisher = StatusPublisher(config_snapshot, event_hub, config.get('status_interval', 1.0),
+                                   VOLATILE_STATUS, config.get('status_volatile_interval', 10.0))
+status_publisher.start()
 
-@app.route('/save_buffer', methods=['POST'])
-def save_buffer():
-    """Persist the current buffer to disk."""
-    controller.buffer.save_to_file()
+@app.route('/update_config', methods=['POST'])
+def update_config():
+    """Queue detection, camera or buffer changes from the client.
+
+    Returns at once with the config version to poll via ``/config_status``;
+    rapid updates are coalesced and applied in the background.
+    """
+    version = config_scheduler.submit(request.json or {})
+    return jsonify({'status': 'queued', 'version': version})
+
+@app.route('/config_status')
+def config_status():
+    """Return requested and applied config versions."""
+    return jsonify(config_scheduler.status())
+
+def save_buffer_now():
+    """Save the pre-event buffer plus post-event frames as a clip."""
+    if not controller.clip_writer.trigger('manual', time.time()):
+        return {'status': 'clip dropped', 'error': 'clip writer busy'}
     log_event("Manual Save")
-    return jsonify({'status': 'buffer saved'})
+    return {'status': 'clip queued'}
 
-@app.route('/toggle_screen', methods=['POST'])
-def toggle_screen():
-    """Turn the attached touchscreen display on or off."""
-    action = request.json.get('state')
+def run_profile(args, token=None):
+    """Profile the live threads as asked by ``/admin/profile``.
+
+    ``args`` holds the query parameters: ``seconds`` (default 5, at most
+    60), ``interval_ms`` (default 5), ``threads`` (comma-separated thread
+    name parts such as ``capture,stage-detect,mjpeg``) and ``format``:
+    ``collapsed`` (default; feed to flamegraph.pl or speedscope) or
+    ``json``. Returns ``(status, content_type, body)``.
+
+    The profiler is off unless ``config['profiler']`` enables it and sets
+    a token, which every request must present.
+    """
+    options = config.get('profiler', {})
+    if not options.get('enabled', False):
+        return 403, 'application/json', b'{"error": "profiler disabled"}'
+    if not options.get('token'):
+        return 403, 'application/json', b'{"error": "profiler token not configured"}'
+    if not hmac.compare_digest(str(token or '').encode(), str(options['token']).encode()):
+        return 403, 'application/json', b'{"error": "bad token"}'
+    try:
+        seconds = float(args.get('seconds', 5))
+        interval = float(args.get('interval_ms', 5)) / 1e3
+    except ValueError:
+        return 400, 'application/json', b'{"error": "seconds and interval_ms must be numbers"}'
+    threads = [part for part in args.get('threads', '').split(',') if part]
+    try:
+        result = sampling_profiler.profile(seconds, interval, threads)
+    except sampling_profiler.ProfilerBusy as exc:
+        return 409, 'application/json', json.dumps({'error': str(exc)}).encode()
+    print(f"[PROFILE] {result['samples']} samples in {result['seconds']} s, "
+          f"overhead {result['overhead'] * 100:.1f}%")
+    if args.get('format') == 'json':
+        body = {key: value for key, value in result.items() if key != 'stacks'}
+        body['top'] = sampling_profiler.top_functions(result)
+        body['collapsed'] = sampling_profiler.collapsed(result).splitlines()
+        return 200, 'application/json', json.dumps(body).encode()
+    return 200, 'text/plain; charset=utf-8', sampling_profiler.collapsed(result).encode()
+
+@app.route('/admin/profile')
+def admin_profile():
+    """Run a time-boxed sampling profile and return collapsed stacks."""
+    token = request.args.get('token') or request.headers.get('X-Admin-Token')
+    status, content_type, body = run_profile(request.args, token)
+    response = Response(body, status=status, mimetype=content_type)
+    if status == 200 and content_type.startswith('text/plain'):
+        response.headers['Content-Disposition'] = 'attachment; filename=profile.collapsed'
+    return response
+
+def set_screen(action):
+    """Turn the attached touchscreen display ``on`` or ``off``."""
     from touchscreen_control import TouchscreenControl
     if action == 'off':
         TouchscreenControl.set_display_power('off')
     elif action == 'on':
         TouchscreenControl.set_display_power('on')
-    return jsonify({'status': f'screen turned {action}'})
+    return {'status': f'screen turned {action}'}
+
+@app.route('/save_buffer', methods=['POST'])
+def save_buffer():
+    """Persist the current buffer to disk."""
+    return jsonify(save_buffer_now())
+
+@app.route('/toggle_screen', methods=['POST'])
+def toggle_screen():
+    """Turn the attached touchscreen display on or off."""
+    return jsonify(set_screen((request.json or {}).get('state')))
 
 # ---- Start Server ----
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080, threaded=True)
+    try:
+        app.run(host='0.0.0.0', port=8080, threaded=True)
+    finally:
+        controller.stop()